@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Time the zone transfer, filter and sort hot paths of dnsq against synthetic zones
+
+The zones are served by `tests.dnsserver.AXFRServer` from a separate process so the server
+neither competes for the interpreter lock nor shows up in the peak RSS. Every benchmark runs
+in a fresh process of its own for the same reason. Run it from the root of the repository:
+
+    python benchmarks/bench_hotpaths.py --sizes 1000,100000 --json results.json
+    python benchmarks/bench_hotpaths.py --sizes 1000,100000 --compare results.json
+
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT_DIR)
+
+from dnsq.index import Predicate  # noqa: E402
+from dnsq.index import ZoneIndex  # noqa: E402
+from dnsq.network import CIDRSet  # noqa: E402
+from dnsq.snapshot import snapshot_path  # noqa: E402
+from dnsq.snapshot import write_snapshot  # noqa: E402
+from tests import dnsserver  # noqa: E402
+import dns.rdatatype  # noqa: E402
+import dnsq  # noqa: E402
+import dnsq.consistency  # noqa: E402
+import dnsq.diff  # noqa: E402
+import dnsq.index  # noqa: E402
+import dnsq.metrics  # noqa: E402
+import dnsq.output  # noqa: E402
+
+DEFAULT_SIZES = '1000,100000,1000000'
+PROBES = 20
+# dnspython 1.15 cannot stream a zone transfer without a lifetime, so allow for slow machines
+LIFETIME = 3600.0
+QUERY = r'10\.0\.1\.'
+CIDR = '10.0.1.0/24'
+SERIAL = 2018070500
+# the same zone is served on a second address for the diff of two nameservers
+MIRROR = '127.0.0.2'
+REVERSE = '127.0.0.3'
+REVERSE_ORIGIN = '10.in-addr.arpa.'
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in kilobytes, `None` when unknown"""
+    try:
+        import resource
+    except ImportError:  # pragma: no cover
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def bench_zone_transfer(size, port):
+    start = time.time()
+    first = None
+    count = 0
+    for record in dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', lifetime=LIFETIME, port=port):
+        if first is None:
+            first = time.time() - start
+        count += 1
+    return dict(records=count, seconds=time.time() - start, time_to_first_record=first)
+
+
+def bench_zone_transfer_metrics(size, port):
+    # bench_zone_transfer with a collector registered, the difference is the cost of measuring
+    registry = dnsq.metrics.MetricsRegistry()
+    dnsq.metrics.register(registry)
+    try:
+        return bench_zone_transfer(size, port)
+    finally:
+        dnsq.metrics.unregister(registry)
+
+
+def bench_snapshot_transfer(size, port):
+    directory = tempfile.mkdtemp(prefix='dnsq-bench-')
+    try:
+        path = snapshot_path(directory, dnsserver.DEFAULT_ORIGIN, '127.0.0.1')
+        write_snapshot(path, dnsserver.DEFAULT_ORIGIN, dnsserver.synthetic_zone(size))
+
+        # the zone is unchanged, so this is an SOA query and a read of the snapshot
+        start = time.time()
+        first = None
+        count = 0
+        for record in dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', lifetime=LIFETIME, port=port, snapshot_dir=directory):
+            if first is None:
+                first = time.time() - start
+            count += 1
+        seconds = time.time() - start
+
+        return dict(records=count, seconds=seconds, time_to_first_record=first, snapshot_bytes=os.path.getsize(path))
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_ixfr_transfer(size, port):
+    directory = tempfile.mkdtemp(prefix='dnsq-bench-')
+    try:
+        path = snapshot_path(directory, dnsserver.DEFAULT_ORIGIN, '127.0.0.1')
+        write_snapshot(path, dnsserver.DEFAULT_ORIGIN, dnsserver.synthetic_zone(size, serial=SERIAL - 1))
+
+        # the serial changed, so this is an SOA query, an IXFR, a read and a write of the snapshot
+        start = time.time()
+        count = sum(1 for _ in dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', lifetime=LIFETIME, port=port, snapshot_dir=directory))
+        return dict(records=count, seconds=time.time() - start, time_to_first_record=None)
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_diff_zone_transfers(size, port):
+    start = time.time()
+    diff = dnsq.diff.diff_zone_transfers(dnsserver.DEFAULT_ORIGIN, ['127.0.0.1', MIRROR], lifetime=LIFETIME, port=port)
+    assert diff.in_sync, diff.errors
+    # records counts the zone once, both transfers run at the same time
+    return dict(records=diff.counts[MIRROR], seconds=time.time() - start, time_to_first_record=None)
+
+
+def bench_check_ptr_consistency(size, port):
+    start = time.time()
+    report = dnsq.consistency.check_ptr_consistency(dnsserver.DEFAULT_ORIGIN, [REVERSE_ORIGIN], '127.0.0.1', REVERSE, lifetime=LIFETIME, port=port)
+    assert report.consistent, report.errors or report.problems[:10]
+    # records counts both zones, they are transferred at the same time
+    return dict(records=sum(report.counts.values()), seconds=time.time() - start, time_to_first_record=None)
+
+
+def bench_supports_zone_transfer(size, port):
+    timings = []
+    for _ in range(PROBES):
+        start = time.time()
+        assert dnsq.supports_zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', port=port)
+        timings.append(time.time() - start)
+
+    timings.sort()
+    # one probe is one "record" so records_per_second reads as probes per second
+    return dict(records=1, seconds=timings[len(timings) // 2], time_to_first_record=None)
+
+
+def bench_logged_calls(size, port):
+    # size calls of functions that log on every call, with logging at its default WARNING level
+    names = ['host-{:07d}.{}'.format(i, dnsserver.DEFAULT_ORIGIN) for i in range(size)]
+    start = time.time()
+    for name in names:
+        dnsq.get_absolute_name(name)
+        dnsq.create_resolver(search=dnsserver.DEFAULT_ORIGIN, nameservers=['127.0.0.1'], lifetime=LIFETIME)
+    return dict(records=size, seconds=time.time() - start, time_to_first_record=None)
+
+
+def bench_query_filter(size, port):
+    records = list(dnsserver.synthetic_zone(size))
+
+    # what --query does: index the transferred zone and search every field
+    start = time.time()
+    matches = ZoneIndex(records).query(Predicate(dnsq.index.FIELDS, 'regex', QUERY))
+    return dict(records=len(records), matches=len(matches), seconds=time.time() - start, time_to_first_record=None)
+
+
+def bench_index_cidr(size, port):
+    index = ZoneIndex(dnsserver.synthetic_zone(size))
+    predicate = Predicate('rdata', 'cidr', CIDR)
+    index.query(predicate)
+
+    # a lookup on an index that is already built, Ex: many queries against one transfer
+    timings = []
+    for _ in range(PROBES):
+        start = time.time()
+        matches = index.query(predicate)
+        timings.append(time.time() - start)
+
+    timings.sort()
+    return dict(records=len(index), matches=len(matches), seconds=timings[len(timings) // 2], time_to_first_record=None)
+
+
+def bench_cidr_filter(size, port):
+    records = list(dnsserver.synthetic_zone(size))
+    # every other /24 of 10.0.0.0/16, what an IPAM reconciliation of many subnets looks like
+    networks = ['10.0.{}.0/24'.format(x) for x in range(0, 256, 2)]
+
+    # what --cidr does: index the transferred zone and look up every network
+    start = time.time()
+    matches = ZoneIndex(records).query(Predicate('rdata', 'cidr', CIDRSet(networks)))
+    return dict(records=len(records), matches=len(matches), seconds=time.time() - start, time_to_first_record=None)
+
+
+def bench_write_records(size, port):
+    records = list(dnsserver.synthetic_zone(size))
+
+    # what --type zone-transfer does with the records, written to /dev/null instead of a pipe
+    with io.open(os.devnull, 'wb') as stream:
+        start = time.time()
+        with dnsq.output.create_writer('text', stream, dnsq.output.RECORD_FIELDS, chunk_rows=dnsq.output.BINARY_CHUNK_ROWS,
+                                       encoding='utf-8') as writer:
+            writer.write_rows(dnsq.output.record_row(record) for record in records)
+        seconds = time.time() - start
+    return dict(records=len(records), seconds=seconds, time_to_first_record=None)
+
+
+def bench_sort_ips(size, port):
+    ips = [x.rdata.to_text() for x in dnsserver.synthetic_zone(size) if x.rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA)]
+    random.Random(size).shuffle(ips)
+
+    start = time.time()
+    dnsq.sort_ips(ips)
+    return dict(records=len(ips), seconds=time.time() - start, time_to_first_record=None)
+
+
+def bench_sort_records(size, port):
+    records = list(dnsserver.synthetic_zone(size))
+    random.Random(size).shuffle(records)
+
+    # what --sort-by ip does
+    start = time.time()
+    dnsq.sort_records(records)
+    return dict(records=len(records), seconds=time.time() - start, time_to_first_record=None)
+
+
+BENCHMARKS = [
+    ('zone_transfer', bench_zone_transfer),
+    ('zone_transfer_metrics', bench_zone_transfer_metrics),
+    ('snapshot_transfer', bench_snapshot_transfer),
+    ('ixfr_transfer', bench_ixfr_transfer),
+    ('diff_zone_transfers', bench_diff_zone_transfers),
+    ('check_ptr_consistency', bench_check_ptr_consistency),
+    ('supports_zone_transfer', bench_supports_zone_transfer),
+    ('logged_calls', bench_logged_calls),
+    ('query_filter', bench_query_filter),
+    ('index_cidr', bench_index_cidr),
+    ('cidr_filter', bench_cidr_filter),
+    ('write_records', bench_write_records),
+    ('sort_ips', bench_sort_ips),
+    ('sort_records', bench_sort_records),
+]
+
+
+def _serve(size, reverse, conn):
+    """Run an AXFRServer for a synthetic zone of size records until told to stop
+
+    Its IXFR journal has one empty change, from the serial before SERIAL. The same zone is also
+    served on MIRROR at the same port, sharing the rendered messages. When reverse is `True` the
+    reverse zone of its IPv4 addresses is served on REVERSE at the same port.
+    """
+    journal = [(SERIAL - 1, [], [])]
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(size, serial=SERIAL), journal=journal) as server:
+        with dnsserver.AXFRServer(dnsserver.synthetic_zone(2, serial=SERIAL), host=MIRROR, port=server.port) as mirror:
+            mirror.messages = server.messages
+            records = dnsserver.synthetic_zone(size if reverse else 2, serial=SERIAL)
+            with dnsserver.AXFRServer(dnsserver.synthetic_reverse_zone(records, REVERSE_ORIGIN), origin=REVERSE_ORIGIN, host=REVERSE,
+                                      port=server.port):
+                conn.send(server.port)
+                conn.recv()
+
+
+def _run(func, size, port, conn):
+    result = func(size, port)
+    result['peak_rss_kb'] = peak_rss_kb()
+    conn.send(result)
+
+
+def spawn(target, *args):
+    """Run target(*args, conn) in a new process and return the first value it sends
+
+    Raises:
+        RuntimeError - When the process exits without sending anything, Ex: the benchmark raised
+
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=target, args=args + (child,))
+    process.start()
+    # only the new process may hold the child end, or recv below never sees it exit
+    child.close()
+    try:
+        value = parent.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError('{} exited with {} before sending a result'.format(target.__name__, process.exitcode))
+    return process, parent, value
+
+
+def run(sizes, names):
+    """Run the benchmarks called names for each zone size
+
+    Returns:
+        `list` - of `dict`, one per benchmark and size
+
+    """
+    results = []
+    for size in sizes:
+        server, server_conn, port = spawn(_serve, size, 'check_ptr_consistency' in names)
+        try:
+            for name, func in BENCHMARKS:
+                if name not in names:
+                    continue
+
+                process, _, result = spawn(_run, func, size, port)
+                process.join()
+
+                result.update(benchmark=name, size=size)
+                result['records_per_second'] = result['records'] / result['seconds'] if result['seconds'] else None
+                results.append(result)
+                report(result)
+        finally:
+            server_conn.send('stop')
+            server.join()
+    return results
+
+
+def report(result):
+    ttfr = result.get('time_to_first_record')
+    line = '{benchmark:<24} {size:>9} {seconds:>10.6f} {rate:>14.0f} {ttfr:>10} {rss:>10}'.format(
+        benchmark=result['benchmark'],
+        size=result['size'],
+        seconds=result['seconds'],
+        rate=result['records_per_second'] or 0,
+        ttfr='-' if ttfr is None else '{:.4f}'.format(ttfr),
+        rss=result.get('peak_rss_kb') or '-',
+    )
+    print(line)
+    sys.stdout.flush()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT_DIR).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    """Print how much slower (> 1.0) or faster (< 1.0) each result is than the one in the baseline at path"""
+    with io.open(path, encoding='utf-8') as fd:
+        baseline = json.load(fd)
+
+    previous = dict(((x['benchmark'], x['size']), x) for x in baseline['results'])
+    print('\ncompared with {} ({})'.format(path, baseline.get('commit')))
+    print('{:<24} {:>9} {:>10} {:>10}'.format('benchmark', 'size', 'time', 'peak rss'))
+    for result in results:
+        old = previous.get((result['benchmark'], result['size']))
+        if old is None:
+            continue
+        time_ratio = result['seconds'] / old['seconds'] if old['seconds'] else float('nan')
+        rss_ratio = float(result['peak_rss_kb']) / old['peak_rss_kb'] if old.get('peak_rss_kb') and result.get('peak_rss_kb') else float('nan')
+        print('{:<24} {:>9} {:>9.2f}x {:>9.2f}x'.format(result['benchmark'], result['size'], time_ratio, rss_ratio))
+
+
+def main(argv=None):
+    names = [name for name, _ in BENCHMARKS]
+
+    parser = argparse.ArgumentParser(description='Time the dnsq hot paths against synthetic zones')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma separated zone sizes. Default "{}"'.format(DEFAULT_SIZES))
+    parser.add_argument('--benchmark', action='append', choices=names, help='Only run this benchmark, may be repeated')
+    parser.add_argument('--json', metavar='FILE', help='Write the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the results with a JSON file written by --json')
+    options = parser.parse_args(argv)
+
+    sizes = [int(x) for x in options.sizes.split(',')]
+
+    print('{:<24} {:>9} {:>10} {:>14} {:>10} {:>10}'.format('benchmark', 'size', 'seconds', 'records/s', 'ttfr', 'rss kb'))
+    results = run(sizes, options.benchmark or names)
+
+    if options.json:
+        document = dict(
+            commit=git_commit(),
+            created=datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            results=results,
+        )
+        with io.open(options.json, 'w', encoding='utf-8') as fd:
+            fd.write(json.dumps(document, indent=2, sort_keys=True))
+
+    if options.compare:
+        compare(results, options.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Measure how long the dnsq command line takes to start
+
+Every run is a fresh interpreter so the numbers include the imports, run it from
+the root of the repository:
+
+    python benchmarks/bench_startup.py --runs 20
+
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DNSQ = os.path.join(PROJECT_ROOT_DIR, 'bin', 'dnsq')
+
+COMMANDS = [
+    ['--version'],
+    ['--help'],
+]
+
+
+def run(argv):
+    """Run bin/dnsq with argv in a new interpreter and return the wall clock time in seconds"""
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT_DIR)
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        subprocess.check_call([sys.executable, DNSQ] + argv, stdout=devnull, stderr=devnull, env=env)
+        return time.time() - start
+
+
+def import_time():
+    """Return the seconds spent importing dnsq.cli in a new interpreter"""
+    code = 'import time; start = time.time(); import dnsq.cli; print(time.time() - start)'
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT_DIR)
+    return float(subprocess.check_output([sys.executable, '-c', code], env=env))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the startup time of the dnsq command line')
+    parser.add_argument('--runs', type=int, default=10, help='The number of runs per command. Default 10')
+    options = parser.parse_args(argv)
+
+    print('{:<22} {:>10} {:>10}'.format('command', 'min ms', 'median ms'))
+
+    timings = [import_time() for _ in range(options.runs)]
+    print('{:<22} {:>10.1f} {:>10.1f}'.format('import dnsq.cli', min(timings) * 1000, median(timings) * 1000))
+
+    for command in COMMANDS:
+        timings = [run(command) for _ in range(options.runs)]
+        print('{:<22} {:>10.1f} {:>10.1f}'.format('dnsq ' + ' '.join(command), min(timings) * 1000, median(timings) * 1000))
+
+
+if __name__ == '__main__':
+    main()
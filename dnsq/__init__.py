@@ -3,25 +3,33 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 
+import collections
+import copy
 import dns.exception
-import dns.query
-import dns.resolver
-import dns.zone
+import dns.rdataclass
+import dns.rdatatype
 import io
 import logging
 import socket
-import struct
 import sys
+import threading
+import time
 import types
 
-# configure logging
+from dnsq import metrics
+
+# logging is left to the application, Ex: `dnsq.cli.execute` configures it for the command line
 LOGGING_FORMAT = '%(asctime)s::%(levelname)s::%(funcName)s::%(message)s'
 LOGGING_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S %Z'
-logging.basicConfig(level=logging.WARNING, format=LOGGING_FORMAT, datefmt=LOGGING_DATE_FORMAT)
 LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
 
 DEFAULT_TIMEOUT = 10.0
 DEFAULT_LIFETIME = DEFAULT_TIMEOUT * 2
+DEFAULT_WORKERS = 16
+RESOLVER_POOL_SIZE = 256
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_NEGATIVE_TTL = 60
 
 PY2 = sys.version_info[0] == 2
 PY3 = sys.version_info[0] == 3
@@ -39,16 +47,131 @@ else:
     from importlib import reload  # noqa: F401
 
 
+# the errors that mean a nameserver will not give us the zone
+ZONE_TRANSFER_ERRORS = (
+    dns.exception.FormError,
+    dns.exception.Timeout,
+    EOFError,
+    socket.error,
+)
+
+
+class Record(collections.namedtuple('Record', ['name', 'ttl', 'rdclass', 'rdtype', 'rdata'])):
+    """A single resource record from a zone transfer
+
+    The fields are kept as the objects dnspython decoded them into and are only
+    rendered as text when asked to.
+
+    Attributes:
+        name `dns.name.Name` - The owner name, relative to the zone when the transfer was relativized.
+        ttl `int` - The time to live in seconds.
+        rdclass `int` - The record class. Ex: `dns.rdataclass.IN`
+        rdtype `int` - The record type. Ex: `dns.rdatatype.A`
+        rdata `dns.rdata.Rdata` - The record data.
+
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_text(cls, text, origin=None):
+        """Create a `Record` from a zone file style line
+
+        Args:
+            text `str` - A record as text. Ex: `dc-app-01 7200 IN A 192.168.1.20`
+            origin `dns.name.Name` - The origin to resolve relative names against. Default `None`
+
+        Returns:
+            `Record`
+
+        """
+        import dns.name
+        import dns.rdata
+
+        name, ttl, rdclass, rdtype, rdata = text.split(None, 4)
+        rdclass = dns.rdataclass.from_text(rdclass)
+        rdtype = dns.rdatatype.from_text(rdtype)
+
+        return cls(dns.name.from_text(name, origin), int(ttl), rdclass, rdtype, dns.rdata.from_text(rdclass, rdtype, rdata, origin))
+
+    @property
+    def hostname(self):
+        """The owner name as text. Ex: `dc-app-01`"""
+        return self.name.to_text()
+
+    @property
+    def type(self):
+        """The record type as text. Ex: `A`"""
+        return dns.rdatatype.to_text(self.rdtype)
+
+    def to_text(self):
+        """Render the record the way it would appear in a zone file
+
+        Returns:
+            `str` - Ex: `dc-app-01 7200 IN A 192.168.1.20`
+
+        """
+        return '{} {} {} {} {}'.format(self.name.to_text(),
+                                       self.ttl,
+                                       dns.rdataclass.to_text(self.rdclass),
+                                       dns.rdatatype.to_text(self.rdtype),
+                                       self.rdata.to_text()
+                                       )
+
+    def __str__(self):
+        return self.to_text()
+
+
 def sort_ips(ips):
-    """Given a list of @ips, sort them
+    """Given a list of @ips, sort them by address, IPv4 before IPv6
 
-    Credit: https://stackoverflow.com/questions/6545023/how-to-sort-ip-addresses-stored-in-dictionary-in-python/6545090#6545090
+    Each address is parsed once into an integer key, see `dnsq.network.address_key`.
 
     Args:
         ips `list` `tuple` - A list or tuple of ips
 
+    Raises:
+        ValueError - When one of @ips is not an IP address
+
+    Returns:
+        `list`
+
+    """
+    from dnsq.network import address_key
+
+    return sorted(ips, key=address_key)
+
+
+def sort_records(records, origin=None):
+    """Sort @records by the address they are about, IPv4 before IPv6
+
+    That is the rdata of A and AAAA records and the owner name of PTR records, see `dnsq.network.record_address`.
+    Records with the same address are sorted by hostname, records without an address, Ex: CNAME, come last.
+
+    Args:
+        records `iterable` - of `Record`
+        origin `str` or `dns.name.Name` - The zone relative owner names belong to. Default `None`
+
+    Returns:
+        `list` - of `Record`
+
     """
-    return sorted(ips, key=lambda ip: struct.unpack('!L', socket.inet_aton(ip))[0])
+    from dnsq.network import IPV6_KEY_OFFSET
+    from dnsq.network import record_address
+
+    if origin is not None:
+        origin = get_absolute_name(origin)
+    no_address = IPV6_KEY_OFFSET << 1
+
+    def address_key(record):
+        address = record_address(record, origin)
+        if address is None:
+            return no_address
+        version, value = address
+        return value if version == 4 else IPV6_KEY_OFFSET + value
+
+    # sorts are stable, so sorting by hostname first breaks the ties of the address sort, and
+    # two sorts on plain keys are cheaper than one on tuples
+    return sorted(sorted(records, key=lambda record: record.hostname), key=address_key)
 
 
 def get_resolver_domain_type(domain):
@@ -64,6 +187,8 @@ def get_resolver_domain_type(domain):
         `dns.name.Name`
 
     """
+    import dns.name
+
     supported_types = (
         STRING_TYPE,
         list,
@@ -77,35 +202,376 @@ def get_resolver_domain_type(domain):
     assert isinstance(domain, supported_types), err_msg
 
     if isinstance(domain, STRING_TYPE):
-        LOGGER.debug('The domain: {} is a string'.format(domain))
+        LOGGER.debug('The domain: %s is a string', domain)
         return dns.name.from_text(domain)
 
     if isinstance(domain, (list, tuple)):
-        LOGGER.debug('The domain: {} is a list or tuple'.format(domain))
+        LOGGER.debug('The domain: %s is a list or tuple', domain)
         return dns.name.Name(domain)
 
     # if we get here then domain must be dns.name.Name
-    LOGGER.debug('The domain: {} is {}'.format(domain, type(domain)))
+    LOGGER.debug('The domain: %s is %s', domain, type(domain))
     return domain
 
 
-def create_resolver(search=None, nameservers=None, lifetime=DEFAULT_LIFETIME, timeout=DEFAULT_TIMEOUT, *args, **kwargs):
+def get_absolute_name(domain):
+    """Like `get_resolver_domain_type` but relative names are made absolute
+
+    Args:
+        domain - One of the following types `basestring, str, list, tuple, dns.name.Name`
+
+    Returns:
+        `dns.name.Name`
+
+    """
+    import dns.name
+
+    name = get_resolver_domain_type(domain=domain)
+    if not name.is_absolute():
+        name = name.concatenate(dns.name.root)
+    return name
+
+
+_RESOLVER_LOCK = threading.Lock()
+_SYSTEM_RESOLVER = None
+_RESOLVER_POOL = collections.OrderedDict()
+
+
+class NegativeAnswer(object):
+    """A cached NXDOMAIN or NoAnswer
+
+    Attributes:
+        exception `dns.resolver.NXDOMAIN` or `dns.resolver.NoAnswer` - The exception to raise again.
+        expiration `float` - The time, in seconds since the epoch, the entry expires.
+
+    """
+    __slots__ = ('exception', 'expiration')
+
+    def __init__(self, exception, expiration):
+        self.exception = exception
+        self.expiration = expiration
+
+
+class AnswerCache(object):
+    """A size bounded, TTL honouring answer cache with least recently used eviction
+
+    Attach it to a resolver with `create_resolver(cache=...)`, it has the `get`, `put` and `flush`
+    methods of `dns.resolver.LRUCache`. On top of the positive answers that
+    `dns.resolver.Resolver.query` caches, `query` also caches NXDOMAIN and NoAnswer for the negative
+    TTL of the zone (RFC 2308) or @negative_ttl seconds when the response has no SOA.
+
+    Args:
+        max_size `int` - The maximum number of cached answers. Default `DEFAULT_CACHE_SIZE`
+        negative_ttl `int` - The number of seconds to cache a negative answer without an SOA. Default `DEFAULT_NEGATIVE_TTL`
+
+    Attributes:
+        hits `int` - The number of lookups answered from the cache.
+        misses `int` - The number of lookups that had to go to a nameserver.
+
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.data = collections.OrderedDict()
+        self.max_size = max(max_size, 1)
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _get(self, key):
+        # the caller holds self.lock, the most recently used entry is kept last
+        value = self.data.pop(key, None)
+        if value is None or value.expiration <= time.time():
+            return None
+        self.data[key] = value
+        return value
+
+    def get(self, key):
+        """Return the cached `dns.resolver.Answer` for key, `None` when not cached or expired
+
+        Args:
+            key `tuple` - (qname `dns.name.Name`, rdtype `int`, rdclass `int`)
+
+        """
+        with self.lock:
+            answer = self._get(key)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return answer
+
+    def put(self, key, value):
+        """Cache value under key, evicting the least recently used entries when full
+
+        Args:
+            key `tuple` - (qname `dns.name.Name`, rdtype `int`, rdclass `int`)
+            value `dns.resolver.Answer` or `NegativeAnswer` - Anything with an ``expiration`` attribute.
+
+        """
+        with self.lock:
+            self.data.pop(key, None)
+            while len(self.data) >= self.max_size:
+                self.data.popitem(last=False)
+            self.data[key] = value
+
+    def flush(self, key=None):
+        """Forget key, or every cached entry when key is `None`"""
+        with self.lock:
+            if key is None:
+                self.data.clear()
+            else:
+                self.data.pop(key, None)
+
+    def get_negative(self, domain, rdtype, rdclass=dns.rdataclass.IN):
+        """Return the cached `NegativeAnswer` for a query, `None` when not cached or expired
+
+        Only hits are counted, a miss is counted by the positive lookup that follows it.
+
+        Args:
+            domain `str, list, tuple, dns.name.Name` - The name that was queried.
+            rdtype `int` - The record type that was queried.
+            rdclass `int` - The record class that was queried. Default `IN`
+
+        """
+        key = self._negative_key(domain, rdtype, rdclass)
+        with self.lock:
+            negative = self._get(key)
+            if negative is not None:
+                self.hits += 1
+            return negative
+
+    def put_negative(self, domain, rdtype, rdclass, exception):
+        """Cache a NXDOMAIN or NoAnswer exception for a query
+
+        Args:
+            domain `str, list, tuple, dns.name.Name` - The name that was queried.
+            rdtype `int` - The record type that was queried.
+            rdclass `int` - The record class that was queried.
+            exception `dns.resolver.NXDOMAIN` or `dns.resolver.NoAnswer` - The exception to cache.
+
+        """
+        ttl = self.negative_ttl
+        for response in _exception_responses(exception):
+            for rrset in response.authority:
+                if rrset.rdtype == dns.rdatatype.SOA:
+                    ttl = min(rrset.ttl, rrset[0].minimum)
+
+        LOGGER.debug('Caching %r for domain: %s for %s seconds', exception, domain, ttl)
+        self.put(self._negative_key(domain, rdtype, rdclass), NegativeAnswer(exception, time.time() + ttl))
+
+    @property
+    def stats(self):
+        """`dict` - of hits, misses, size and max_size"""
+        with self.lock:
+            size = len(self.data)
+        return dict(hits=self.hits, misses=self.misses, size=size, max_size=self.max_size)
+
+    @staticmethod
+    def _negative_key(domain, rdtype, rdclass):
+        # the leading marker keeps negative entries away from dns.resolver.Resolver.query
+        return ('negative', get_resolver_domain_type(domain=domain), rdtype, rdclass)
+
+
+def _exception_responses(exception):
+    """Return the responses carried by a NXDOMAIN or NoAnswer exception"""
+    kwargs = getattr(exception, 'kwargs', {})
+    responses = list(kwargs.get('responses', {}).values())
+    if kwargs.get('response') is not None:
+        responses.append(kwargs['response'])
+    return responses
+
+
+_ANSWER_CACHE = None
+
+
+def get_answer_cache():
+    """Return the process wide `AnswerCache` used by `create_resolver(cache=True)`
+
+    Returns:
+        `AnswerCache`
+
+    """
+    global _ANSWER_CACHE
+
+    with _RESOLVER_LOCK:
+        if _ANSWER_CACHE is None:
+            _ANSWER_CACHE = AnswerCache()
+        return _ANSWER_CACHE
+
+
+def query(resolver, domain, rdtype, *args, **kwargs):
+    """A wrapper around `dns.resolver.Resolver.query` that caches NXDOMAIN and NoAnswer
+
+    Negative answers are only cached when the cache of @resolver is an `AnswerCache`.
+
+    Args:
+        resolver `dns.resolver.Resolver` - A resolver instance.
+        domain `str` - The name to query.
+        rdtype `str` or `int` - The record type to query. Ex: `NS`
+        args `tuple` - positional args to pass to `dns.resolver.Resolver.query`
+        kwargs `dict` - key value pairs to pass to `dns.resolver.Resolver.query`
+
+    Returns:
+        `dns.resolver.Answer`
+
+    """
+    import dns.resolver
+
+    cache = getattr(resolver, 'cache', None)
+    if not isinstance(cache, AnswerCache):
+        return _resolver_query(resolver, domain, rdtype, *args, **kwargs)
+
+    rdtype_value = dns.rdatatype.from_text(rdtype) if isinstance(rdtype, STRING_TYPE) else rdtype
+    negative = cache.get_negative(domain, rdtype_value)
+    if negative is not None:
+        raise negative.exception
+
+    try:
+        return _resolver_query(resolver, domain, rdtype, *args, **kwargs)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as exp:
+        cache.put_negative(domain, rdtype_value, dns.rdataclass.IN, exp)
+        raise
+
+
+def _resolver_query(resolver, domain, rdtype, *args, **kwargs):
+    if not metrics.COLLECTORS:
+        return resolver.query(domain, rdtype, *args, **kwargs)
+    return metrics.measure('query', resolver.nameservers, resolver.query, domain, rdtype, *args, **kwargs)
+
+
+def get_system_resolver():
+    """Return the resolver configured from the system configuration, Ex: `/etc/resolv.conf`
+
+    The system configuration is only read and parsed the first time this is called,
+    use `reload_resolvers` to read it again.
+
+    Returns:
+        `dns.resolver.Resolver` - shared, use `copy_resolver` before changing it
+
+    """
+    global _SYSTEM_RESOLVER
+    import dns.resolver
+
+    with _RESOLVER_LOCK:
+        if _SYSTEM_RESOLVER is None:
+            LOGGER.debug('Reading the system resolver configuration')
+            _SYSTEM_RESOLVER = dns.resolver.Resolver()
+        return _SYSTEM_RESOLVER
+
+
+def reload_resolvers():
+    """Forget the system resolver configuration and every pooled resolver
+
+    The next `create_resolver` or `get_system_resolver` call reads the system configuration again.
+
+    """
+    global _SYSTEM_RESOLVER
+
+    with _RESOLVER_LOCK:
+        LOGGER.debug('Invalidating the system resolver configuration and %s pooled resolver(s)', len(_RESOLVER_POOL))
+        _SYSTEM_RESOLVER = None
+        _RESOLVER_POOL.clear()
+
+
+def copy_resolver(resolver):
+    """Return a copy of resolver that can be changed without changing resolver
+
+    The cache, when there is one, stays shared between the copies.
+
+    Args:
+        resolver `dns.resolver.Resolver` - The resolver to copy.
+
+    Returns:
+        `dns.resolver.Resolver`
+
+    """
+    result = copy.copy(resolver)
+    result.nameservers = list(resolver.nameservers)
+    result.search = list(resolver.search)
+    result.nameserver_ports = dict(resolver.nameserver_ports)
+    return result
+
+
+def create_resolver(search=None, nameservers=None, lifetime=DEFAULT_LIFETIME, timeout=DEFAULT_TIMEOUT, cache=None, *args, **kwargs):
     """A wrapper to simplify creation of a resolver so that we can do DNS queries
 
+    Resolvers are configured from the system configuration, that is read only once, and are pooled
+    by (search, nameservers, lifetime, timeout). Each call returns a copy of the pooled resolver.
+    Passing @args or @kwargs creates a brand new `dns.resolver.Resolver` that bypasses the pool.
+
     Args:
         search `str, list, tuple, dns.name.Name` - The search domain to be used for our DNS query.
         nameservers `list, tuple` - A list of nameservers to query.
                                     Each nameserver is a string which contains the IP address of a nameserver.
         lifetime `float` - The total number of seconds to spend doing the transfer. If ``None``, then there is no limit on the time the transfer may take.
         timeout `float` - The number of seconds to wait for each response message.
+        cache `AnswerCache, dns.resolver.LRUCache, bool` - The cache to attach, `True` for the process wide
+                                                          `get_answer_cache()`. Default `None`, no cache.
+        args `tuple` - positional args to pass to `dns.resolver.Resolver`
+        kwargs `dict` - key value pairs to pass to `dns.resolver.Resolver`, Ex: `filename='/tmp/resolv.conf'`
 
     Returns:
         `dns.resolver.Resolver`
 
     """
-    LOGGER.info(dict(search=search, nameservers=nameservers, lifetime=lifetime, timeout=timeout, args=args, kwargs=kwargs))
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(search=search, nameservers=nameservers, lifetime=lifetime, timeout=timeout, cache=cache, args=args, kwargs=kwargs))
+
+    if args or kwargs:
+        import dns.resolver
+        resolver = configure_resolver(dns.resolver.Resolver(*args, **kwargs), search=search, nameservers=nameservers, lifetime=lifetime, timeout=timeout)
+    else:
+        resolver = copy_resolver(_pooled_resolver(search=search, nameservers=nameservers, lifetime=lifetime, timeout=timeout))
+
+    if cache is True:
+        cache = get_answer_cache()
+    if cache:
+        resolver.cache = cache
+
+    return resolver
+
+
+def _pooled_resolver(search, nameservers, lifetime, timeout):
+    """Return the pooled resolver for the `create_resolver` arguments, configure it when missing"""
+    key = (_pool_key(search), _pool_key(nameservers), lifetime, timeout)
+    with _RESOLVER_LOCK:
+        resolver = _RESOLVER_POOL.pop(key, None)
+        if resolver is not None:
+            _RESOLVER_POOL[key] = resolver
+            return resolver
+
+    resolver = configure_resolver(copy_resolver(get_system_resolver()), search=search, nameservers=nameservers, lifetime=lifetime, timeout=timeout)
+
+    with _RESOLVER_LOCK:
+        _RESOLVER_POOL[key] = resolver
+        while len(_RESOLVER_POOL) > RESOLVER_POOL_SIZE:
+            _RESOLVER_POOL.popitem(last=False)
+
+    return resolver
+
+
+def _pool_key(value):
+    """Make a search or nameservers argument of `create_resolver` hashable"""
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def configure_resolver(resolver, search=None, nameservers=None, lifetime=DEFAULT_LIFETIME, timeout=DEFAULT_TIMEOUT):
+    """Apply the `create_resolver` arguments to resolver
+
+    Args:
+        resolver `dns.resolver.Resolver` - The resolver to configure, it is changed in place.
+        search `str, list, tuple, dns.name.Name` - The search domain to be used for our DNS query.
+        nameservers `list, tuple` - A list of nameservers to query.
+        lifetime `float` - The total number of seconds to spend doing the transfer.
+        timeout `float` - The number of seconds to wait for each response message.
 
-    resolver = dns.resolver.Resolver(*args, **kwargs)
+    Returns:
+        `dns.resolver.Resolver` - resolver
+
+    """
     resolver.lifetime = lifetime
     resolver.timeout = timeout
 
@@ -116,14 +582,14 @@ def create_resolver(search=None, nameservers=None, lifetime=DEFAULT_LIFETIME, ti
     if search:
         resolver.search = [get_resolver_domain_type(domain=search)]
         resolver.domain = resolver.search[0]
-        LOGGER.debug('Setting search to: {}'.format(resolver.search))
-        LOGGER.debug('Setting domain to: {}'.format(resolver.domain))
+        LOGGER.debug('Setting search to: %s', resolver.search)
+        LOGGER.debug('Setting domain to: %s', resolver.domain)
 
     if nameservers:
         if isinstance(nameservers, STRING_TYPE):
             nameservers = [nameservers]
-        resolver.nameservers = nameservers
-        LOGGER.debug('Setting nameservers to: {}'.format(resolver.nameservers))
+        resolver.nameservers = list(nameservers)
+        LOGGER.debug('Setting nameservers to: %s', resolver.nameservers)
 
     return resolver
 
@@ -143,8 +609,9 @@ def ns_records(resolver, domain, *args, **kwargs):
                  ]
 
     """
-    LOGGER.info(dict(resolver=resolver, domain=domain, args=args, kwargs=kwargs))
-    results = [x.to_text() for x in resolver.query(domain, 'NS', *args, **kwargs)]
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(resolver=resolver, domain=domain, args=args, kwargs=kwargs))
+    results = [x.to_text() for x in query(resolver, domain, 'NS', *args, **kwargs)]
     return sorted(results)
 
 
@@ -171,12 +638,13 @@ def soa_records(resolver, domain, *args, **kwargs):
 
 
     """
-    LOGGER.info(dict(resolver=resolver, domain=domain, args=args, kwargs=kwargs))
-    results = [x.to_text().split(' ') for x in resolver.query(domain, 'SOA', *args, **kwargs)]
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(resolver=resolver, domain=domain, args=args, kwargs=kwargs))
+    results = [x.to_text().split(' ') for x in query(resolver, domain, 'SOA', *args, **kwargs)]
     return sorted(results)
 
 
-def supports_zone_transfer(domain, nameserver, lifetime=DEFAULT_LIFETIME, timeout=DEFAULT_TIMEOUT, *args, **kwargs):
+def supports_zone_transfer(domain, nameserver, lifetime=DEFAULT_LIFETIME, timeout=DEFAULT_TIMEOUT, probe=True, *args, **kwargs):
     """Tests if a nameserver, supports a zone transfer for a specific domain
 
     Args:
@@ -184,41 +652,405 @@ def supports_zone_transfer(domain, nameserver, lifetime=DEFAULT_LIFETIME, timeou
         nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
         timeout `float` - The number of seconds to wait for each response message.
         lifetime `float` - The total number of seconds to spend doing the transfer. If ``None``, then there is no limit on the time the transfer may take.
+        probe `bool` - When `True` only the first AXFR response message is read, see `probe_zone_transfer`.
+                       When `False` the whole zone is transferred and parsed. Default `True`
 
     Returns:
         bool - Returns `True` when the nameserver supports a zone transfer for domain, otherwise `False`
 
     """
+    transfer = ZoneTransfer(domain=domain, nameserver=nameserver, lifetime=lifetime, timeout=timeout, probe=probe, *args, **kwargs)
     try:
+        [x for x in transfer]
+    except ZONE_TRANSFER_ERRORS:
+        return False
+    return transfer.supported
+
+
+def probe_zone_transfer(domain, nameserver, timeout=DEFAULT_TIMEOUT, lifetime=DEFAULT_LIFETIME, *args, **kwargs):
+    """Ask nameserver for a zone transfer and read only the first response message
+
+    The TCP connection is closed as soon as the first message has arrived, which is all
+    that is needed to know a zone transfer is allowed: an rcode of NOERROR and an answer
+    that starts with the SOA of the zone.
+
+    Args:
+        domain `str` - The domain to check. Ex: `zonetransfer.me`.
+        nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
+        timeout `float` - The number of seconds to wait for the response message.
+        lifetime `float` - The total number of seconds to spend on the probe. If ``None``, then only @timeout applies.
+        args `tuple` - positional args to pass to `dns.query.tcp`
+        kwargs `dict` - key value pairs to pass to `dns.query.tcp`, Ex: `port=5353`
+
+    Raises:
+        dns.exception.FormError - When the zone transfer is refused or the answer does not start with the SOA of @domain
+
+    Returns:
+        `dns.message.Message` - The first response message of the zone transfer
+
+    """
+    import dns.message
+    import dns.query
+
+    if LOGGER.isEnabledFor(logging.INFO):
         LOGGER.info(dict(domain=domain, nameserver=nameserver, lifetime=lifetime, timeout=timeout, args=args, kwargs=kwargs))
-        [x for x in zone_transfer(nameserver=nameserver, domain=domain, timeout=timeout, *args, **kwargs)]
-        return True
-    except dns.exception.FormError:
-        pass
-    except dns.exception.Timeout:
-        pass
-    return False
+    zone = get_absolute_name(domain)
+
+    if lifetime is not None and (timeout is None or lifetime < timeout):
+        timeout = lifetime
+
+    query = dns.message.make_query(zone, dns.rdatatype.AXFR)
+    if metrics.COLLECTORS:
+        response = metrics.measure('probe_zone_transfer', nameserver, dns.query.tcp, query, nameserver, timeout, *args, **kwargs)
+    else:
+        response = dns.query.tcp(query, nameserver, timeout, *args, **kwargs)
+    check_zone_transfer_response(response, zone)
+
+    return response
+
+
+def check_zone_transfer_response(response, zone):
+    """Validate the first response message of a zone transfer
+
+    Args:
+        response `dns.message.Message` - The first response message.
+        zone `dns.name.Name` - The absolute name of the zone that was asked for.
+
+    Raises:
+        dns.exception.FormError - When the rcode is not NOERROR or the answer does not start with the SOA of @zone
+
+    """
+    import dns.rcode
+
+    rcode = response.rcode()
+    if rcode != dns.rcode.NOERROR:
+        raise dns.exception.FormError('The zone transfer was answered with rcode {}'.format(dns.rcode.to_text(rcode)))
+
+    if not response.answer or response.answer[0].rdtype != dns.rdatatype.SOA or response.answer[0].name != zone:
+        raise dns.exception.FormError('The zone transfer did not start with the SOA of {}'.format(zone))
+
+
+def scan_zone_transfers(pairs, workers=DEFAULT_WORKERS, lifetime=DEFAULT_LIFETIME, timeout=DEFAULT_TIMEOUT, *args, **kwargs):
+    """Check many (domain, nameserver) pairs for zone transfer support concurrently
+
+    Each check is a `probe_zone_transfer`, so a large zone costs no more than a small one.
+
+    Args:
+        pairs `iterable` - of (domain `str`, nameserver `str`) tuples
+        workers `int` - The maximum number of checks in flight. Default `DEFAULT_WORKERS`
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend on each check. If ``None``, then there is no limit on the time a check may take.
+
+    Returns:
+        `generator` - of `ZoneTransfer`, in the order the checks finish
+
+    """
+    def check(pair):
+        domain, nameserver = pair
+        return ZoneTransfer(domain=domain, nameserver=nameserver, lifetime=lifetime, timeout=timeout, probe=True, *args, **kwargs)
+
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(workers=workers, lifetime=lifetime, timeout=timeout, args=args, kwargs=kwargs))
+    for transfer in concurrent_map(check, pairs, workers=workers):
+        yield transfer
+
+
+def lookup_records(resolver, domains, rdtype='NS', workers=DEFAULT_WORKERS, ordered=False):
+    """Look up the NS or SOA records of many domains concurrently, all through the one resolver
+
+    Each domain is looked up as an absolute name, so a missing domain is not tried again with
+    every search domain of the resolver.
+
+    Args:
+        resolver `dns.resolver.Resolver` - A resolver instance, shared by every lookup.
+        domains `iterable` - of `str`
+        rdtype `str` - `NS` or `SOA`. Default `NS`
+        workers `int` - The maximum number of lookups in flight. Default `DEFAULT_WORKERS`
+        ordered `bool` - When `True` results are yielded in the order of domains, otherwise as they finish. Default `False`
 
+    Raises:
+        AssertionError - When rdtype is not `NS` or `SOA`
+
+    Returns:
+        `generator` - of (domain `str`, records `list`, error `dns.exception.DNSException` or `None`),
+                      records are as `ns_records` or `soa_records` return them and empty when there is an error
+
+    """
+    lookups = {'NS': ns_records, 'SOA': soa_records}
+    rdtype = rdtype.upper()
+    assert rdtype in lookups, 'Expected rdtype to be NS or SOA, got {}'.format(rdtype)
+    lookup_domain = lookups[rdtype]
+
+    def lookup(domain):
+        try:
+            return domain, lookup_domain(resolver, get_absolute_name(domain)), None
+        except dns.exception.DNSException as exp:
+            LOGGER.debug('The %s lookup for domain: %s failed: %r', rdtype, domain, exp)
+            return domain, [], exp
+
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(resolver=resolver, rdtype=rdtype, workers=workers, ordered=ordered))
+    for result in concurrent_map(lookup, domains, workers=workers, ordered=ordered):
+        yield result
+
+
+def concurrent_map(func, iterable, workers=DEFAULT_WORKERS, ordered=False):
+    """Call @func for every item of @iterable using a bounded pool of threads
+
+    Items are only taken from @iterable as results come back, at most 2 * @workers ahead of them,
+    so @iterable can be a generator of millions of items. Ex: every address of a /16.
+
+    Args:
+        func `callable` - Called with a single item, must handle its own errors.
+        iterable `iterable` - The items to process.
+        workers `int` - The maximum number of calls in flight. Default `DEFAULT_WORKERS`
+        ordered `bool` - When `True` results are yielded in input order, otherwise as they finish. Default `False`
+
+    Raises:
+        Exception - The first exception @func raised, when it does not handle its own errors
+
+    Returns:
+        `generator` - of the results of @func
+
+    """
+    import multiprocessing.pool
+    try:
+        import queue
+    except ImportError:  # python 2
+        import Queue as queue
+
+    assert workers > 0, 'Expected workers to be greater than 0, got {}'.format(workers)
+
+    def call(item):
+        try:
+            return True, func(item)
+        except Exception as exp:
+            return False, exp
+
+    def result(outcome):
+        ok, value = outcome
+        if not ok:
+            raise value
+        return value
+
+    limit = workers * 2
+    pool = multiprocessing.pool.ThreadPool(processes=workers)
+    try:
+        if ordered:
+            pending = collections.deque()
+            for item in iterable:
+                pending.append(pool.apply_async(call, (item,)))
+                while pending and (len(pending) >= limit or pending[0].ready()):
+                    yield result(pending.popleft().get())
+            while pending:
+                yield result(pending.popleft().get())
+        else:
+            done = queue.Queue()
+            outstanding = 0
+            for item in iterable:
+                pool.apply_async(call, (item,), callback=done.put)
+                outstanding += 1
+                while outstanding and (outstanding >= limit or not done.empty()):
+                    outstanding -= 1
+                    yield result(done.get())
+            while outstanding:
+                outstanding -= 1
+                yield result(done.get())
+    finally:
+        pool.terminate()
+
+
+class ZoneTransfer(object):
+    """A single zone transfer whose result answers both "is AXFR supported?" and "what is in the zone?"
 
-def zone_transfer(domain, nameserver, timeout=DEFAULT_TIMEOUT, lifetime=DEFAULT_LIFETIME, *args, **kwargs):
+    The transfer is started when the object is created so that a refusal or a timeout
+    is known up front, the records are then handed out when iterating, without asking
+    the nameserver for the zone a second time.
+
+    Args:
+        domain `str` - The domain to transfer. Ex: `zonetransfer.me`.
+        nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend doing the transfer. If ``None``, then there is no limit on the time the transfer may take.
+        probe `bool` - When `True` only checks that the transfer is allowed with `probe_zone_transfer`
+                       and no records are handed out. Default `False`
+        args `tuple` - positional args to pass to `zone_transfer`
+        kwargs `dict` - key value pairs to pass to `zone_transfer`, Ex: `sort=True`
+
+    Attributes:
+        error `Exception` or `None` - Why the transfer failed, `None` when the transfer is supported.
+
+    """
+
+    def __init__(self, domain, nameserver, timeout=DEFAULT_TIMEOUT, lifetime=DEFAULT_LIFETIME, probe=False, *args, **kwargs):
+        self.domain = domain
+        self.nameserver = nameserver
+        self.error = None
+        self._first = []
+        self._records = iter([])
+
+        if LOGGER.isEnabledFor(logging.INFO):
+            LOGGER.info(dict(domain=domain, nameserver=nameserver, lifetime=lifetime, timeout=timeout, probe=probe, args=args, kwargs=kwargs))
+        try:
+            if probe:
+                probe_zone_transfer(domain=domain, nameserver=nameserver, timeout=timeout, lifetime=lifetime, *args, **kwargs)
+                return
+
+            self._records = iter(zone_transfer(domain=domain, nameserver=nameserver, timeout=timeout, lifetime=lifetime, *args, **kwargs))
+            self._first = [next(self._records)]
+        except StopIteration:
+            pass
+        except ZONE_TRANSFER_ERRORS as exp:
+            LOGGER.debug('The zone transfer for domain: %s via nameserver: %s failed: %r', domain, nameserver, exp)
+            self.error = exp
+
+    @property
+    def supported(self):
+        """`True` when the nameserver allowed the zone transfer, otherwise `False`"""
+        return self.error is None
+
+    @property
+    def refused(self):
+        """`True` when the nameserver refused the zone transfer or answered with a malformed response"""
+        return isinstance(self.error, dns.exception.FormError)
+
+    @property
+    def timed_out(self):
+        """`True` when the nameserver did not answer before the timeout or lifetime expired"""
+        return isinstance(self.error, dns.exception.Timeout)
+
+    @property
+    def status(self):
+        """One of `supported`, `refused`, `timeout` or `error`"""
+        if self.supported:
+            return 'supported'
+        elif self.refused:
+            return 'refused'
+        elif self.timed_out:
+            return 'timeout'
+        return 'error'
+
+    def close(self):
+        """Stop the zone transfer and close the connection to the nameserver"""
+        self._first = []
+        close = getattr(self._records, 'close', None)
+        if close is not None:
+            close()
+
+    def __bool__(self):
+        return self.supported
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        while self._first:
+            yield self._first.pop()
+
+        for record in self._records:
+            yield record
+
+
+def zone_transfer(domain, nameserver, timeout=DEFAULT_TIMEOUT, lifetime=DEFAULT_LIFETIME, sort=False, snapshot_dir=None, *args, **kwargs):
     """Perform a zone-transfer via nameserver
 
+    Records are yielded as each AXFR message arrives, in the order the nameserver sends them,
+    so the zone never has to be held in memory. Pass ``sort=True`` to get the records sorted
+    by hostname instead, which requires the whole zone to be transferred first.
+
+    Pass ``snapshot_dir`` to keep a snapshot of the zone in that directory and read the zone
+    from it while the SOA serial is unchanged, see `dnsq.snapshot.cached_zone_transfer`.
+
     Args:
         domain `str` - The domain to check. Ex: `zonetransfer.me`.
         nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
         timeout `float` - The number of seconds to wait for each response message.
         lifetime `float` - The total number of seconds to spend doing the transfer. If ``None``, then there is no limit on the time the transfer may take.
+        sort `bool` - When `True` builds the whole zone and yields the records sorted by hostname. Default `False`
+        snapshot_dir `str` - The directory to keep zone snapshots in. Default `None`, always transfer the zone
 
     Returns:
-        `generator` - of sorted zone transfer encoded strings
+        `generator` - of `Record`
 
     """
+    import dns.query
+
+    if snapshot_dir is not None:
+        from dnsq.snapshot import cached_zone_transfer
+
+        records = cached_zone_transfer(domain, nameserver, snapshot_dir, timeout=timeout, lifetime=lifetime, *args, **kwargs)
+        if sort:
+            # sorted is stable, so the records of a name stay in zone order
+            records = sorted(records, key=lambda record: record.name)
+        for record in records:
+            yield record
+        return
+
     axfr = dns.query.xfr(where=nameserver, zone=domain, timeout=timeout, lifetime=lifetime, *args, **kwargs)
+    measurement = metrics.start('zone_transfer', nameserver)
+    if measurement is not None:
+        axfr = metrics.measure_messages(axfr, measurement)
+
+    if sort:
+        records = _sorted_zone_transfer(axfr)
+        try:
+            # the whole zone is transferred before the first record comes out
+            first = next(records, None)
+        except Exception as exp:
+            # errors reading a message already finished the measurement, this is a zone that
+            # was transferred but is not valid, Ex: dns.zone.NoSOA
+            if measurement is not None and not measurement.finished:
+                measurement.finish(exp)
+            raise
+        else:
+            if measurement is not None:
+                measurement.finish()
+
+        if first is not None:
+            yield first
+        for record in records:
+            yield record
+        return
+
+    seen_soa = False
+    try:
+        for message in axfr:
+            for rrset in message.answer:
+                # an AXFR opens and closes with the zone's SOA, only yield it once
+                if rrset.rdtype == dns.rdatatype.SOA:
+                    if seen_soa:
+                        continue
+                    seen_soa = True
+
+                for rdata in rrset:
+                    yield Record(rrset.name, rrset.ttl, rrset.rdclass, rrset.rdtype, rdata)
+    finally:
+        # stopping early must drop the connection to the nameserver right away
+        close = getattr(axfr, 'close', None)
+        if close is not None:
+            close()
+        # unless an error reading a message already finished it
+        if measurement is not None and not measurement.finished:
+            measurement.finish()
+
+
+def _sorted_zone_transfer(axfr):
+    """Build a `dns.zone.Zone` from @axfr and yield its records sorted by hostname
+
+    Args:
+        axfr `generator` - of `dns.message.Message` as returned by `dns.query.xfr`
+
+    Returns:
+        `generator` - of `Record` sorted by hostname
+
+    """
+    import dns.zone
+
     zone = dns.zone.from_xfr(axfr)
 
     # py36 .keys returns dict_keys so we work around it
     hostnames = sorted(zone.nodes.keys())
 
     for hostname in hostnames:
-        for line in zone[hostname].to_text(hostname).splitlines():
-            yield line.split(' ')
+        for rdataset in zone[hostname].rdatasets:
+            for rdata in rdataset:
+                yield Record(hostname, rdataset.ttl, rdataset.rdclass, rdataset.rdtype, rdata)
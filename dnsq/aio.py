@@ -0,0 +1,410 @@
+# coding: utf-8
+"""asyncio versions of the dnsq queries
+
+Every coroutine mirrors the blocking function of the same name in `dnsq` and honours the
+same timeout/lifetime semantics, so many lookups can be in flight on a single event loop.
+
+Requires python 3.6 or newer.
+
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import asyncio
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.query
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+import dnsq
+import logging
+import socket
+import struct
+
+LOGGER = dnsq.LOGGER
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+    """Hand every datagram received to a queue"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def datagram_received(self, data, addr):
+        self.queue.put_nowait(data)
+
+    def error_received(self, exc):
+        self.queue.put_nowait(exc)
+
+
+def _remaining(deadline):
+    """The number of seconds left until @deadline, `None` when there is no deadline
+
+    Raises:
+        dns.exception.Timeout - When the deadline has passed
+
+    """
+    if deadline is None:
+        return None
+
+    remaining = deadline - asyncio.get_event_loop().time()
+    if remaining <= 0:
+        raise dns.exception.Timeout(timeout=remaining)
+    return remaining
+
+
+def _deadline(lifetime):
+    """The event loop time at which @lifetime seconds will have passed, `None` when @lifetime is `None`"""
+    if lifetime is None:
+        return None
+    return asyncio.get_event_loop().time() + lifetime
+
+
+def _message_timeout(timeout, deadline):
+    """The number of seconds to wait for the next message, @timeout bounded by @deadline"""
+    remaining = _remaining(deadline)
+    if timeout is None:
+        return remaining
+    if remaining is None:
+        return timeout
+    return min(timeout, remaining)
+
+
+async def _wait_for(awaitable, timeout):
+    """Like `asyncio.wait_for` but raises `dns.exception.Timeout`"""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise dns.exception.Timeout(timeout=timeout)
+
+
+async def _read_tcp_message(reader, timeout):
+    """Read a single length prefixed DNS message from @reader
+
+    Raises:
+        EOFError - When the nameserver closes the connection early
+
+    """
+    try:
+        ldata = await _wait_for(reader.readexactly(2), timeout)
+        (length,) = struct.unpack('!H', ldata)
+        return await _wait_for(reader.readexactly(length), timeout)
+    except asyncio.IncompleteReadError:
+        raise EOFError
+
+
+async def _open_tcp(nameserver, port, timeout):
+    """Open a TCP connection to @nameserver"""
+    return await _wait_for(asyncio.open_connection(nameserver, port), timeout)
+
+
+async def udp(query, nameserver, timeout=None, port=53):
+    """Send @query via UDP and return the response
+
+    Args:
+        query `dns.message.Message` - The query to send.
+        nameserver `str` - The IP address of the nameserver.
+        timeout `float` - The number of seconds to wait for the response. If ``None``, wait forever.
+        port `int` - The port of the nameserver. Default `53`
+
+    Returns:
+        `dns.message.Message`
+
+    """
+    loop = asyncio.get_event_loop()
+    deadline = _deadline(timeout)
+    queue = asyncio.Queue()
+    family = socket.AF_INET6 if ':' in nameserver else socket.AF_INET
+    transport, _ = await loop.create_datagram_endpoint(lambda: _UDPProtocol(queue), remote_addr=(nameserver, port), family=family)
+
+    try:
+        transport.sendto(query.to_wire())
+        while True:
+            wire = await _wait_for(queue.get(), _remaining(deadline))
+            if isinstance(wire, Exception):
+                raise wire
+
+            try:
+                response = dns.message.from_wire(wire, keyring=query.keyring, request_mac=query.mac)
+            except dns.exception.FormError:
+                continue
+
+            # ignore stray datagrams that are not an answer to our query
+            if query.is_response(response):
+                return response
+    finally:
+        transport.close()
+
+
+async def tcp(query, nameserver, timeout=None, port=53):
+    """Send @query via TCP and return the response
+
+    Args:
+        query `dns.message.Message` - The query to send.
+        nameserver `str` - The IP address of the nameserver.
+        timeout `float` - The number of seconds to wait for the response. If ``None``, wait forever.
+        port `int` - The port of the nameserver. Default `53`
+
+    Returns:
+        `dns.message.Message`
+
+    """
+    deadline = _deadline(timeout)
+    reader, writer = await _open_tcp(nameserver, port, _remaining(deadline))
+
+    try:
+        wire = query.to_wire()
+        writer.write(struct.pack('!H', len(wire)) + wire)
+        wire = await _read_tcp_message(reader, _remaining(deadline))
+    finally:
+        writer.close()
+
+    response = dns.message.from_wire(wire, keyring=query.keyring, request_mac=query.mac)
+    if not query.is_response(response):
+        raise dns.query.BadResponse
+    return response
+
+
+async def query(resolver, domain, rdtype, rdclass=dns.rdataclass.IN):
+    """The coroutine version of `dns.resolver.Resolver.query`
+
+    The nameservers of @resolver are tried in turn, each attempt waits at most `resolver.timeout`
+    seconds and the whole query gives up after `resolver.lifetime` seconds. The cache of @resolver
+    is used the same way `dnsq.query` uses it.
+
+    Args:
+        resolver `dns.resolver.Resolver` - A resolver instance, see `dnsq.create_resolver`.
+        domain `str, list, tuple, dns.name.Name` - The name to query, relative names are made absolute with `resolver.domain`.
+        rdtype `int` or `str` - The record type. Ex: `NS`
+        rdclass `int` or `str` - The record class. Default `IN`
+
+    Raises:
+        dns.exception.Timeout - When no nameserver answered within the lifetime of @resolver
+        dns.resolver.NXDOMAIN - When the name does not exist
+        dns.resolver.NoAnswer - When the name exists but has no records of @rdtype
+        dns.resolver.NoNameservers - When every nameserver failed to answer
+
+    Returns:
+        `dns.resolver.Answer`
+
+    """
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(resolver=resolver, domain=domain, rdtype=rdtype, rdclass=rdclass))
+    if isinstance(rdtype, dnsq.STRING_TYPE):
+        rdtype = dns.rdatatype.from_text(rdtype)
+    if isinstance(rdclass, dnsq.STRING_TYPE):
+        rdclass = dns.rdataclass.from_text(rdclass)
+
+    qname = dnsq.get_resolver_domain_type(domain=domain)
+    if not qname.is_absolute():
+        qname = qname.derelativize(resolver.domain)
+
+    cache = resolver.cache
+    if isinstance(cache, dnsq.AnswerCache):
+        negative = cache.get_negative(qname, rdtype, rdclass)
+        if negative is not None:
+            raise negative.exception
+    if cache is not None:
+        answer = cache.get((qname, rdtype, rdclass))
+        if answer is not None:
+            return answer
+
+    try:
+        answer = await _query(resolver, qname, rdtype, rdclass)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as exp:
+        if isinstance(cache, dnsq.AnswerCache):
+            cache.put_negative(qname, rdtype, rdclass, exp)
+        raise
+
+    if cache is not None:
+        cache.put((qname, rdtype, rdclass), answer)
+    return answer
+
+
+async def _query(resolver, qname, rdtype, rdclass):
+    """Ask the nameservers of @resolver for @qname, see `query`"""
+    request = dns.message.make_query(qname, rdtype, rdclass)
+    deadline = _deadline(resolver.lifetime)
+    nameservers = list(resolver.nameservers)
+    errors = []
+
+    while nameservers:
+        for nameserver in list(nameservers):
+            timeout = _message_timeout(resolver.timeout, deadline)
+            try:
+                response = await udp(request, nameserver, timeout=timeout, port=resolver.port)
+                if response.flags & dns.flags.TC:
+                    timeout = _message_timeout(resolver.timeout, deadline)
+                    response = await tcp(request, nameserver, timeout=timeout, port=resolver.port)
+            except dns.exception.Timeout:
+                # lifetime left? try the next nameserver
+                _remaining(deadline)
+                continue
+            except (dns.exception.FormError, EOFError, socket.error) as exp:
+                errors.append((nameserver, False, resolver.port, exp, None))
+                nameservers.remove(nameserver)
+                continue
+
+            rcode = response.rcode()
+            if rcode == dns.rcode.NXDOMAIN:
+                raise dns.resolver.NXDOMAIN(qnames=[qname], responses={qname: response})
+            if rcode in (dns.rcode.NOERROR, dns.rcode.YXDOMAIN):
+                return dns.resolver.Answer(qname, rdtype, rdclass, response)
+
+            errors.append((nameserver, False, resolver.port, dns.rcode.to_text(rcode), response))
+            nameservers.remove(nameserver)
+
+    raise dns.resolver.NoNameservers(request=request, errors=errors)
+
+
+async def ns_records(resolver, domain):
+    """The coroutine version of `dnsq.ns_records`
+
+    Args:
+        resolver `dns.resolver.Resolver` - A resolver instance.
+        domain `str` - The domain containing the NS record(s).
+
+    Returns:
+        `list` - A list of NS records that are sorted
+
+    """
+    results = [x.to_text() for x in await query(resolver, domain, 'NS')]
+    return sorted(results)
+
+
+async def soa_records(resolver, domain):
+    """The coroutine version of `dnsq.soa_records`
+
+    Args:
+        resolver `dns.resolver.Resolver` - A resolver instance.
+        domain `str` - The domain containing the SOA record(s).
+
+    Returns:
+        `list` - A list of lists that are sorted
+
+    """
+    results = [x.to_text().split(' ') for x in await query(resolver, domain, 'SOA')]
+    return sorted(results)
+
+
+async def probe_zone_transfer(domain, nameserver, timeout=dnsq.DEFAULT_TIMEOUT, lifetime=dnsq.DEFAULT_LIFETIME, port=53):
+    """The coroutine version of `dnsq.probe_zone_transfer`
+
+    Args:
+        domain `str` - The domain to check. Ex: `zonetransfer.me`.
+        nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
+        timeout `float` - The number of seconds to wait for the response message.
+        lifetime `float` - The total number of seconds to spend on the probe. If ``None``, then only @timeout applies.
+        port `int` - The port of the nameserver. Default `53`
+
+    Raises:
+        dns.exception.FormError - When the zone transfer is refused or the answer does not start with the SOA of @domain
+
+    Returns:
+        `dns.message.Message` - The first response message of the zone transfer
+
+    """
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(domain=domain, nameserver=nameserver, lifetime=lifetime, timeout=timeout, port=port))
+    zone = dnsq.get_absolute_name(domain)
+
+    if lifetime is not None and (timeout is None or lifetime < timeout):
+        timeout = lifetime
+
+    response = await tcp(dns.message.make_query(zone, dns.rdatatype.AXFR), nameserver, timeout=timeout, port=port)
+    dnsq.check_zone_transfer_response(response, zone)
+
+    return response
+
+
+async def supports_zone_transfer(domain, nameserver, lifetime=dnsq.DEFAULT_LIFETIME, timeout=dnsq.DEFAULT_TIMEOUT, port=53):
+    """The coroutine version of `dnsq.supports_zone_transfer`
+
+    Args:
+        domain `str` - The domain to check. Ex: `zonetransfer.me`.
+        nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend on the check. If ``None``, then only @timeout applies.
+        port `int` - The port of the nameserver. Default `53`
+
+    Returns:
+        bool - Returns `True` when the nameserver supports a zone transfer for domain, otherwise `False`
+
+    """
+    try:
+        await probe_zone_transfer(domain=domain, nameserver=nameserver, timeout=timeout, lifetime=lifetime, port=port)
+    except dnsq.ZONE_TRANSFER_ERRORS:
+        return False
+    return True
+
+
+async def zone_transfer(domain, nameserver, timeout=dnsq.DEFAULT_TIMEOUT, lifetime=dnsq.DEFAULT_LIFETIME, port=53):
+    """The async generator version of `dnsq.zone_transfer`
+
+    Records are yielded as each AXFR message arrives, in the order the nameserver sends them.
+
+    Args:
+        domain `str` - The domain to transfer. Ex: `zonetransfer.me`.
+        nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend doing the transfer. If ``None``, then there is no limit on the time the transfer may take.
+        port `int` - The port of the nameserver. Default `53`
+
+    Raises:
+        dns.exception.FormError - When the zone transfer is refused or malformed
+        dns.exception.Timeout - When a message or the whole transfer took too long
+
+    Returns:
+        `async generator` - of `dnsq.Record`
+
+    """
+    if LOGGER.isEnabledFor(logging.INFO):
+        LOGGER.info(dict(domain=domain, nameserver=nameserver, lifetime=lifetime, timeout=timeout, port=port))
+    zone = dnsq.get_absolute_name(domain)
+    request = dns.message.make_query(zone, dns.rdatatype.AXFR)
+    deadline = _deadline(lifetime)
+
+    reader, writer = await _open_tcp(nameserver, port, _message_timeout(timeout, deadline))
+    try:
+        wire = request.to_wire()
+        writer.write(struct.pack('!H', len(wire)) + wire)
+
+        soa_rrset = None
+        tsig_ctx = None
+        first = True
+        done = False
+        while not done:
+            wire = await _read_tcp_message(reader, _message_timeout(timeout, deadline))
+            message = dns.message.from_wire(wire, keyring=request.keyring, request_mac=request.mac, xfr=True,
+                                            origin=zone, tsig_ctx=tsig_ctx, multi=True, first=first)
+            tsig_ctx = message.tsig_ctx
+            first = False
+            answer = message.answer
+
+            if soa_rrset is None:
+                if not answer or answer[0].name != dns.name.empty:
+                    raise dns.exception.FormError('No answer or RRset not for qname')
+                if answer[0].rdtype != dns.rdatatype.SOA:
+                    raise dns.exception.FormError('first RRset is not an SOA')
+                soa_rrset = answer[0]
+                for rdata in soa_rrset:
+                    yield dnsq.Record(soa_rrset.name, soa_rrset.ttl, soa_rrset.rdclass, soa_rrset.rdtype, rdata)
+                answer = answer[1:]
+
+            for rrset in answer:
+                if done:
+                    raise dns.exception.FormError('answers after final SOA')
+
+                # an AXFR opens and closes with the zone's SOA, only yield it once
+                if rrset.rdtype == dns.rdatatype.SOA and rrset.name == dns.name.empty:
+                    done = True
+                    continue
+
+                for rdata in rrset:
+                    yield dnsq.Record(rrset.name, rrset.ttl, rrset.rdclass, rrset.rdtype, rdata)
+    finally:
+        writer.close()
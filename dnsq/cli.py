@@ -8,10 +8,18 @@ from __future__ import unicode_literals
 # from io import open
 
 import argparse
+import itertools
 import dnsq
+import dnsq.consistency
+import dnsq.diff
+import dnsq.index
+import dnsq.metrics
+import dnsq.network
+import dnsq.output
 import dnsq.release
+import dnsq.reverse
+import dnsq.serial
 import logging
-import re
 import sys
 
 PROG = 'dnsq'
@@ -26,11 +34,9 @@ def create_parser():
 
     """
     parser = argparse.ArgumentParser(prog=PROG, description=DESCRIPTION)
-    resolver = dnsq.create_resolver()
-    default_domain = resolver.search[0]
-    default_nameserver = resolver.nameservers[0]
     default_timeout = dnsq.DEFAULT_LIFETIME
     default_sort_by = 'hostname'
+    default_workers = dnsq.DEFAULT_WORKERS
 
     parser.add_argument('--version',
                         action='version',
@@ -45,24 +51,41 @@ def create_parser():
                         )
 
     parser.add_argument('-d', '--domain',
-                        default=default_domain,
                         required=False,
-                        help='The domain to query. Default "{}"'.format(default_domain)
+                        help='The domain to query. Default the search domain of the system resolver'
                         )
 
     parser.add_argument('-n', '--nameserver',
-                        default=default_nameserver,
-                        help='The nameserver to query. Default "{}"'.format(default_nameserver)
+                        help='The nameserver to query. Default the first nameserver of the system resolver'
                         )
 
     parser.add_argument('-q', '--query',
                         help='Query and filter the zone transfer for a particular record'
                         )
 
+    parser.add_argument('-w', '--where',
+                        action='append',
+                        type=where_predicate,
+                        metavar='EXPRESSION',
+                        help=('Query the zone transfer for the records matching every EXPRESSION, may be repeated. '
+                              'An EXPRESSION is FIELD OPERATOR VALUE where FIELD is name, type or rdata and OPERATOR is '
+                              '"=" (exact), "^=" (prefix), "~" (regex) or "in" (CIDR, rdata only). '
+                              'Ex: "rdata in 192.168.1.0/24"')
+                        )
+
+    parser.add_argument('--cidr',
+                        action='append',
+                        type=cidr_network,
+                        metavar='NETWORK',
+                        help=('Query the zone transfer for the A, AAAA and PTR records with an address in NETWORK, '
+                              'may be repeated to match any of several networks. Ex: 192.168.1.0/24 or fd00::/64')
+                        )
+
     parser.add_argument('--sort-by',
                         choices=['hostname', 'ip'],
                         required=False,
-                        help='Only used with QUERY option, allows sorting the results. Default "{}"'.format(default_sort_by)
+                        help=('Allows sorting the QUERY results, default "{}". '
+                              'A zone transfer is streamed in the order the nameserver sends it unless "hostname" is given').format(default_sort_by)
                         )
 
     parser.add_argument('-v', '--verbose',
@@ -86,9 +109,290 @@ def create_parser():
                         help='If domain supports a zone transfer exit 0, otherwise exit 1',
                         )
 
+    parser.add_argument('--scan-axfr', '--scan-zone-transfer',
+                        metavar='FILE',
+                        type=argparse.FileType('r'),
+                        required=False,
+                        help=('Check every "domain nameserver" pair in FILE ("-" for stdin) for zone transfer support, '
+                              'printing "domain nameserver status" as each check finishes')
+                        )
+
+    parser.add_argument('-o', '--output',
+                        metavar='PATH',
+                        required=False,
+                        help='Write the ns, soa, axfr, query, --domains-from, --ptr and --check-ptr results to PATH instead of stdout'
+                        )
+
+    parser.add_argument('--domains-from',
+                        metavar='FILE',
+                        type=argparse.FileType('r'),
+                        required=False,
+                        help=('Look up the --type ns or soa records of every domain in FILE ("-" for stdin), one domain per line, '
+                              'concurrently through one resolver and print the results in the order they finish')
+                        )
+
+    parser.add_argument('--format',
+                        choices=dnsq.output.FORMATS,
+                        default=dnsq.output.DEFAULT_FORMAT,
+                        help=('The output format of the ns, soa, axfr, query, --domains-from, --ptr and --check-ptr results. "csv" has a header, '
+                              '"ndjson" is a JSON object per line and "json" an array of them. '
+                              '--domains-from writes "text" as "tsv". Default "{}"').format(dnsq.output.DEFAULT_FORMAT)
+                        )
+
+    parser.add_argument('--preserve-order',
+                        action='store_true',
+                        default=False,
+                        help='Print the --domains-from and --ptr results in the order they were given instead of the order they finish'
+                        )
+
+    parser.add_argument('--ptr',
+                        action='append',
+                        type=ptr_target,
+                        metavar='TARGET',
+                        help=('Look up the PTR records of TARGET, an address or every address of a network in CIDR notation, '
+                              'may be repeated. Ex: 192.168.0.0/16. The lookups run --workers at a time and are printed '
+                              'as "address status ptr" as they finish')
+                        )
+
+    parser.add_argument('--ptr-from',
+                        metavar='FILE',
+                        type=argparse.FileType('r'),
+                        required=False,
+                        help='Like --ptr for every address or network in FILE ("-" for stdin), one per line'
+                        )
+
+    parser.add_argument('--snapshot-dir',
+                        metavar='DIR',
+                        required=False,
+                        help=('Keep a snapshot of each zone transfer in DIR and read the zone from it, '
+                              'instead of transferring it again, while the SOA serial of the zone is unchanged')
+                        )
+
+    parser.add_argument('--check-ptr',
+                        action='append',
+                        type=reverse_zone,
+                        metavar='ZONE',
+                        help=('Transfer the zone and the reverse zone ZONE from the nameserver at the same time and print the '
+                              'addresses whose A/AAAA and PTR records do not agree as "address problem names ptrs", where problem '
+                              'is one of {}, may be repeated. Ex: 1.168.192.in-addr.arpa. '
+                              'Exit 0 when they agree, 1 when they do not and 2 when a zone transfer failed').format(
+                                  ', '.join(dnsq.consistency.PROBLEMS))
+                        )
+
+    parser.add_argument('--diff',
+                        action='append',
+                        metavar='NAMESERVER',
+                        help=('Transfer the zone from the nameserver and every NAMESERVER at the same time and print the records '
+                              'some of them are missing as "nameserver missing record", may be repeated. '
+                              'Exit 0 when they agree, 1 when they do not and 2 when a zone transfer failed')
+                        )
+
+    parser.add_argument('--check-serials',
+                        action='store_true',
+                        default=False,
+                        required=False,
+                        help=('Ask every address of every NS of domain for its SOA serial at the same time and print '
+                              '"nameserver address serial milliseconds status" for each. Exit 0 when they agree, otherwise 1')
+                        )
+
+    parser.add_argument('--metrics-file',
+                        metavar='PATH',
+                        required=False,
+                        help=('Write the latency, bytes, messages, records, retries and timeouts of every query and zone transfer '
+                              'to PATH in the Prometheus text format when done, Ex: for the textfile collector of the node exporter')
+                        )
+
+    parser.add_argument('--workers',
+                        action='store',
+                        required=False,
+                        type=int,
+                        default=default_workers,
+                        help='The maximum number of checks to run at the same time. Default {}'.format(default_workers)
+                        )
+
     return parser
 
 
+def read_pairs(fd):
+    """Read (domain, nameserver) pairs, one whitespace separated pair per line
+
+    Blank lines and lines starting with "#" are skipped, so are lines with less than two fields,
+    with a warning, rather than stopping a scan halfway through the file.
+
+    Args:
+        fd `file` - An open file like object
+
+    Returns:
+        `generator` - of (domain `str`, nameserver `str`)
+
+    """
+    for number, line in enumerate(fd, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        fields = line.split()
+        if len(fields) < 2:
+            dnsq.LOGGER.warning('Skipping line %s of %s, expected "domain nameserver", got: %r', number, getattr(fd, 'name', '-'), line)
+            continue
+        yield (fields[0], fields[1])
+
+
+def read_domains(fd):
+    """Read domains, or anything else given one per line, the first whitespace separated field of each line
+
+    Blank lines and lines starting with "#" are skipped.
+
+    Args:
+        fd `file` - An open file like object
+
+    Returns:
+        `generator` - of `str`
+
+    """
+    for line in fd:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        yield line.split()[0]
+
+
+LOOKUP_FIELDS = ('domain', 'type', 'status', 'record')
+LOOKUP_DOMAIN_FIELDS = ('domain', 'type', 'status', 'records')
+NS_FIELDS = ('domain', 'nameserver')
+PTR_FIELDS = ('address', 'status', 'ptr')
+CONSISTENCY_FIELDS = ('address', 'problem', 'names', 'ptrs')
+SOA_FIELDS = ('domain', 'mname', 'rname', 'serial', 'refresh', 'retry', 'expire', 'minimum')
+
+
+def create_writer(options, fields, text_fields=None):
+    """Create the `dnsq.output.OutputWriter` of --format that writes UTF-8 to --output, or to stdout when it was not given
+
+    Both are written as binary streams, in chunks of `dnsq.output.BINARY_CHUNK_ROWS` rows.
+    """
+    if options.output:
+        stream = open(options.output, 'wb')
+    else:
+        # anything printed so far has to come out first
+        sys.stdout.flush()
+        stream = getattr(sys.stdout, 'buffer', sys.stdout)
+
+    return dnsq.output.create_writer(options.format, stream, fields, text_fields=text_fields, chunk_rows=dnsq.output.BINARY_CHUNK_ROWS,
+                                     encoding='utf-8', close_stream=bool(options.output))
+
+
+def lookup_rows(domain, rdtype, records, error, per_domain=False):
+    """Return the rows of one `dnsq.lookup_records` result
+
+    Args:
+        domain `str` - The domain that was looked up.
+        rdtype `str` - `NS` or `SOA`
+        records `list` - of `str` for NS, of `list` for SOA
+        error `Exception` or `None` - Why there are no records.
+        per_domain `bool` - When `True` one `LOOKUP_DOMAIN_FIELDS` row with every record, otherwise a `LOOKUP_FIELDS` row
+                            per record or one row without a record for an error. Default `False`
+
+    Returns:
+        `list` - of `tuple`
+
+    """
+    status = 'ok' if error is None else type(error).__name__
+    records = [x if isinstance(x, dnsq.STRING_TYPE) else ' '.join(x) for x in records]
+
+    if per_domain:
+        return [(domain, rdtype, status, records)]
+    return [(domain, rdtype, status, record) for record in records or ['']]
+
+
+def problem_row(problem, lists=False):
+    """Return the `CONSISTENCY_FIELDS` row of a `dnsq.consistency.Problem`
+
+    The names are joined by commas, "-" when there are none, or kept as lists when lists is `True`.
+    """
+    if lists:
+        return (problem.address_text, problem.problem, list(problem.names), list(problem.ptrs))
+    return (problem.address_text, problem.problem, ','.join(problem.names) or '-', ','.join(problem.ptrs) or '-')
+
+
+def soa_row(domain, soa):
+    """Return the `SOA_FIELDS` row of one of the `dnsq.soa_records`, with the numbers as `int`"""
+    return (domain, soa[0], soa[1]) + tuple(int(x) for x in soa[2:])
+
+
+def cidr_network(text):
+    """An argparse type for --cidr, see `dnsq.network.parse_network`"""
+    try:
+        return dnsq.network.parse_network(text)
+    except ValueError as exp:
+        raise argparse.ArgumentTypeError(str(exp))
+
+
+def ptr_target(text):
+    """An argparse type for --ptr, an address or a network, see `dnsq.network.parse_network`"""
+    cidr_network(text)
+    return text
+
+
+def reverse_zone(text):
+    """An argparse type for --check-ptr, a zone under in-addr.arpa or ip6.arpa"""
+    if dnsq.network.reverse_network(dnsq.get_absolute_name(text)) is None:
+        raise argparse.ArgumentTypeError('Expected a reverse zone under in-addr.arpa or ip6.arpa, got {!r}'.format(text))
+    return text
+
+
+def where_predicate(text):
+    """An argparse type for --where, see `dnsq.index.parse_predicate`"""
+    try:
+        return dnsq.index.parse_predicate(text)
+    except ValueError as exp:
+        raise argparse.ArgumentTypeError(str(exp))
+
+
+def set_resolver_defaults(options):
+    """Fill in the domain and nameserver options that were not given from the system resolver
+
+    Only the modes that talk to a nameserver need them, so `--version` and `--help`
+    never read the system resolver configuration.
+
+    Args:
+        options `argparse.Namespace` - The parsed options, changed in place.
+
+    Returns:
+        `argparse.Namespace` - options
+
+    """
+    if options.domain and options.nameserver:
+        return options
+
+    resolver = dnsq.create_resolver()
+    if not options.domain:
+        options.domain = resolver.search[0]
+    if not options.nameserver:
+        options.nameserver = resolver.nameservers[0]
+
+    return options
+
+
+def snapshot_options(options):
+    """Return the `dnsq.zone_transfer` keyword arguments for --snapshot-dir, none when it was not given"""
+    if options.snapshot_dir:
+        return dict(snapshot_dir=options.snapshot_dir)
+    return {}
+
+
+def serial_line(report, server):
+    """Format one `dnsq.serial.ServerSerial` of report as "nameserver address serial milliseconds status"
+
+    status is "ok" for the highest serial, "behind" for a lower one and the error when there is no serial.
+    """
+    if server.error is not None:
+        return ' '.join([server.nameserver or report.domain, server.address or '-', '-', '-', 'error: {}'.format(server.error)])
+
+    status = 'ok' if report.agrees(server) else 'behind'
+    return ' '.join([server.nameserver, server.address, str(server.serial), '{:.1f}'.format(server.seconds * 1000), status])
+
+
 def execute(argv=None):
     """Execute the command line with argv
 
@@ -98,42 +402,105 @@ def execute(argv=None):
     """
     parser = create_parser()
     options = parser.parse_args(argv)
-    resolver = None
 
+    logging.basicConfig(level=logging.WARNING, format=dnsq.LOGGING_FORMAT, datefmt=dnsq.LOGGING_DATE_FORMAT)
     if options.verbose == 1:
         dnsq.LOGGER.setLevel(logging.INFO)
     elif options.verbose >= 2:
         dnsq.LOGGER.setLevel(logging.DEBUG)
 
-    if options.domain and options.nameserver:
+    if not options.metrics_file:
+        run(parser, options)
+        return
+
+    registry = dnsq.metrics.MetricsRegistry()
+    dnsq.metrics.register(registry)
+    try:
+        run(parser, options)
+    finally:
+        dnsq.metrics.unregister(registry)
+        registry.write_prometheus(options.metrics_file)
+
+
+def run(parser, options):
+    """Run the mode options select, exits with the status of the mode
+
+    Args:
+        parser `argparse.ArgumentParser` - The parser of options, for usage errors
+        options `argparse.Namespace` - The parsed command line
+
+    """
+    resolver = None
+
+    if options.query or options.where or options.cidr or options.supports_axfr or options.type or options.diff or options.check_serials or options.ptr or options.ptr_from \
+            or options.check_ptr:
+        set_resolver_defaults(options)
+
+    if options.type in ('ns', 'soa') or options.check_serials or options.ptr or options.ptr_from:
         resolver = dnsq.create_resolver(search=options.domain, nameservers=options.nameserver, lifetime=options.timeout)
         options.resolver = resolver
 
-    if options.query:
-        regex = re.compile(r'{!s}'.format(options.query))
-        dnsq.LOGGER.info('Searching zone transfer for the following query: "{}"'.format(regex.pattern))
+    if options.query or options.where or options.cidr:
+        predicates = list(options.where or [])
+        if options.cidr:
+            predicates.append(dnsq.index.Predicate('rdata', 'cidr', dnsq.network.CIDRSet(options.cidr)))
+        if options.query:
+            predicates.append(dnsq.index.Predicate(dnsq.index.FIELDS, 'regex', r'{!s}'.format(options.query)))
+        dnsq.LOGGER.info('Searching zone transfer for the following predicates: %s', predicates)
         err_msg = 'The query option requires the zone transfer capability for domain={} nameserver={}'.format(options.domain, options.nameserver)
-        assert dnsq.supports_zone_transfer(domain=options.domain, nameserver=options.nameserver, lifetime=options.timeout), err_msg
-
-        results = []
-        for line in dnsq.zone_transfer(domain=options.domain, nameserver=options.nameserver, lifetime=options.timeout):
-            for item in line:
-                if regex.search(item):
-                    hostname, rec_type, alias = (line[0], line[-2], line[-1])
-                    if options.sort_by == 'ip':
-                        result = ' '.join([alias, rec_type, hostname])
-                    elif options.sort_by == 'hostname' or options.sort_by is None:
-                        result = ' '.join([hostname, rec_type, alias])
-                    results.append(result)
+        transfer = dnsq.ZoneTransfer(domain=options.domain, nameserver=options.nameserver, lifetime=options.timeout, **snapshot_options(options))
+        assert transfer.supported, err_msg
+
+        records = dnsq.index.ZoneIndex(transfer, origin=options.domain).query(*predicates)
 
         # sort the results
-        if options.sort_by is None or options.sort_by == 'hostname':
-            sorted_results = '\n'.join(sorted(results))
-            print(sorted_results)
-        elif options.sort_by == 'ip':
-            sorted_results = '\n'.join(dnsq.sort_ips(results))
-            print(sorted_results)
+        if options.sort_by == 'ip':
+            rows = [dnsq.output.record_row(record) for record in dnsq.sort_records(records, origin=options.domain)]
+            text_fields = ('rdata', 'type', 'name')
+        else:
+            rows = sorted((dnsq.output.record_row(record) for record in records), key=lambda x: (x[0], x[3], x[4]))
+            text_fields = ('name', 'type', 'rdata')
 
+        with create_writer(options, dnsq.output.RECORD_FIELDS, text_fields=text_fields) as writer:
+            writer.write_rows(rows)
+        sys.exit(0)
+
+    if options.diff:
+        if len(set([options.nameserver] + options.diff)) < 2:
+            parser.error('--diff requires a NAMESERVER other than --nameserver {}'.format(options.nameserver))
+        diff = dnsq.diff.diff_zone_transfers(options.domain, [options.nameserver] + options.diff, lifetime=options.timeout,
+                                             **snapshot_options(options))
+        for record, missing in diff:
+            for nameserver in missing:
+                print(' '.join([nameserver, 'missing', record.to_text()]))
+        for nameserver, error in sorted(diff.errors.items()):
+            sys.stderr.write('ERR: The zone transfer for domain: "{}" via nameserver: "{}" failed: {!r}\n'.format(options.domain, nameserver, error))
+        if diff.errors:
+            sys.exit(2)
+        sys.exit(0 if diff.in_sync else 1)
+
+    if options.check_ptr:
+        report = dnsq.consistency.check_ptr_consistency(options.domain, options.check_ptr, options.nameserver, lifetime=options.timeout,
+                                                        **snapshot_options(options))
+        lists = options.format in ('ndjson', 'json')
+        with create_writer(options, CONSISTENCY_FIELDS) as writer:
+            writer.write_rows(problem_row(problem, lists) for problem in report)
+        for zone, error in sorted(report.errors.items()):
+            sys.stderr.write('ERR: The zone transfer for domain: "{}" via nameserver: "{}" failed: {!r}\n'.format(zone, options.nameserver, error))
+        if report.errors:
+            sys.exit(2)
+        sys.exit(0 if report.consistent else 1)
+
+    if options.check_serials:
+        report = dnsq.serial.check_serials(options.domain, resolver, timeout=options.timeout)
+        for server in report:
+            print(serial_line(report, server))
+        sys.exit(0 if report.in_sync else 1)
+
+    if options.scan_axfr:
+        for transfer in dnsq.scan_zone_transfers(read_pairs(options.scan_axfr), workers=options.workers, lifetime=options.timeout):
+            print(' '.join([transfer.domain, transfer.nameserver, transfer.status]))
+            sys.stdout.flush()
         sys.exit(0)
 
     if options.supports_axfr:
@@ -142,14 +509,48 @@ def execute(argv=None):
             sys.exit(0)
         sys.exit(1)
 
+    if options.ptr or options.ptr_from:
+        targets = itertools.chain(options.ptr or [], read_domains(options.ptr_from) if options.ptr_from else [])
+        results = dnsq.reverse.lookup_ptrs(resolver, targets, workers=options.workers, ordered=options.preserve_order)
+        with create_writer(options, PTR_FIELDS) as writer:
+            for address, names, error in results:
+                status = 'ok' if error is None else type(error).__name__
+                writer.write_rows((address, status, name) for name in names or [''])
+                # every result is written as soon as it arrives
+                writer.flush()
+        sys.exit(0)
+
+    if options.domains_from:
+        if options.type not in ('ns', 'soa'):
+            parser.error('--domains-from requires --type ns or --type soa')
+
+        rdtype = options.type.upper()
+        per_domain = options.format in ('ndjson', 'json')
+        if options.format == 'text':
+            options.format = 'tsv'
+
+        results = dnsq.lookup_records(resolver, read_domains(options.domains_from), rdtype=rdtype, workers=options.workers,
+                                      ordered=options.preserve_order)
+        with create_writer(options, LOOKUP_DOMAIN_FIELDS if per_domain else LOOKUP_FIELDS) as writer:
+            for domain, records, error in results:
+                writer.write_rows(lookup_rows(domain, rdtype, records, error, per_domain=per_domain))
+                # every result is written as soon as it arrives
+                writer.flush()
+        sys.exit(0)
+
     if options.type == 'ns':
         recs = dnsq.ns_records(resolver, domain=options.domain)
-        rec_str = ' '.join(recs)
-        print(rec_str)
+        with create_writer(options, NS_FIELDS, text_fields=NS_FIELDS[1:]) as writer:
+            if options.format == 'text':
+                # every nameserver on one line
+                writer.write((options.domain, ' '.join(recs)))
+            else:
+                writer.write_rows((options.domain, rec) for rec in recs)
         sys.exit(0)
     elif options.type == 'soa':
         recs = dnsq.soa_records(resolver, domain=options.domain)
-        print('\n'.join([' '.join(rec) for rec in recs]))
+        with create_writer(options, SOA_FIELDS, text_fields=SOA_FIELDS[1:]) as writer:
+            writer.write_rows(soa_row(options.domain, rec) for rec in recs)
         sys.exit(0)
     elif options.type == 'axfr' or options.type == 'zone-transfer':
         err_msg = (
@@ -160,10 +561,12 @@ def execute(argv=None):
             nameserver=options.nameserver
         )
 
-        if dnsq.supports_zone_transfer(domain=options.domain, nameserver=options.nameserver, lifetime=options.timeout) is False:
+        sort = options.sort_by == 'hostname'
+        transfer = dnsq.ZoneTransfer(domain=options.domain, nameserver=options.nameserver, lifetime=options.timeout, sort=sort,
+                                     **snapshot_options(options))
+        if transfer.supported is False:
             sys.stderr.write(err_msg)
             sys.exit(1)
-        for line in dnsq.zone_transfer(domain=options.domain, nameserver=options.nameserver, lifetime=options.timeout):
-            result = ' '.join(line)
-            print(result)
+        with create_writer(options, dnsq.output.RECORD_FIELDS) as writer:
+            writer.write_rows(dnsq.output.record_row(record) for record in transfer)
         sys.exit(0)
@@ -0,0 +1,271 @@
+# coding: utf-8
+"""Check that the A/AAAA records of a zone and the PTR records of its reverse zones agree
+
+The forward zone and the reverse zones are transferred at the same time, each into a hash index
+of its own: address to names for the A/AAAA records, the set of names that have one, and address
+to PTR names for the reverse zones. The indexes are then joined in one pass over each of them, so
+a zone of hundreds of thousands of records costs a few dictionary lookups per record.
+
+Names are compared and reported as absolute names in lower case, Ex: `dc-app-01.foo-domain.com.`
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import dns.rdatatype
+import dnsq
+import dnsq.network
+import dnsq.output
+import logging
+
+# an address with A/AAAA records and no PTR record
+MISSING_PTR = 'missing-ptr'
+# a PTR record of a name in the zone without any A/AAAA record
+MISSING_A = 'missing-a'
+# an address with both, where the PTR records do not name any of the A/AAAA records,
+# or a PTR record of a name whose A/AAAA records have other addresses
+MISMATCH = 'mismatch'
+
+PROBLEMS = (MISSING_PTR, MISSING_A, MISMATCH)
+
+_ADDRESS_TYPES = (dns.rdatatype.A, dns.rdatatype.AAAA)
+
+
+class Problem(collections.namedtuple('Problem', ['problem', 'version', 'address', 'names', 'ptrs'])):
+    """An address whose A/AAAA and PTR records do not agree
+
+    Attributes:
+        problem `str` - One of `PROBLEMS`
+        version `int` - 4 or 6
+        address `int` - The address, see `dnsq.network.parse_address`
+        names `tuple` - of `str`, the names with an A/AAAA record of address, sorted
+        ptrs `tuple` - of `str`, the names of the PTR records of address, sorted
+
+    """
+    __slots__ = ()
+
+    @property
+    def address_text(self):
+        """The address as text. Ex: `192.168.1.20`"""
+        return dnsq.network.format_address(self.version, self.address)
+
+
+class ConsistencyReport(object):
+    """The A/AAAA and PTR records of domain and its reverse zones that do not agree
+
+    Args:
+        domain `str` - The forward zone.
+        reverse_domains `list` - of `str`, the reverse zones.
+        problems `list` - of `Problem`, sorted by address
+        counts `dict` - of zone to the number of records it sent
+        errors `dict` - of zone to the `Exception` that stopped its zone transfer
+
+    """
+
+    def __init__(self, domain, reverse_domains, problems, counts, errors):
+        self.domain = domain
+        self.reverse_domains = reverse_domains
+        self.problems = problems
+        self.counts = counts
+        self.errors = errors
+
+    @property
+    def consistent(self):
+        """`True` when every zone was transferred and every A/AAAA record has a matching PTR record and the other way around"""
+        return not self.errors and not self.problems
+
+    def __iter__(self):
+        return iter(self.problems)
+
+    def __len__(self):
+        return len(self.problems)
+
+
+def name_key(name, origin):
+    """Return the absolute name as lower case text, the key of the name indexes"""
+    if not name.is_absolute():
+        name = name.derelativize(origin)
+    return dnsq.output.name_text(name).lower()
+
+
+def forward_index(records, origin):
+    """Index the A/AAAA records of a zone
+
+    Args:
+        records `iterable` - of `dnsq.Record`, Ex: from `dnsq.zone_transfer`
+        origin `dns.name.Name` - The zone, for records with relative names.
+
+    Returns:
+        `tuple` - (addresses `dict` of (version, address) to a `set` of names, names `set` of the names with an A/AAAA record,
+                   count `int` of records)
+
+    """
+    parse_address = dnsq.network.parse_address
+    addresses = {}
+    names = set()
+    count = 0
+    for record in records:
+        count += 1
+        if record.rdtype not in _ADDRESS_TYPES:
+            continue
+        name = name_key(record.name, origin)
+        names.add(name)
+        address = parse_address(record.rdata.address)
+        entry = addresses.get(address)
+        if entry is None:
+            addresses[address] = {name}
+        else:
+            entry.add(name)
+    return addresses, names, count
+
+
+def reverse_index(records, origin):
+    """Index the PTR records of a reverse zone
+
+    Args:
+        records `iterable` - of `dnsq.Record`, Ex: from `dnsq.zone_transfer`
+        origin `dns.name.Name` - The reverse zone, for records with relative names.
+
+    Returns:
+        `tuple` - (ptrs `dict` of (version, address) to a `set` of names, count `int` of records)
+
+    """
+    reverse_network = dnsq.network.reverse_network
+    ptrs = {}
+    count = 0
+    for record in records:
+        count += 1
+        if record.rdtype != dns.rdatatype.PTR:
+            continue
+        name = record.name if record.name.is_absolute() else record.name.derelativize(origin)
+        network = reverse_network(name)
+        # only the name of a single address, Ex: not a delegation of 1.168.192.in-addr.arpa.
+        if network is None or network[1] != network[2]:
+            continue
+        address = network[:2]
+        target = name_key(record.rdata.target, origin)
+        entry = ptrs.get(address)
+        if entry is None:
+            ptrs[address] = {target}
+        else:
+            entry.add(target)
+    return ptrs, count
+
+
+def find_problems(addresses, names, ptrs, domain, networks):
+    """Join the indexes of `forward_index` and `reverse_index`, one pass over each
+
+    Args:
+        addresses `dict` - of (version, address) to names, from `forward_index`
+        names `set` - of the names with an A/AAAA record, from `forward_index`
+        ptrs `dict` - of (version, address) to PTR names, from `reverse_index`
+        domain `str` - The forward zone, as a key of `name_key`. Ex: `foo-domain.com.`
+        networks `dnsq.network.CIDRSet` - The networks of the reverse zones, addresses outside of them need no PTR record
+
+    Returns:
+        `list` - of `Problem` sorted by address
+
+    """
+    suffix = '.' + domain
+    problems = []
+
+    for address, forward in addresses.items():
+        if address not in ptrs and address in networks:
+            problems.append(Problem(MISSING_PTR, address[0], address[1], tuple(sorted(forward)), ()))
+
+    for address, reverse in ptrs.items():
+        forward = addresses.get(address)
+        if forward is not None:
+            if forward.isdisjoint(reverse):
+                problems.append(Problem(MISMATCH, address[0], address[1], tuple(sorted(forward)), tuple(sorted(reverse))))
+            continue
+
+        # PTR records of names in other zones are for those zones to answer for
+        ours = [x for x in reverse if x == domain or x.endswith(suffix)]
+        if not ours:
+            continue
+        problem = MISMATCH if any(x in names for x in ours) else MISSING_A
+        problems.append(Problem(problem, address[0], address[1], (), tuple(sorted(reverse))))
+
+    problems.sort(key=lambda x: (x.version, x.address))
+    return problems
+
+
+def check_ptr_consistency(domain, reverse_domains, nameserver, reverse_nameserver=None, timeout=dnsq.DEFAULT_TIMEOUT,
+                          lifetime=dnsq.DEFAULT_LIFETIME, *args, **kwargs):
+    """Transfer domain and its reverse zones concurrently and find the A/AAAA and PTR records that do not agree
+
+    Reported are the A/AAAA records in the networks of the reverse zones without a PTR record, the PTR records
+    of names in domain without an A/AAAA record and the addresses where the two point at different names.
+
+    Args:
+        domain `str` - The forward zone. Ex: `foo-domain.com`.
+        reverse_domains `list` - of `str`, the reverse zones. Ex: `['1.168.192.in-addr.arpa']`
+        nameserver `str` - The name server to transfer domain from. Ex: `67.77.255.142`.
+        reverse_nameserver `str` - The name server to transfer the reverse zones from. Default `None`, nameserver
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend doing each transfer.
+        args `tuple` - positional args to pass to `dnsq.zone_transfer`
+        kwargs `dict` - key value pairs to pass to `dnsq.zone_transfer`, Ex: `port=5353`
+
+    Raises:
+        AssertionError - When there are no reverse zones or one of them is not under in-addr.arpa or ip6.arpa
+
+    Returns:
+        `ConsistencyReport`
+
+    """
+    reverse_domains = list(reverse_domains)
+    assert reverse_domains, 'Expected at least one reverse zone, got {}'.format(reverse_domains)
+
+    origins = [dnsq.get_absolute_name(x) for x in [domain] + reverse_domains]
+    networks = []
+    for reverse_domain, origin in zip(reverse_domains, origins[1:]):
+        network = dnsq.network.reverse_network(origin)
+        assert network is not None, 'Expected a reverse zone under in-addr.arpa or ip6.arpa, got {}'.format(reverse_domain)
+        networks.append(network)
+
+    if reverse_nameserver is None:
+        reverse_nameserver = nameserver
+
+    if dnsq.LOGGER.isEnabledFor(logging.INFO):
+        dnsq.LOGGER.info(dict(domain=domain, reverse_domains=reverse_domains, nameserver=nameserver, reverse_nameserver=reverse_nameserver,
+                              lifetime=lifetime, timeout=timeout, args=args, kwargs=kwargs))
+
+    zones = [domain] + reverse_domains
+
+    def transfer(index):
+        # every zone is indexed by the thread that transfers it, there is nothing to share until they are joined
+        try:
+            records = dnsq.zone_transfer(zones[index], nameserver if index == 0 else reverse_nameserver,
+                                         timeout=timeout, lifetime=lifetime, *args, **kwargs)
+            if index == 0:
+                return index, forward_index(records, origins[index]), None
+            return index, reverse_index(records, origins[index]), None
+        except dnsq.ZONE_TRANSFER_ERRORS as exp:
+            dnsq.LOGGER.debug('The zone transfer for domain: %s failed: %r', zones[index], exp)
+            return index, None, exp
+
+    counts = {}
+    errors = {}
+    addresses, names, ptrs = {}, set(), {}
+    for index, result, error in dnsq.concurrent_map(transfer, range(len(zones)), workers=len(zones)):
+        if error is not None:
+            errors[zones[index]] = error
+            continue
+        if index == 0:
+            addresses, names, counts[zones[index]] = result
+        else:
+            reverse, counts[zones[index]] = result
+            if not ptrs:
+                ptrs = reverse
+            else:
+                for address, targets in reverse.items():
+                    ptrs.setdefault(address, set()).update(targets)
+
+    problems = []
+    if not errors:
+        problems = find_problems(addresses, names, ptrs, name_key(origins[0], None), dnsq.network.CIDRSet(networks))
+
+    return ConsistencyReport(domain, reverse_domains, problems, counts, errors)
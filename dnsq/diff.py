@@ -0,0 +1,145 @@
+# coding: utf-8
+"""Compare the zone transfers of one zone from several nameservers, Ex: a primary and its secondaries
+
+The zone is transferred from every nameserver at the same time. A record is only held in memory
+until every nameserver has sent it, so when the nameservers send their zones in about the same order
+the memory used follows the number of differences rather than the size of the zone.
+
+Records are keyed by their canonical wire format, see `record_key`, which is cheap to hash and to
+compare and is computed by each transfer without holding the shared lock.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import dnsq
+import logging
+import struct
+import threading
+
+RR_FIELDS = struct.Struct('!IHH')
+
+
+class ZoneDiff(object):
+    """The differences between the zone transfers of domain from nameservers
+
+    Args:
+        domain `str` - The zone.
+        nameservers `list` - of `str`, the nameservers in the order they were given.
+        differences `list` - of (record `dnsq.Record`, missing `tuple`), the records that some of the
+                             nameservers did not send and the nameservers that did not send them
+        counts `dict` - of nameserver to the number of records it sent
+        errors `dict` - of nameserver to the `Exception` that stopped its zone transfer
+
+    """
+
+    def __init__(self, domain, nameservers, differences, counts, errors):
+        self.domain = domain
+        self.nameservers = nameservers
+        self.differences = differences
+        self.counts = counts
+        self.errors = errors
+
+    @property
+    def in_sync(self):
+        """`True` when every nameserver sent the same records"""
+        return not self.errors and not self.differences
+
+    def __iter__(self):
+        return iter(self.differences)
+
+    def __len__(self):
+        return len(self.differences)
+
+
+def record_key(record, origin):
+    """Return the canonical wire format of a record, the same for equal records no matter the case of their names
+
+    Args:
+        record `dnsq.Record`
+        origin `dns.name.Name` - The absolute name of the zone, for records with relative names.
+
+    Returns:
+        `bytes`
+
+    """
+    return b''.join([record.name.to_digestable(origin),
+                     RR_FIELDS.pack(record.ttl, record.rdclass, record.rdtype),
+                     record.rdata.to_digestable(origin)])
+
+
+def diff_zone_transfers(domain, nameservers, timeout=dnsq.DEFAULT_TIMEOUT, lifetime=dnsq.DEFAULT_LIFETIME, *args, **kwargs):
+    """Transfer domain from every nameserver concurrently and find the records they do not agree on
+
+    Records are compared by name, TTL, class, type and rdata, so a record with another TTL on one
+    of the nameservers shows up as missing from each side.
+
+    Args:
+        domain `str` - The domain to transfer. Ex: `foo-domain.com`.
+        nameservers `list` - of `str`, at least two nameservers. Ex: `['67.77.255.142', '67.77.255.143']`
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend doing each transfer.
+        args `tuple` - positional args to pass to `dnsq.zone_transfer`
+        kwargs `dict` - key value pairs to pass to `dnsq.zone_transfer`, Ex: `port=5353`
+
+    Raises:
+        AssertionError - When there are less than two distinct nameservers
+
+    Returns:
+        `ZoneDiff`
+
+    """
+    nameservers = list(_unique(nameservers))
+    assert len(nameservers) >= 2, 'Expected at least two nameservers, got {}'.format(nameservers)
+
+    if dnsq.LOGGER.isEnabledFor(logging.INFO):
+        dnsq.LOGGER.info(dict(domain=domain, nameservers=nameservers, lifetime=lifetime, timeout=timeout, args=args, kwargs=kwargs))
+
+    origin = dnsq.get_absolute_name(domain)
+    everyone = (1 << len(nameservers)) - 1
+    # record key to [the bitmask of the nameservers that sent it, the record], a record leaves as soon as everyone sent it
+    pending = {}
+    lock = threading.Lock()
+
+    def transfer(index):
+        seen = 1 << index
+        count = 0
+        try:
+            for record in dnsq.zone_transfer(domain, nameservers[index], timeout=timeout, lifetime=lifetime, *args, **kwargs):
+                count += 1
+                key = record_key(record, origin)
+                with lock:
+                    entry = pending.get(key)
+                    if entry is None:
+                        pending[key] = [seen, record]
+                    elif entry[0] | seen == everyone:
+                        del pending[key]
+                    else:
+                        entry[0] |= seen
+        except dnsq.ZONE_TRANSFER_ERRORS as exp:
+            dnsq.LOGGER.debug('The zone transfer for domain: %s via nameserver: %s failed: %r', domain, nameservers[index], exp)
+            return index, count, exp
+        return index, count, None
+
+    counts = {}
+    errors = {}
+    for index, count, error in dnsq.concurrent_map(transfer, range(len(nameservers)), workers=len(nameservers)):
+        counts[nameservers[index]] = count
+        if error is not None:
+            errors[nameservers[index]] = error
+
+    differences = []
+    for sent, record in sorted(pending.values(), key=lambda x: (x[1].name, x[1].rdtype, x[1].to_text())):
+        missing = tuple(x for i, x in enumerate(nameservers) if not sent & (1 << i))
+        differences.append((record, missing))
+
+    return ZoneDiff(domain, nameservers, differences, counts, errors)
+
+
+def _unique(items):
+    """Yield items without the ones that were seen before, in their order"""
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
@@ -0,0 +1,284 @@
+# coding: utf-8
+"""An in-memory index over the records of a zone for repeated, selective queries
+
+The indexes are built per field the first time an exact, prefix or CIDR lookup needs them,
+so a query on the type of a record never pays for indexing the rdata. Once a field is indexed
+every distinct value of it is only looked at once, no matter how many records share it.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import dns.rdatatype
+import dnsq
+import dnsq.network
+import re
+import sys
+
+FIELDS = ('name', 'type', 'rdata')
+OPERATORS = ('exact', 'prefix', 'regex', 'cidr')
+ADDRESS_TYPES = (dns.rdatatype.A, dns.rdatatype.AAAA, dns.rdatatype.PTR)
+
+# the text of each field of a `dnsq.Record`
+FIELD_TEXT = {
+    'name': lambda record: record.hostname,
+    'type': lambda record: record.type,
+    'rdata': lambda record: record.rdata.to_text(),
+}
+
+# ordered so that "^=" is tried before "="
+PREDICATE_REGEX = re.compile(r'^\s*(?P<fields>[a-z]+(?:\s*,\s*[a-z]+)*)\s*(?P<operator>\^=|=|~|\sin\s)\s*(?P<value>.+?)\s*$')
+PREDICATE_OPERATORS = {
+    '=': 'exact',
+    '^=': 'prefix',
+    '~': 'regex',
+    'in': 'cidr',
+}
+
+
+class Predicate(collections.namedtuple('Predicate', ['fields', 'operator', 'value'])):
+    """A condition on one or more fields of a record, it holds when any of the fields matches
+
+    Attributes:
+        fields `tuple` - of field names, see `FIELDS`
+        operator `str` - One of `OPERATORS`
+        value `str` - The value, prefix, regular expression or network to match, cidr also takes a `dnsq.network.CIDRSet`
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, fields, operator, value):
+        if not isinstance(fields, (list, tuple)):
+            fields = (fields,)
+        fields = tuple(fields)
+
+        assert operator in OPERATORS, 'Expected operator to be one of {}, got {}'.format(OPERATORS, operator)
+        for field in fields:
+            assert field in FIELDS, 'Expected field to be one of {}, got {}'.format(FIELDS, field)
+        assert operator != 'cidr' or fields == ('rdata',), 'Expected cidr to be used on rdata only, got {}'.format(fields)
+
+        return super(Predicate, cls).__new__(cls, fields, operator, value)
+
+
+def parse_predicate(text):
+    """Parse a predicate expression
+
+    Expressions look like `FIELD OPERATOR VALUE` where FIELD is one or more comma separated `FIELDS`.
+
+        name=dc-app-01                exact
+        name^=dc-app                  prefix
+        name,rdata~192\\.168\\.1\\.     regex, matches when any of the fields matches
+        rdata in 192.168.1.0/24       cidr, the address of A, AAAA and PTR records
+
+    Args:
+        text `str` - The expression.
+
+    Raises:
+        ValueError - When text is not a valid expression
+
+    Returns:
+        `Predicate`
+
+    """
+    match = PREDICATE_REGEX.match(text)
+    if match is None:
+        raise ValueError('Expected "FIELD OPERATOR VALUE" with an operator of =, ^=, ~ or in, got {!r}'.format(text))
+
+    fields = tuple(x.strip() for x in match.group('fields').split(','))
+    operator = PREDICATE_OPERATORS[match.group('operator').strip()]
+    value = match.group('value')
+
+    unknown = [x for x in fields if x not in FIELDS]
+    if unknown:
+        raise ValueError('Expected fields to be some of {}, got {}'.format(', '.join(FIELDS), ', '.join(unknown)))
+
+    if operator == 'cidr':
+        if fields != ('rdata',):
+            raise ValueError('Expected "in" to be used on rdata only, got {!r}'.format(text))
+        dnsq.network.parse_network(value)
+    elif operator == 'regex':
+        try:
+            re.compile(value)
+        except re.error as exp:
+            raise ValueError('Expected a regular expression, got {!r}: {}'.format(value, exp))
+
+    return Predicate(fields, operator, value)
+
+
+class ZoneIndex(object):
+    """Index the records of a zone by name, type, rdata and address
+
+    Args:
+        records `iterable` - of `dnsq.Record`, Ex: a `dnsq.ZoneTransfer`
+        origin `str` or `dns.name.Name` - The zone relative owner names belong to, it is only needed
+                                         to find the addresses of PTR records. Default `None`
+
+    Ex:
+        index = ZoneIndex(dnsq.zone_transfer('foo-domain.com', '67.77.255.142'))
+        index.query(Predicate('rdata', 'cidr', '192.168.1.0/24'), Predicate('name', 'prefix', 'dc-'))
+
+    """
+
+    def __init__(self, records, origin=None):
+        self.records = list(records)
+        self.origin = None if origin is None else dnsq.get_absolute_name(origin)
+        self._values = {}
+        self._sorted_values = {}
+        self._addresses = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def _index(self, field):
+        """Return the `dict` of field text to the positions of the records with that text"""
+        index = self._values.get(field)
+        if index is None:
+            text = FIELD_TEXT[field]
+            index = {}
+            for position, record in enumerate(self.records):
+                index.setdefault(text(record), []).append(position)
+            self._values[field] = index
+        return index
+
+    def _sorted(self, field):
+        values = self._sorted_values.get(field)
+        if values is None:
+            values = self._sorted_values[field] = sorted(self._index(field))
+        return values
+
+    def exact(self, field, value):
+        """Return the positions of the records whose field is value"""
+        return list(self._index(field).get(value, ()))
+
+    def prefix(self, field, value):
+        """Return the positions of the records whose field starts with value"""
+        index = self._index(field)
+        values = self._sorted(field)
+        positions = []
+        for i in range(bisect.bisect_left(values, value), len(values)):
+            if not values[i].startswith(value):
+                break
+            positions.extend(index[values[i]])
+        return positions
+
+    def regex(self, fields, pattern, positions=None):
+        """Return the positions of the records where any of fields matches the regular expression pattern
+
+        Only the distinct values are searched when every field is indexed already, otherwise the
+        records are searched in a single pass, which is cheaper than building indexes for one query.
+
+        Args:
+            fields `str` or `tuple` - of field names, see `FIELDS`
+            pattern `str` or compiled regular expression
+            positions `iterable` - Only search the records at these positions. Default `None`, every record
+
+        """
+        if not isinstance(fields, (list, tuple)):
+            fields = (fields,)
+        search = re.compile(pattern).search
+
+        if positions is None and all(field in self._values for field in fields):
+            matched = set()
+            for field in fields:
+                for value, matches in self._values[field].items():
+                    if search(value):
+                        matched.update(matches)
+            return sorted(matched)
+
+        if positions is None:
+            candidates = enumerate(self.records)
+        else:
+            candidates = ((x, self.records[x]) for x in sorted(positions))
+
+        texts = [FIELD_TEXT[field] for field in fields]
+        matched = []
+        for position, record in candidates:
+            for text in texts:
+                if search(text(record)):
+                    matched.append(position)
+                    break
+        return matched
+
+    def cidr(self, networks):
+        """Return the positions of the A, AAAA and PTR records whose address is in any of networks
+
+        See `dnsq.network.record_address` for the address of a record.
+
+        Args:
+            networks `str`, `tuple` or `dnsq.network.CIDRSet` - Ex: `192.168.1.0/24`, a (version, first, last)
+                                                               tuple from `dnsq.network.parse_network` or many networks
+
+        """
+        if not isinstance(networks, dnsq.network.CIDRSet):
+            networks = [networks]
+
+        addresses = self._address_index()
+        positions = []
+        for network in networks:
+            if not isinstance(network, tuple):
+                network = dnsq.network.parse_network(network)
+            version, first, last = network
+
+            start = bisect.bisect_left(addresses, (version, first))
+            end = bisect.bisect_right(addresses, (version, last, sys.maxsize))
+            positions.extend(x[2] for x in addresses[start:end])
+        return positions
+
+    def _address_index(self):
+        """Return the sorted `list` of (version, address, position) of every record with an address"""
+        if self._addresses is None:
+            addresses = []
+            for position, record in enumerate(self.records):
+                if record.rdtype in ADDRESS_TYPES:
+                    address = dnsq.network.record_address(record, self.origin)
+                    if address is not None:
+                        addresses.append(address + (position,))
+            addresses.sort()
+            self._addresses = addresses
+        return self._addresses
+
+    def select(self, predicate, positions=None):
+        """Return the `set` of positions of the records that satisfy predicate
+
+        Args:
+            predicate `Predicate`
+            positions `set` - The candidates so far, a regex only searches these. Default `None`, every record
+
+        """
+        if predicate.operator == 'cidr':
+            return set(self.cidr(predicate.value))
+        if predicate.operator == 'regex':
+            return set(self.regex(predicate.fields, predicate.value, positions=positions))
+
+        lookup = getattr(self, predicate.operator)
+        positions = set()
+        for field in predicate.fields:
+            positions.update(lookup(field, predicate.value))
+        return positions
+
+    def query(self, *predicates):
+        """Return the records that satisfy every predicate, each record once and in zone order
+
+        Args:
+            predicates `tuple` - of `Predicate`, no predicates returns every record
+
+        Returns:
+            `list` - of `dnsq.Record`
+
+        """
+        if not predicates:
+            return list(self.records)
+
+        # the lookups narrow the candidates down before a regex has to search them
+        predicates = sorted(predicates, key=lambda x: x.operator == 'regex')
+
+        positions = None
+        for predicate in predicates:
+            selected = self.select(predicate, positions=positions)
+            positions = selected if positions is None else positions & selected
+            if not positions:
+                return []
+
+        return [self.records[x] for x in sorted(positions)]
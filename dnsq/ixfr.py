@@ -0,0 +1,262 @@
+# coding: utf-8
+"""Bring a local copy of a zone up to date with an incremental zone transfer (IXFR, RFC 1995)
+
+The nameserver is asked for the changes since the serial of the local copy and they are applied
+to it, so only the records that changed cross the network. A nameserver that refuses IXFR is asked
+for the whole zone with AXFR instead, a nameserver that has no history back to the serial answers
+with the whole zone by itself. Either way the result reports the records that were added and deleted.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import dns.exception
+import dns.rdatatype
+import dnsq
+import dnsq.metrics
+import logging
+
+
+class ZoneDelta(collections.namedtuple('ZoneDelta', ['serial', 'next_serial', 'deleted', 'added'])):
+    """One difference sequence of an IXFR, the changes that took the zone from serial to next_serial
+
+    Attributes:
+        serial `int` - The serial the changes apply to.
+        next_serial `int` - The serial of the zone after the changes.
+        deleted `list` - of `dnsq.Record`, without the SOA
+        added `list` - of `dnsq.Record`, without the SOA
+
+    """
+    __slots__ = ()
+
+
+class IncrementalTransfer(object):
+    """The zone after an `incremental_zone_transfer` and how it changed
+
+    Args:
+        records `list` - of `dnsq.Record`, the zone at serial with the SOA first, the records that
+                         did not change are the objects of the local copy in its order
+        previous_serial `int` - The serial of the local copy of the zone.
+        added `list` - of `dnsq.Record`, the records that were added since previous_serial
+        deleted `list` - of `dnsq.Record`, the records that were deleted since previous_serial
+        deltas `list` - of `ZoneDelta`, the difference sequences the nameserver sent
+        incremental `bool` - `False` when the whole zone was transferred
+
+    Attributes:
+        serial `int` - The serial of the zone now.
+
+    """
+
+    def __init__(self, records, previous_serial, added, deleted, deltas, incremental):
+        self.records = records
+        self.serial = _find_soa(records).rdata.serial
+        self.previous_serial = previous_serial
+        self.added = added
+        self.deleted = deleted
+        self.deltas = deltas
+        self.incremental = incremental
+
+    @property
+    def changed(self):
+        """`True` when the zone is not the same as the local copy"""
+        return self.serial != self.previous_serial or bool(self.added or self.deleted)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+def record_key(record):
+    """Return what identifies a record in a zone, records that only differ by TTL share a key
+
+    Args:
+        record `dnsq.Record`
+
+    Returns:
+        `tuple` - (name, rdclass, rdtype, rdata)
+
+    """
+    return (record.name, record.rdclass, record.rdtype, record.rdata)
+
+
+def _find_soa(records):
+    for record in records:
+        if record.rdtype == dns.rdatatype.SOA:
+            return record
+    raise ValueError('Expected the records of the zone to contain its SOA')
+
+
+def incremental_zone_transfer(domain, nameserver, records, serial=None, timeout=dnsq.DEFAULT_TIMEOUT, lifetime=dnsq.DEFAULT_LIFETIME,
+                              *args, **kwargs):
+    """Bring records, a local copy of the zone of domain, up to date with IXFR
+
+    Falls back to `dnsq.zone_transfer` when nameserver refuses the IXFR.
+
+    Args:
+        domain `str` - The domain to transfer. Ex: `zonetransfer.me`.
+        nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
+        records `iterable` - of `dnsq.Record`, Ex: a `dnsq.snapshot.Snapshot`
+        serial `int` - The serial of records. Default `None`, the serial of the SOA in records
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend doing the transfer.
+        args `tuple` - positional args to pass to `dns.query.xfr`
+        kwargs `dict` - key value pairs to pass to `dns.query.xfr`, Ex: `port=5353`
+
+    Raises:
+        ValueError - When serial is `None` and records does not contain the SOA of the zone
+        dns.exception.FormError - When the nameserver refuses both IXFR and AXFR
+        dns.exception.Timeout - When the nameserver does not answer in time
+
+    Returns:
+        `IncrementalTransfer`
+
+    """
+    import dns.query
+
+    records = list(records)
+    if serial is None:
+        serial = _find_soa(records).rdata.serial
+
+    if dnsq.LOGGER.isEnabledFor(logging.INFO):
+        dnsq.LOGGER.info(dict(domain=domain, nameserver=nameserver, serial=serial, lifetime=lifetime, timeout=timeout, args=args, kwargs=kwargs))
+    measurement = dnsq.metrics.start('ixfr', nameserver)
+    try:
+        messages = dns.query.xfr(where=nameserver, zone=domain, rdtype=dns.rdatatype.IXFR, serial=serial, timeout=timeout, lifetime=lifetime,
+                                 *args, **kwargs)
+        if measurement is not None:
+            messages = dnsq.metrics.measure_messages(messages, measurement)
+        answer = [dnsq.Record(rrset.name, rrset.ttl, rrset.rdclass, rrset.rdtype, rdata)
+                  for message in messages for rrset in message.answer for rdata in rrset]
+        if measurement is not None:
+            measurement.finish()
+    except dns.exception.FormError as exp:
+        dnsq.LOGGER.debug('The IXFR for domain: %s via nameserver: %s failed, falling back to AXFR: %r', domain, nameserver, exp)
+        zone = list(dnsq.zone_transfer(domain, nameserver, timeout=timeout, lifetime=lifetime, *args, **kwargs))
+        return compare_zones(records, zone, previous_serial=serial)
+
+    return apply_ixfr(records, answer, previous_serial=serial)
+
+
+def apply_ixfr(records, answer, previous_serial=None):
+    """Apply the answer to an IXFR to records
+
+    Args:
+        records `list` - of `dnsq.Record`, the zone at previous_serial
+        answer `list` - of `dnsq.Record`, every record of the IXFR answer in the order they were sent
+        previous_serial `int` - The serial of records. Default `None`, the serial of the SOA in records
+
+    Raises:
+        dns.exception.FormError - When answer is not an IXFR answer
+
+    Returns:
+        `IncrementalTransfer`
+
+    """
+    if previous_serial is None:
+        previous_serial = _find_soa(records).rdata.serial
+
+    if not answer or answer[0].rdtype != dns.rdatatype.SOA:
+        raise dns.exception.FormError('The IXFR did not start with an SOA')
+    soa = answer[0]
+
+    # one SOA means the zone is up to date
+    if len(answer) == 1:
+        return IncrementalTransfer(list(records), previous_serial, [], [], [], incremental=True)
+
+    # anything but an SOA after the first one is the whole zone, closed with the SOA again
+    if answer[1].rdtype != dns.rdatatype.SOA or answer[1].rdata.serial == soa.rdata.serial:
+        return compare_zones(records, answer[:-1], previous_serial=previous_serial)
+
+    deltas = _difference_sequences(answer)
+
+    # only the records of a name and type that changed are keyed, the rest of the zone is kept as it is
+    touched = set((x.name, x.rdtype) for delta in deltas for x in delta.deleted + delta.added)
+    kept = []
+    zone = collections.OrderedDict()
+    for record in records:
+        if record.rdtype == dns.rdatatype.SOA:
+            continue
+        if (record.name, record.rdtype) in touched:
+            zone[record_key(record)] = record
+        else:
+            kept.append(record)
+
+    added = collections.OrderedDict()
+    deleted = collections.OrderedDict()
+
+    for delta in deltas:
+        for record in delta.deleted:
+            key = record_key(record)
+            old = zone.pop(key, None)
+            if key in added:
+                del added[key]
+            elif old is not None:
+                deleted[key] = old
+
+        for record in delta.added:
+            key = record_key(record)
+            zone[key] = record
+            if key in deleted:
+                # deleted and added back, maybe with a new TTL
+                del deleted[key]
+            else:
+                added[key] = record
+
+    updated = [soa]
+    updated.extend(kept)
+    updated.extend(zone.values())
+    return IncrementalTransfer(updated, previous_serial, list(added.values()), list(deleted.values()), deltas, incremental=True)
+
+
+def _difference_sequences(answer):
+    """Split an IXFR answer into its `ZoneDelta`, each one is an old SOA, the deletions, a new SOA and the additions"""
+    deltas = []
+    last = len(answer) - 1
+    i = 1
+    while i < last:
+        serial = answer[i].rdata.serial
+        i += 1
+
+        deleted = []
+        while i < last and answer[i].rdtype != dns.rdatatype.SOA:
+            deleted.append(answer[i])
+            i += 1
+
+        if i >= last:
+            raise dns.exception.FormError('The IXFR difference sequence from serial {} has no new SOA'.format(serial))
+        next_serial = answer[i].rdata.serial
+        i += 1
+
+        added = []
+        while i < last and answer[i].rdtype != dns.rdatatype.SOA:
+            added.append(answer[i])
+            i += 1
+
+        deltas.append(ZoneDelta(serial, next_serial, deleted, added))
+    return deltas
+
+
+def compare_zones(records, zone, previous_serial=None):
+    """Compare two complete copies of a zone, the result of a transfer of the whole zone
+
+    Args:
+        records `list` - of `dnsq.Record`, the zone at previous_serial
+        zone `list` - of `dnsq.Record`, the zone now
+        previous_serial `int` - The serial of records. Default `None`, the serial of the SOA in records
+
+    Returns:
+        `IncrementalTransfer` - with incremental `False`
+
+    """
+    if previous_serial is None:
+        previous_serial = _find_soa(records).rdata.serial
+
+    old = set(record_key(x) for x in records if x.rdtype != dns.rdatatype.SOA)
+    new = set(record_key(x) for x in zone if x.rdtype != dns.rdatatype.SOA)
+    added = [x for x in zone if x.rdtype != dns.rdatatype.SOA and record_key(x) not in old]
+    deleted = [x for x in records if x.rdtype != dns.rdatatype.SOA and record_key(x) not in new]
+
+    return IncrementalTransfer(list(zone), previous_serial, added, deleted, [], incremental=False)
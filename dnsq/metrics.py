@@ -0,0 +1,362 @@
+# coding: utf-8
+"""Measure the network operations of dnsq: latency, bytes, messages, records, retries and timeouts
+
+A collector is any callable, it is called with an `Observation` whenever a measured operation
+finishes, from the thread that ran it. `MetricsRegistry` is a collector that aggregates them per
+operation and nameserver and exports them in the Prometheus text format:
+
+    registry = dnsq.metrics.MetricsRegistry()
+    dnsq.metrics.register(registry)
+    list(dnsq.zone_transfer('foo-domain.com', '67.77.255.142'))
+    registry.write_prometheus('/var/lib/node_exporter/dnsq.prom')
+
+The operations are `query` (`dnsq.query`), `zone_transfer`, `probe_zone_transfer`, `ixfr` and `query_serial`.
+While no collector is registered measuring an operation costs one test of an empty list.
+
+dnspython does not tell how many bytes it read, so while a collector is registered the sockets
+`dns.query` opens for a measured operation count the bytes they receive. Every socket is one
+attempt, the retries of an operation are its attempts after the first one.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import dns.exception
+import io
+import os
+import threading
+import time
+
+# the collectors, the operations only test whether it is empty
+COLLECTORS = []
+
+# the upper bounds in seconds of the latency histogram buckets, the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_LOCAL = threading.local()
+_LOCK = threading.Lock()
+# dns.query.socket_factory before register replaced it
+_SOCKET_FACTORY = None
+
+# python 2 has no os.replace, its os.rename replaces the target on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+class Observation(collections.namedtuple('Observation', ['operation', 'nameserver', 'seconds', 'bytes', 'messages', 'records',
+                                                         'attempts', 'error'])):
+    """One finished operation
+
+    Attributes:
+        operation `str` - What was done. Ex: `zone_transfer`
+        nameserver `str` - Who it was done with, the nameservers of a resolver are joined by commas.
+        seconds `float` - How long it took.
+        bytes `int` - The number of bytes received.
+        messages `int` - The number of response messages received.
+        records `int` - The number of records in the answer sections of the messages.
+        attempts `int` - The number of sockets opened, `0` when the answer came from a cache.
+        error `Exception` or `None` - Why the operation failed. Ex: `dns.exception.Timeout`
+
+    """
+    __slots__ = ()
+
+    @property
+    def retries(self):
+        """The attempts after the first one"""
+        return max(self.attempts - 1, 0)
+
+    @property
+    def timed_out(self):
+        """`True` when the operation failed with `dns.exception.Timeout`"""
+        return isinstance(self.error, dns.exception.Timeout)
+
+
+class Measurement(object):
+    """An operation that is being measured, see `start`
+
+    The sockets `dns.query` opens while the measurement is entered as a context manager count their
+    bytes and attempts into it. `finish` hands the `Observation` to the collectors.
+    """
+
+    def __init__(self, operation, nameserver):
+        self.operation = operation
+        self.nameserver = nameserver
+        self.bytes = 0
+        self.messages = 0
+        self.records = 0
+        self.attempts = 0
+        self.started = time.time()
+        self.finished = False
+        self._previous = []
+
+    def __enter__(self):
+        self._previous.append(getattr(_LOCAL, 'measurement', None))
+        _LOCAL.measurement = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _LOCAL.measurement = self._previous.pop()
+
+    def add_message(self, message):
+        """Count a response message and the records of its answer section"""
+        self.messages += 1
+        for rrset in message.answer:
+            self.records += len(rrset)
+
+    def finish(self, error=None):
+        """Hand the `Observation` to every collector, only the first call does anything"""
+        if self.finished:
+            return
+        self.finished = True
+        observation = Observation(self.operation, self.nameserver, time.time() - self.started, self.bytes, self.messages, self.records,
+                                  self.attempts, error)
+        for collector in list(COLLECTORS):
+            collector(observation)
+
+
+def start(operation, nameserver):
+    """Start measuring an operation
+
+    Args:
+        operation `str` - Ex: `zone_transfer`
+        nameserver `str` or `list` - The nameserver, or the nameservers of a resolver.
+
+    Returns:
+        `Measurement` or `None` when no collector is registered
+
+    """
+    if not COLLECTORS:
+        return None
+    if isinstance(nameserver, (list, tuple)):
+        nameserver = ','.join(nameserver)
+    return Measurement(operation, nameserver)
+
+
+def measure(operation, nameserver, func, *args, **kwargs):
+    """Call func(*args, **kwargs), an operation that receives a single response, and measure it
+
+    Args:
+        operation `str` - Ex: `query`
+        nameserver `str` or `list` - The nameserver, or the nameservers of a resolver.
+        func `callable` - Returns a `dns.message.Message` or a `dns.resolver.Answer`
+
+    Returns:
+        What func returned
+
+    """
+    measurement = start(operation, nameserver)
+    if measurement is None:
+        return func(*args, **kwargs)
+
+    try:
+        with measurement:
+            result = func(*args, **kwargs)
+    except Exception as exp:
+        measurement.finish(exp)
+        raise
+
+    measurement.add_message(getattr(result, 'response', result))
+    measurement.finish()
+    return result
+
+
+def measure_messages(messages, measurement):
+    """Yield the response messages of a zone transfer, counting them into measurement
+
+    The sockets opened while a message is read count into measurement. An error reading a message
+    finishes measurement with that error, otherwise the caller calls `Measurement.finish`.
+
+    Args:
+        messages `iterable` - of `dns.message.Message`, Ex: from `dns.query.xfr`
+        measurement `Measurement`
+
+    Returns:
+        `generator` - of `dns.message.Message`
+
+    """
+    messages = iter(messages)
+    try:
+        while True:
+            try:
+                with measurement:
+                    message = next(messages, None)
+            except Exception as exp:
+                measurement.finish(exp)
+                raise
+            if message is None:
+                return
+            measurement.add_message(message)
+            yield message
+    finally:
+        # closing this closes the transfer, Ex: when the caller stops early
+        close = getattr(messages, 'close', None)
+        if close is not None:
+            close()
+
+
+def register(collector):
+    """Call collector with the `Observation` of every measured operation from now on
+
+    Args:
+        collector `callable` - Ex: a `MetricsRegistry`
+
+    """
+    global _SOCKET_FACTORY
+    import dns.query
+
+    with _LOCK:
+        if _SOCKET_FACTORY is None:
+            _SOCKET_FACTORY = dns.query.socket_factory
+            dns.query.socket_factory = _socket_factory
+        COLLECTORS.append(collector)
+
+
+def unregister(collector):
+    """Stop calling collector, once the last one is gone sockets are no longer counted"""
+    global _SOCKET_FACTORY
+    import dns.query
+
+    with _LOCK:
+        if collector in COLLECTORS:
+            COLLECTORS.remove(collector)
+        if not COLLECTORS and _SOCKET_FACTORY is not None:
+            dns.query.socket_factory = _SOCKET_FACTORY
+            _SOCKET_FACTORY = None
+
+
+def _socket_factory(*args, **kwargs):
+    sock = _SOCKET_FACTORY(*args, **kwargs)
+    measurement = getattr(_LOCAL, 'measurement', None)
+    if measurement is None:
+        return sock
+    measurement.attempts += 1
+    return _CountingSocket(sock, measurement)
+
+
+class _CountingSocket(object):
+    """A socket that counts the bytes it receives into a `Measurement`"""
+
+    def __init__(self, sock, measurement):
+        self._sock = sock
+        self._measurement = measurement
+
+    def recv(self, *args):
+        data = self._sock.recv(*args)
+        self._measurement.bytes += len(data)
+        return data
+
+    def recvfrom(self, *args):
+        data, address = self._sock.recvfrom(*args)
+        self._measurement.bytes += len(data)
+        return data, address
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class MetricsRegistry(object):
+    """A collector that aggregates the observations per (operation, nameserver)
+
+    Args:
+        buckets `tuple` - The upper bounds in seconds of the latency histogram. Default `DEFAULT_BUCKETS`
+
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, observation):
+        key = (observation.operation, observation.nameserver)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = dict(count=0, seconds=0.0, bytes=0, messages=0, records=0, retries=0, timeouts=0,
+                                                  errors=collections.Counter(), buckets=[0] * (len(self.buckets) + 1))
+            series['count'] += 1
+            series['seconds'] += observation.seconds
+            series['bytes'] += observation.bytes
+            series['messages'] += observation.messages
+            series['records'] += observation.records
+            series['retries'] += observation.retries
+            series['buckets'][bisect.bisect_left(self.buckets, observation.seconds)] += 1
+            if observation.error is not None:
+                series['errors'][type(observation.error).__name__] += 1
+                if observation.timed_out:
+                    series['timeouts'] += 1
+
+    def snapshot(self):
+        """Return a copy of the aggregates
+
+        Returns:
+            `dict` - of (operation, nameserver) to a `dict` of count, seconds, bytes, messages, records, retries,
+                     timeouts, errors (a `dict` of exception name to count) and buckets (a `list` of counts per bucket,
+                     not cumulative, the last one for slower operations than the last bound)
+
+        """
+        with self._lock:
+            return dict((key, dict(series, errors=dict(series['errors']), buckets=list(series['buckets'])))
+                        for key, series in self._series.items())
+
+    def to_prometheus(self):
+        """Return the aggregates in the Prometheus text exposition format
+
+        Returns:
+            `str`
+
+        """
+        series = sorted(self.snapshot().items())
+        lines = []
+
+        def metric(name, kind, text):
+            lines.append('# HELP {} {}'.format(name, text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        name = 'dnsq_operation_duration_seconds'
+        metric(name, 'histogram', 'The time dnsq operations took.')
+        for key, values in series:
+            total = 0
+            for bound, count in zip(self.buckets + (None,), values['buckets']):
+                total += count
+                le = '+Inf' if bound is None else repr(float(bound))
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, _labels(key), le, total))
+            lines.append('{}_sum{{{}}} {!r}'.format(name, _labels(key), values['seconds']))
+            lines.append('{}_count{{{}}} {}'.format(name, _labels(key), values['count']))
+
+        for field, text in [('bytes', 'The bytes received.'), ('messages', 'The response messages received.'),
+                            ('records', 'The records received in answer sections.'), ('retries', 'The attempts after the first one.'),
+                            ('timeouts', 'The operations that timed out.')]:
+            name = 'dnsq_{}_total'.format(field)
+            metric(name, 'counter', text)
+            for key, values in series:
+                lines.append('{}{{{}}} {}'.format(name, _labels(key), values[field]))
+
+        name = 'dnsq_errors_total'
+        metric(name, 'counter', 'The operations that failed, by exception.')
+        for key, values in series:
+            for error, count in sorted(values['errors'].items()):
+                lines.append('{}{{{},error="{}"}} {}'.format(name, _labels(key), _escape(error), count))
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Write `to_prometheus` to path, replacing it in one step so a scraper never reads half of it
+
+        Args:
+            path `str` - Ex: a `.prom` file in the textfile directory of the node exporter
+
+        """
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with io.open(temp_path, 'w', encoding='utf-8') as fd:
+            fd.write(self.to_prometheus())
+        _replace(temp_path, path)
+
+
+def _labels(key):
+    return 'operation="{}",nameserver="{}"'.format(_escape(key[0]), _escape(key[1]))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
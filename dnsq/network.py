@@ -0,0 +1,311 @@
+# coding: utf-8
+"""Parse IPv4 and IPv6 addresses and networks into integers
+
+Addresses are parsed once into (version, integer) pairs so that they can be compared,
+sorted and tested for network membership with plain integer arithmetic.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import binascii
+import bisect
+import dns.exception
+import dns.rdatatype
+import socket
+import struct
+
+FAMILIES = {
+    4: (socket.AF_INET, 32),
+    6: (socket.AF_INET6, 128),
+}
+
+# IPv6 sort keys are offset so that every IPv6 address sorts after every IPv4 address
+IPV6_KEY_OFFSET = 1 << 128
+
+_unpack_ipv4 = struct.Struct('!L').unpack
+_pack_ipv4 = struct.Struct('!L').pack
+_HEX_DIGITS = b'0123456789abcdef'
+
+try:
+    _from_bytes = int.from_bytes
+except AttributeError:  # python 2
+    def _from_bytes(packed, byteorder):
+        return int(binascii.hexlify(packed), 16)
+
+
+def _to_bytes(value, length):
+    return binascii.unhexlify('{:0{}x}'.format(value, length * 2))
+
+
+def address_version(text):
+    """Return 6 when text looks like an IPv6 address, otherwise 4"""
+    return 6 if ':' in text else 4
+
+
+def parse_address(text):
+    """Parse an IPv4 or IPv6 address
+
+    Args:
+        text `str` - The address. Ex: `192.168.1.20` or `fd00::14`
+
+    Raises:
+        ValueError - When text is not an IP address
+
+    Returns:
+        `tuple` - (version `int`, address `int`)
+
+    """
+    version = address_version(text)
+    try:
+        packed = socket.inet_pton(FAMILIES[version][0], text)
+    except (socket.error, UnicodeError):
+        raise ValueError('Expected an IPv{} address, got {!r}'.format(version, text))
+    if version == 4:
+        return (4, _unpack_ipv4(packed)[0])
+    return (6, _from_bytes(packed, 'big'))
+
+
+def format_address(version, value):
+    """Format an address, the inverse of `parse_address`
+
+    Args:
+        version `int` - 4 or 6
+        value `int` - The address.
+
+    Returns:
+        `str` - Ex: `192.168.1.20` or `fd00::14`
+
+    """
+    if version == 4:
+        return socket.inet_ntop(socket.AF_INET, _pack_ipv4(value))
+    return socket.inet_ntop(socket.AF_INET6, _to_bytes(value, 16))
+
+
+def reverse_name(version, value):
+    """Return the name of the PTR record of an address, built from its labels rather than parsed from text
+
+    Args:
+        version `int` - 4 or 6
+        value `int` - The address.
+
+    Returns:
+        `dns.name.Name` - Ex: `20.1.168.192.in-addr.arpa.`
+
+    """
+    # deferred like in record_address
+    import dns.name
+
+    if version == 4:
+        labels = [str((value >> shift) & 0xff).encode('ascii') for shift in (0, 8, 16, 24)] + [b'in-addr', b'arpa', b'']
+    else:
+        labels = [x.encode('ascii') for x in reversed('{:032x}'.format(value))] + [b'ip6', b'arpa', b'']
+    return dns.name.Name(labels)
+
+
+def reverse_network(name):
+    """Return the network a reverse name is about, the inverse of `reverse_name`
+
+    The name of a PTR record is a network of one address, the name of a reverse zone the network it holds.
+
+    Args:
+        name `dns.name.Name` - An absolute name under in-addr.arpa or ip6.arpa. Ex: `1.168.192.in-addr.arpa.`
+
+    Returns:
+        `tuple` - (version `int`, first address `int`, last address `int`) or `None`, Ex: for a classless delegation
+                  like `0/25.1.168.192.in-addr.arpa.`
+
+    """
+    labels = [x.lower() for x in name.labels]
+    suffix = labels[-3:]
+    if suffix == [b'in-addr', b'arpa', b'']:
+        version, width = 4, 8
+    elif suffix == [b'ip6', b'arpa', b'']:
+        version, width = 6, 4
+    else:
+        return None
+
+    parts = labels[:-3]
+    bits = FAMILIES[version][1]
+    if len(parts) * width > bits:
+        return None
+
+    value = 0
+    for part in reversed(parts):
+        if version == 4:
+            if not (part.isdigit() and len(part) <= 3 and int(part) <= 255):
+                return None
+            value = value << 8 | int(part)
+        else:
+            if not (len(part) == 1 and part in _HEX_DIGITS):
+                return None
+            value = value << 4 | int(part, 16)
+
+    host_bits = bits - len(parts) * width
+    first = value << host_bits
+    return (version, first, first | ((1 << host_bits) - 1))
+
+
+def network_addresses(text):
+    """Return a generator of every address of a network, see `parse_network`, without holding them in memory
+
+    Args:
+        text `str` - The network, a bare address is a network of one address. Ex: `192.168.0.0/16`
+
+    Raises:
+        ValueError - When text is not an address or a network, right away rather than when iterating
+
+    Returns:
+        `generator` - of (version `int`, address `int`)
+
+    """
+    version, first, last = parse_network(text)
+
+    def addresses(value):
+        while value <= last:
+            yield (version, value)
+            value += 1
+    return addresses(first)
+
+
+def address_key(text):
+    """Return an `int` that sorts addresses numerically, IPv4 before IPv6
+
+    Args:
+        text `str` - The address. Ex: `192.168.1.20` or `fd00::14`
+
+    Raises:
+        ValueError - When text is not an IP address
+
+    """
+    # parse_address inlined, this is called once for every address that is sorted
+    try:
+        if ':' in text:
+            return IPV6_KEY_OFFSET + _from_bytes(socket.inet_pton(socket.AF_INET6, text), 'big')
+        return _unpack_ipv4(socket.inet_pton(socket.AF_INET, text))[0]
+    except (socket.error, UnicodeError):
+        raise ValueError('Expected an IP address, got {!r}'.format(text))
+
+
+def parse_network(text):
+    """Parse a network in CIDR notation, a bare address is a network of one address
+
+    Host bits are ignored, so `192.168.1.7/24` is the same network as `192.168.1.0/24`.
+
+    Args:
+        text `str` - The network. Ex: `192.168.1.0/24` or `fd00::/64`
+
+    Raises:
+        ValueError - When text is not an address or the prefix length is out of range
+
+    Returns:
+        `tuple` - (version `int`, first address `int`, last address `int`)
+
+    """
+    address, _, prefix = text.strip().partition('/')
+    version, value = parse_address(address)
+    bits = FAMILIES[version][1]
+
+    if not prefix:
+        return (version, value, value)
+
+    try:
+        length = int(prefix)
+    except ValueError:
+        length = -1
+    if not 0 <= length <= bits:
+        raise ValueError('Expected a prefix length between 0 and {}, got {!r}'.format(bits, text))
+
+    host_mask = (1 << (bits - length)) - 1
+    first = value & ~host_mask
+    return (version, first, first | host_mask)
+
+
+def record_address(record, origin=None):
+    """Return the address a record is about, `None` when it is not about one
+
+    That is the rdata of A and AAAA records and the owner name of PTR records in a reverse zone.
+
+    Args:
+        record `dnsq.Record` - The record.
+        origin `dns.name.Name` - The zone the owner name of @record is relative to. Default `None`, absolute
+
+    Returns:
+        `tuple` - (version `int`, address `int`) or `None`
+
+    """
+    if record.rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+        return parse_address(record.rdata.address)
+
+    if record.rdtype == dns.rdatatype.PTR:
+        # deferred, dns.reversename pulls in dns.name
+        from dns.reversename import to_address
+
+        name = record.name
+        if origin is not None and not name.is_absolute():
+            name = name.derelativize(origin)
+        try:
+            address = to_address(name)
+        except (dns.exception.SyntaxError, ValueError):
+            # not a complete reverse name, Ex: a delegation of 1.168.192.in-addr.arpa.
+            return None
+        if isinstance(address, bytes):
+            address = address.decode('ascii')
+        try:
+            return parse_address(address)
+        except ValueError:
+            return None
+
+    return None
+
+
+class CIDRSet(object):
+    """A set of IPv4 and IPv6 networks kept as sorted, merged address intervals
+
+    Membership is a binary search over the intervals, so it costs the same for one network as for thousands.
+
+    Args:
+        networks `iterable` - of `str` in CIDR notation or (version, first, last) tuples from `parse_network`
+
+    Raises:
+        ValueError - When one of networks is not a network
+
+    Ex:
+        networks = CIDRSet(['192.168.1.0/24', '192.168.2.0/24', 'fd00::/64'])
+        '192.168.2.7' in networks
+
+    """
+
+    def __init__(self, networks=()):
+        intervals = sorted(x if isinstance(x, tuple) else parse_network(x) for x in networks)
+
+        merged = []
+        for version, first, last in intervals:
+            if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+                if last > merged[-1][2]:
+                    merged[-1] = (version, merged[-1][1], last)
+                continue
+            merged.append((version, first, last))
+
+        self.intervals = merged
+        self._starts = [(version, first) for version, first, _ in merged]
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def __contains__(self, address):
+        """Test an address, a `str` or a (version, address) tuple from `parse_address`"""
+        if not isinstance(address, tuple):
+            address = parse_address(address)
+
+        i = bisect.bisect_right(self._starts, address) - 1
+        if i < 0:
+            return False
+        version, _, last = self.intervals[i]
+        return version == address[0] and address[1] <= last
+
+    def __repr__(self):
+        return '{}({} intervals)'.format(type(self).__name__, len(self.intervals))
@@ -0,0 +1,247 @@
+# coding: utf-8
+"""Write the results of the command line as text, TSV, CSV, NDJSON or JSON
+
+Rows are tuples of plain values, one per field, and are formatted into lines that are collected
+and written to the stream in chunks, so a zone of millions of records costs one write per chunk
+instead of one per record. Given an encoding the chunks are encoded once each and written to a
+binary stream, Ex: `sys.stdout.buffer` or a file opened with "wb".
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import csv
+import dns.rdataclass
+import dns.rdatatype
+import json
+import re
+
+FORMATS = ('text', 'tsv', 'csv', 'ndjson', 'json')
+DEFAULT_FORMAT = 'text'
+# the number of rows collected before they are written to the stream
+CHUNK_ROWS = 1000
+# the chunk size for a binary stream, about 256KiB of zone file lines
+BINARY_CHUNK_ROWS = 4096
+
+RECORD_FIELDS = ('name', 'ttl', 'class', 'type', 'rdata')
+
+# the bytes dnspython writes as they are in the text of a name, plus the dots between the labels
+_PLAIN_NAME = re.compile(br'[^\x00-\x20\x7f-\xff"();\\@$]*\Z')
+_RDCLASS_TEXT = {}
+_RDTYPE_TEXT = {}
+
+
+def name_text(name):
+    """Return `dns.name.Name.to_text()` of name, without escaping label by label when nothing needs escaping"""
+    labels = name.labels
+    if len(labels) > 1 or (labels and labels[0]):
+        text = b'.'.join(labels)
+        # a label with a dot of its own has to be escaped
+        if _PLAIN_NAME.match(text) and text.count(b'.') == len(labels) - 1:
+            return text.decode('ascii')
+    return name.to_text()
+
+
+def record_row(record):
+    """Return the `RECORD_FIELDS` row of a `dnsq.Record`, Ex: `('dc-app-01', 7200, 'IN', 'A', '192.168.1.20')`"""
+    rdclass = _RDCLASS_TEXT.get(record.rdclass)
+    if rdclass is None:
+        rdclass = _RDCLASS_TEXT[record.rdclass] = dns.rdataclass.to_text(record.rdclass)
+    rdtype = _RDTYPE_TEXT.get(record.rdtype)
+    if rdtype is None:
+        rdtype = _RDTYPE_TEXT[record.rdtype] = dns.rdatatype.to_text(record.rdtype)
+    return (name_text(record.name), record.ttl, rdclass, rdtype, record.rdata.to_text())
+
+
+class _Lines(list):
+    """A list that `csv.writer` can write to"""
+    write = list.append
+
+
+class OutputWriter(object):
+    """Format rows and write them to stream in chunks
+
+    Use `create_writer` to create one for a format. As a context manager it calls `close` on exit.
+
+    Args:
+        stream `file` - An open file like object, text or binary when encoding is given.
+        fields `tuple` - of `str`, the name of each value of a row.
+        chunk_rows `int` - The number of rows collected before they are written. Default `CHUNK_ROWS`
+        encoding `str` - Encode each chunk and write bytes to stream. Default `None`, write text
+        close_stream `bool` - When `True` `close` closes stream, otherwise it is only flushed. Default `False`
+
+    Attributes:
+        rows `int` - The number of rows written so far.
+
+    """
+
+    def __init__(self, stream, fields, chunk_rows=CHUNK_ROWS, encoding=None, close_stream=False):
+        assert chunk_rows > 0, 'Expected chunk_rows to be greater than 0, got {}'.format(chunk_rows)
+        self.stream = stream
+        self.fields = tuple(fields)
+        self.chunk_rows = chunk_rows
+        self.encoding = encoding
+        self.close_stream = close_stream
+        self.rows = 0
+        self._lines = _Lines()
+        self._started = False
+
+    def format_row(self, row):
+        """Return the row as a line, with its line ending"""
+        raise NotImplementedError
+
+    def write(self, row):
+        """Write a row, a tuple of a value for each field"""
+        if not self._started:
+            self._start()
+        self._lines.append(self.format_row(row))
+        self.rows += 1
+        if len(self._lines) >= self.chunk_rows:
+            self._write_lines()
+
+    def write_rows(self, rows):
+        """Write every row of an iterable, the same as `write` for each without a method call per row"""
+        if not self._started:
+            self._start()
+        lines = self._lines
+        format_row = self.format_row
+        chunk_rows = self.chunk_rows
+        for row in rows:
+            lines.append(format_row(row))
+            self.rows += 1
+            if len(lines) >= chunk_rows:
+                self._write_lines()
+
+    def start(self):
+        """Called before the first row, Ex: to write a header"""
+
+    def finish(self):
+        """Called by `close`, Ex: to write a footer"""
+
+    def flush(self):
+        """Write the rows collected so far and flush the stream"""
+        self._write_lines()
+        self.stream.flush()
+
+    def close(self):
+        """Write everything that is left and flush the stream, or close it when close_stream is `True`"""
+        if not self._started:
+            self._start()
+        self.finish()
+        self.flush()
+        if self.close_stream:
+            self.stream.close()
+
+    def _start(self):
+        self._started = True
+        self.start()
+
+    def _write_lines(self):
+        if self._lines:
+            chunk = ''.join(self._lines)
+            del self._lines[:]
+            if self.encoding is not None:
+                chunk = chunk.encode(self.encoding)
+            self.stream.write(chunk)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextWriter(OutputWriter):
+    """Values separated by a separator, a space for text and a tab for TSV, without a header
+
+    Args:
+        text_fields `tuple` - of `str`, the fields to write and their order. Default `None`, every field
+        separator `str` - Default a space
+
+    """
+
+    def __init__(self, stream, fields, text_fields=None, separator=' ', *args, **kwargs):
+        super(TextWriter, self).__init__(stream, fields, *args, **kwargs)
+        self.separator = separator
+        # one format call per row, Ex: "{0} {1} {2} {3} {4}\n" or "{4} {3} {0}\n" for some of the fields
+        columns = range(len(self.fields)) if text_fields is None else [self.fields.index(x) for x in text_fields]
+        self.template = separator.join('{{{}}}'.format(i) for i in columns) + '\n'
+
+    def format_row(self, row):
+        return self.template.format(*row)
+
+
+class CSVWriter(OutputWriter):
+    """Comma separated values with a header of the field names, quoted where needed, Ex: TXT records"""
+
+    def __init__(self, stream, fields, *args, **kwargs):
+        super(CSVWriter, self).__init__(stream, fields, *args, **kwargs)
+        self._csv = csv.writer(self._lines, lineterminator='\n')
+
+    def start(self):
+        self._csv.writerow(self.fields)
+
+    def format_row(self, row):
+        # the csv module appends the line to _lines itself, take it back for write to append
+        self._csv.writerow(row)
+        return self._lines.pop()
+
+
+class NDJSONWriter(OutputWriter):
+    """One JSON object per line with a key per field"""
+
+    def format_row(self, row):
+        return json.dumps(collections.OrderedDict(zip(self.fields, row))) + '\n'
+
+
+class JSONWriter(NDJSONWriter):
+    """A JSON array of objects with a key per field, written one object at a time"""
+
+    def start(self):
+        self._lines.append('[')
+
+    def format_row(self, row):
+        line = super(JSONWriter, self).format_row(row)
+        return ('\n' if self.rows == 0 else ',\n') + line[:-1]
+
+    def finish(self):
+        self._lines.append('\n]\n' if self.rows else ']\n')
+
+
+WRITERS = {
+    'text': TextWriter,
+    'tsv': TextWriter,
+    'csv': CSVWriter,
+    'ndjson': NDJSONWriter,
+    'json': JSONWriter,
+}
+
+
+def create_writer(fmt, stream, fields, text_fields=None, chunk_rows=CHUNK_ROWS, encoding=None, close_stream=False):
+    """Create the `OutputWriter` for a format
+
+    Args:
+        fmt `str` - One of `FORMATS`
+        stream `file` - An open text file like object. Ex: `sys.stdout`
+        fields `tuple` - of `str`, the name of each value of a row.
+        text_fields `tuple` - of `str`, the fields the text format writes and their order. Default `None`, every field
+        chunk_rows `int` - The number of rows collected before they are written. Default `CHUNK_ROWS`
+        encoding `str` - Encode each chunk and write bytes to stream. Default `None`, write text
+        close_stream `bool` - When `True` closing the writer closes stream. Default `False`
+
+    Raises:
+        AssertionError - When fmt is not one of `FORMATS`
+
+    Returns:
+        `OutputWriter`
+
+    """
+    assert fmt in WRITERS, 'Expected fmt to be one of {}, got {}'.format(', '.join(FORMATS), fmt)
+
+    kwargs = dict(chunk_rows=chunk_rows, encoding=encoding, close_stream=close_stream)
+    if fmt == 'text':
+        return TextWriter(stream, fields, text_fields=text_fields, **kwargs)
+    if fmt == 'tsv':
+        return TextWriter(stream, fields, separator='\t', **kwargs)
+    return WRITERS[fmt](stream, fields, **kwargs)
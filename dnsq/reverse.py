@@ -0,0 +1,69 @@
+# coding: utf-8
+"""Look up the PTR records of many addresses concurrently, Ex: a reverse zone that cannot be transferred
+
+Networks are expanded into their addresses lazily and `dnsq.concurrent_map` only takes addresses as
+the lookups finish, so a /16 never has more than a few times the number of workers in memory.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import dns.exception
+import dnsq
+import dnsq.network
+import logging
+
+
+def expand_targets(targets):
+    """Yield every address of targets, addresses or networks in CIDR notation
+
+    Args:
+        targets `iterable` - of `str`. Ex: `['192.168.1.20', '192.168.2.0/24', 'fd00::/120']`
+
+    Returns:
+        `generator` - of (target `str`, version `int`, address `int`, error `ValueError` or `None`),
+                      a target that is neither an address nor a network is one item with the error
+
+    """
+    for target in targets:
+        try:
+            addresses = dnsq.network.network_addresses(target)
+        except ValueError as exp:
+            yield (target, None, None, exp)
+            continue
+
+        for version, value in addresses:
+            yield (target, version, value, None)
+
+
+def lookup_ptrs(resolver, targets, workers=dnsq.DEFAULT_WORKERS, ordered=False):
+    """Look up the PTR records of every address of targets concurrently, all through the one resolver
+
+    Args:
+        resolver `dns.resolver.Resolver` - A resolver instance, Ex: from `dnsq.create_resolver()`
+        targets `iterable` - of `str`, addresses or networks in CIDR notation. Ex: `['192.168.0.0/16']`
+        workers `int` - The maximum number of lookups in flight. Default `DEFAULT_WORKERS`
+        ordered `bool` - When `True` results are yielded in the order of the addresses, otherwise as they finish. Default `False`
+
+    Returns:
+        `generator` - of (address `str`, names `list` of `str`, error `Exception` or `None`), names is empty when
+                      there is an error, Ex: `dns.resolver.NXDOMAIN` for an address without a PTR record
+
+    """
+    def lookup(item):
+        target, version, value, error = item
+        if error is not None:
+            return target, [], error
+
+        address = dnsq.network.format_address(version, value)
+        try:
+            answer = dnsq.query(resolver, dnsq.network.reverse_name(version, value), 'PTR')
+        except dns.exception.DNSException as exp:
+            dnsq.LOGGER.debug('The PTR lookup for address: %s failed: %r', address, exp)
+            return address, [], exp
+        return address, [x.target.to_text() for x in answer], None
+
+    if dnsq.LOGGER.isEnabledFor(logging.INFO):
+        dnsq.LOGGER.info(dict(resolver=resolver, workers=workers, ordered=ordered))
+    for result in dnsq.concurrent_map(lookup, expand_targets(targets), workers=workers, ordered=ordered):
+        yield result
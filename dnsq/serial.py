@@ -0,0 +1,249 @@
+# coding: utf-8
+"""Check that every authoritative nameserver of a zone reports the same SOA serial
+
+The NS records of the zone are looked up, the nameserver names are resolved to their addresses
+and every address is asked for the SOA at the same time, so a check takes as long as the slowest
+nameserver rather than the sum of all of them.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import dns.exception
+import dns.flags
+import dns.rcode
+import dns.rdatatype
+import dnsq
+import dnsq.metrics
+import dnsq.network
+import logging
+import socket
+import time
+
+# the errors that mean a nameserver did not tell us its serial
+SERIAL_ERRORS = (
+    dns.exception.DNSException,
+    EOFError,
+    socket.error,
+)
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class ServerSerial(collections.namedtuple('ServerSerial', ['nameserver', 'address', 'serial', 'seconds', 'error'])):
+    """The SOA serial one address of a nameserver answered with
+
+    Attributes:
+        nameserver `str` - The name of the nameserver, as in the NS record.
+        address `str` - The address that was asked, `None` when the name did not resolve.
+        serial `int` - The serial, `None` when there is an error.
+        seconds `float` - How long the answer took, `None` when there is an error.
+        error `Exception` - Why there is no serial, otherwise `None`
+
+    """
+    __slots__ = ()
+
+
+class SerialReport(object):
+    """The SOA serials of every nameserver of domain
+
+    Args:
+        domain `str` - The zone.
+        servers `list` - of `ServerSerial`, in the order of the nameservers
+
+    Attributes:
+        serial `int` - The highest serial any nameserver answered with, `None` when none did.
+
+    """
+
+    def __init__(self, domain, servers):
+        self.domain = domain
+        self.servers = servers
+        serials = [x.serial for x in servers if x.error is None]
+        self.serial = max(serials) if serials else None
+
+    @property
+    def errors(self):
+        """`list` - of the `ServerSerial` that have no serial"""
+        return [x for x in self.servers if x.error is not None]
+
+    @property
+    def in_sync(self):
+        """`True` when every nameserver answered with the same serial"""
+        return bool(self.servers) and all(self.agrees(x) for x in self.servers)
+
+    def agrees(self, server):
+        """Return `True` when server answered with the highest serial"""
+        return server.error is None and server.serial == self.serial
+
+    def __iter__(self):
+        return iter(self.servers)
+
+    def __len__(self):
+        return len(self.servers)
+
+
+def query_serial(domain, address, timeout=dnsq.DEFAULT_TIMEOUT, tcp=False, port=53):
+    """Ask the nameserver at address for the SOA serial of domain, without recursion
+
+    Args:
+        domain `str` or `dns.name.Name` - The zone.
+        address `str` - The IPv4 or IPv6 address of the nameserver.
+        timeout `float` - The number of seconds to wait for the answer.
+        tcp `bool` - Ask over TCP instead of UDP. Default `False`
+        port `int` - The port of the nameserver. Default `53`
+
+    Raises:
+        dns.exception.DNSException - When the nameserver does not answer with the SOA of domain
+        dns.exception.Timeout - When the nameserver does not answer in time
+
+    Returns:
+        `tuple` - (serial `int`, seconds `float`)
+
+    """
+    import dns.message
+    import dns.query
+
+    name = dnsq.get_absolute_name(domain)
+    request = dns.message.make_query(name, dns.rdatatype.SOA)
+    request.flags &= ~dns.flags.RD
+
+    send = dns.query.tcp if tcp else dns.query.udp
+    start = _clock()
+    if dnsq.metrics.COLLECTORS:
+        response = dnsq.metrics.measure('query_serial', address, send, request, address, timeout=timeout, port=port)
+    else:
+        response = send(request, address, timeout=timeout, port=port)
+    seconds = _clock() - start
+
+    if response.rcode() != dns.rcode.NOERROR:
+        raise dns.exception.DNSException('The nameserver: {} answered {} for the SOA of {}'.format(address, dns.rcode.to_text(response.rcode()), name))
+    for rrset in response.answer:
+        if rrset.rdtype == dns.rdatatype.SOA and rrset.name == name:
+            return rrset[0].serial, seconds
+    raise dns.exception.DNSException('The nameserver: {} did not answer with the SOA of {}'.format(address, name))
+
+
+def nameserver_addresses(resolver, nameservers, workers=dnsq.DEFAULT_WORKERS):
+    """Resolve the A and AAAA records of every nameserver name at the same time
+
+    Nameservers that already are addresses are kept as they are.
+
+    Args:
+        resolver `dns.resolver.Resolver` - The resolver to look the names up with.
+        nameservers `list` - of `str`, names or addresses. Ex: `['nsztm1.digi.ninja.', '81.4.108.41']`
+        workers `int` - The maximum number of lookups in flight. Default `DEFAULT_WORKERS`
+
+    Returns:
+        `list` - of (nameserver `str`, address `str` or `None`, error `Exception` or `None`), in the order of nameservers,
+                 with one item per address and an item without an address for a name that did not resolve
+
+    """
+    lookups = []
+    for nameserver in nameservers:
+        try:
+            dnsq.network.parse_address(nameserver)
+        except ValueError:
+            lookups.extend([(nameserver, 'A'), (nameserver, 'AAAA')])
+
+    def lookup(item):
+        nameserver, rdtype = item
+        try:
+            return item, [x.to_text() for x in dnsq.query(resolver, nameserver, rdtype)], None
+        except SERIAL_ERRORS as exp:
+            dnsq.LOGGER.debug('Resolving the %s records of nameserver: %s failed: %r', rdtype, nameserver, exp)
+            return item, [], exp
+
+    answers = {}
+    if lookups:
+        answers = dict((item, (addresses, error)) for item, addresses, error in dnsq.concurrent_map(lookup, lookups, workers=workers))
+
+    results = []
+    for nameserver in nameservers:
+        if (nameserver, 'A') not in answers:
+            results.append((nameserver, nameserver, None))
+            continue
+
+        ipv4, error = answers[(nameserver, 'A')]
+        ipv6, _ = answers[(nameserver, 'AAAA')]
+        if not ipv4 and not ipv6:
+            results.append((nameserver, None, error or dns.exception.DNSException('The nameserver: {} has no address'.format(nameserver))))
+        results.extend((nameserver, address, None) for address in ipv4 + ipv6)
+    return results
+
+
+def check_serials(domain, resolver=None, nameservers=None, timeout=dnsq.DEFAULT_TIMEOUT, tcp=False, port=53, workers=None):
+    """Ask every address of every nameserver of domain for the SOA serial at the same time
+
+    Args:
+        domain `str` - The zone. Ex: `zonetransfer.me`
+        resolver `dns.resolver.Resolver` - The resolver for the NS records and the nameserver addresses.
+                                           Default `None`, `dnsq.create_resolver()`
+        nameservers `list` - of `str`, the nameservers to ask. Default `None`, the NS records of domain
+        timeout `float` - The number of seconds to wait for each answer.
+        tcp `bool` - Ask over TCP instead of UDP. Default `False`
+        port `int` - The port of the nameservers. Default `53`
+        workers `int` - The maximum number of queries in flight. Default `None`, every address at once
+
+    Raises:
+        dns.exception.DNSException - When the NS records of domain cannot be looked up
+
+    Returns:
+        `SerialReport`
+
+    """
+    if dnsq.LOGGER.isEnabledFor(logging.INFO):
+        dnsq.LOGGER.info(dict(domain=domain, nameservers=nameservers, timeout=timeout, tcp=tcp, port=port, workers=workers))
+
+    if resolver is None:
+        resolver = dnsq.create_resolver()
+    if nameservers is None:
+        nameservers = dnsq.ns_records(resolver, dnsq.get_absolute_name(domain))
+
+    addresses = nameserver_addresses(resolver, nameservers, workers=workers or dnsq.DEFAULT_WORKERS)
+
+    def ask(item):
+        nameserver, address, error = item
+        if error is not None:
+            return ServerSerial(nameserver, address, None, None, error)
+        try:
+            serial, seconds = query_serial(domain, address, timeout=timeout, tcp=tcp, port=port)
+        except SERIAL_ERRORS as exp:
+            dnsq.LOGGER.debug('The SOA query for domain: %s via nameserver: %s failed: %r', domain, address, exp)
+            return ServerSerial(nameserver, address, None, None, exp)
+        return ServerSerial(nameserver, address, serial, seconds, None)
+
+    servers = []
+    if addresses:
+        servers = list(dnsq.concurrent_map(ask, addresses, workers=workers or len(addresses), ordered=True))
+    return SerialReport(domain, servers)
+
+
+def scan_serials(domains, resolver=None, workers=dnsq.DEFAULT_WORKERS, *args, **kwargs):
+    """`check_serials` for many zones, workers of them at the same time
+
+    Args:
+        domains `iterable` - of `str`
+        resolver `dns.resolver.Resolver` - Shared by every check. Default `None`, `dnsq.create_resolver()`
+        workers `int` - The maximum number of zones checked at the same time. Default `DEFAULT_WORKERS`
+        args `tuple` - positional args to pass to `check_serials`
+        kwargs `dict` - key value pairs to pass to `check_serials`, Ex: `timeout=2.0`
+
+    Returns:
+        `generator` - of `SerialReport` in the order the checks finish, a zone whose NS records cannot
+                      be looked up has a single `ServerSerial` without a nameserver that holds the error
+
+    """
+    if resolver is None:
+        resolver = dnsq.create_resolver()
+
+    def check(domain):
+        try:
+            return check_serials(domain, resolver, *args, **kwargs)
+        except SERIAL_ERRORS as exp:
+            dnsq.LOGGER.debug('The NS query for domain: %s failed: %r', domain, exp)
+            return SerialReport(domain, [ServerSerial(None, None, None, None, exp)])
+
+    for report in dnsq.concurrent_map(check, domains, workers=workers):
+        yield report
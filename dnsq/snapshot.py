@@ -0,0 +1,402 @@
+# coding: utf-8
+"""Keep zone transfers in local snapshot files so an unchanged zone is not transferred again
+
+A snapshot is kept per (domain, nameserver) and carries the serial of the SOA it was transferred
+at, a transfer through `cached_zone_transfer` asks the nameserver for the SOA serial first and
+reads the zone from the snapshot when the serial has not changed. When it has changed only the
+changes since the snapshot are transferred, see `dnsq.ixfr`.
+
+The file is a fixed size header followed by the records, each prefixed with its length, so it
+is read through a memory map without parsing anything up front. The owner name of a record is
+kept as its labels rather than in wire format, they are turned back into a `dns.name.Name`
+without relativizing them or reading them a byte at a time:
+
+    magic        8 bytes   `MAGIC`
+    version      uint8     `FORMAT_VERSION`
+    flags        uint8     `FLAG_RELATIVIZE` when the owner names are relative to the origin
+    serial       uint32    The serial of the SOA of the zone.
+    count        uint32    The number of records.
+    origin       uint8 length, then the origin in wire format
+    records      uint16 length, then the owner name and type, class, ttl, rdlength and rdata in wire format
+    owner name   uint8 number of labels, uint8 length of each label, then the labels
+
+All integers are in network byte order.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import dns.exception
+import dns.name
+import dns.rdata
+import dns.rdatatype
+import dnsq
+import dnsq.ixfr
+import io
+import logging
+import mmap
+import os
+import re
+import struct
+
+MAGIC = b'DNSQSNAP'
+FORMAT_VERSION = 1
+FLAG_RELATIVIZE = 1
+SUFFIX = '.snapshot'
+
+HEADER = struct.Struct('!8sBBII')
+LENGTH = struct.Struct('!H')
+BYTE = struct.Struct('!B')
+RR_FIELDS = struct.Struct('!HHIH')
+
+# the characters that are safe in a file name on every platform
+UNSAFE_FILENAME_REGEX = re.compile(r'[^A-Za-z0-9._@-]')
+
+# python 2 has no os.replace, its os.rename replaces the target on POSIX
+_replace = getattr(os, 'replace', os.rename)
+
+
+def snapshot_path(directory, domain, nameserver):
+    """Return the path of the snapshot of domain as transferred from nameserver
+
+    Args:
+        directory `str` - The directory the snapshots are kept in.
+        domain `str` or `dns.name.Name` - The zone. Ex: `foo-domain.com`
+        nameserver `str` - The nameserver the zone is transferred from. Ex: `67.77.255.142`
+
+    Returns:
+        `str`
+
+    """
+    domain = dnsq.get_absolute_name(domain).to_text().rstrip('.') or 'root'
+    name = '{}@{}'.format(domain, nameserver)
+    return os.path.join(directory, UNSAFE_FILENAME_REGEX.sub('_', name) + SUFFIX)
+
+
+class SnapshotWriter(object):
+    """Write records to a snapshot as they arrive, the snapshot only replaces path on `commit`
+
+    Args:
+        path `str` - The snapshot file, see `snapshot_path`
+        origin `str` or `dns.name.Name` - The zone the records belong to.
+        relativize `bool` - `True` when the owner names of the records are relative to origin. Default `True`
+
+    Attributes:
+        count `int` - The number of records written so far.
+        serial `int` - The serial of the first SOA written, `None` until then.
+
+    """
+
+    def __init__(self, path, origin, relativize=True):
+        self.path = path
+        self.origin = dnsq.get_absolute_name(origin)
+        self.relativize = relativize
+        self.count = 0
+        self.serial = None
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        self.fd = io.open(self.temp_path, 'wb')
+
+        origin_wire = self.origin.to_wire()
+        self.fd.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+        self.fd.write(BYTE.pack(len(origin_wire)) + origin_wire)
+
+    def write(self, record, wire=None):
+        """Append a `dnsq.Record` to the snapshot
+
+        Args:
+            record `dnsq.Record`
+            wire `bytes` - The encoded record from `Snapshot.entries`, saves encoding it again. Default `None`
+
+        """
+        if self.serial is None and record.rdtype == dns.rdatatype.SOA:
+            self.serial = record.rdata.serial
+
+        if wire is not None:
+            self.fd.write(LENGTH.pack(len(wire)) + wire)
+            self.count += 1
+            return
+
+        wire = io.BytesIO()
+        labels = record.name.labels
+        wire.write(BYTE.pack(len(labels)))
+        wire.write(struct.pack('!{}B'.format(len(labels)), *[len(x) for x in labels]))
+        wire.write(b''.join(labels))
+        rdata_start = wire.tell() + RR_FIELDS.size
+        wire.seek(rdata_start)
+        record.rdata.to_wire(wire, origin=self.origin)
+        rdata_length = wire.tell() - rdata_start
+        wire.seek(rdata_start - RR_FIELDS.size)
+        wire.write(RR_FIELDS.pack(record.rdtype, record.rdclass, record.ttl, rdata_length))
+
+        wire = wire.getvalue()
+        self.fd.write(LENGTH.pack(len(wire)) + wire)
+        self.count += 1
+
+    def commit(self):
+        """Finish the snapshot and move it into place
+
+        Raises:
+            ValueError - When no SOA was written, a snapshot without a serial can never be used
+
+        Returns:
+            `Snapshot`
+
+        """
+        if self.serial is None:
+            self.abort()
+            raise ValueError('Expected the records of {} to contain its SOA'.format(self.origin))
+
+        flags = FLAG_RELATIVIZE if self.relativize else 0
+        self.fd.seek(0)
+        self.fd.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, self.serial, self.count))
+        self.fd.close()
+
+        # a rename never leaves a half written snapshot behind for other dnsq processes to read
+        _replace(self.temp_path, self.path)
+        dnsq.LOGGER.debug('Wrote %s records of %s at serial %s to %s', self.count, self.origin, self.serial, self.path)
+
+        return Snapshot(self.path)
+
+    def abort(self):
+        """Throw the snapshot away, path is left as it was"""
+        if not self.fd.closed:
+            self.fd.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def write_snapshot(path, origin, records, relativize=True):
+    """Write records to the snapshot at path, replacing it
+
+    Args:
+        path `str` - The snapshot file, see `snapshot_path`
+        origin `str` or `dns.name.Name` - The zone the records belong to.
+        records `iterable` - of `dnsq.Record`, Ex: a `dnsq.zone_transfer`
+        relativize `bool` - `True` when the owner names of the records are relative to origin. Default `True`
+
+    Raises:
+        ValueError - When records does not contain the SOA of the zone
+
+    Returns:
+        `Snapshot`
+
+    """
+    writer = SnapshotWriter(path, origin, relativize=relativize)
+    try:
+        for record in records:
+            writer.write(record)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.commit()
+
+
+class Snapshot(object):
+    """A zone snapshot on disk, only the header is read until the records are iterated
+
+    Args:
+        path `str` - The snapshot file.
+
+    Raises:
+        ValueError - When path is not a snapshot or was written by an incompatible dnsq
+        IOError - When path cannot be read
+
+    Attributes:
+        origin `dns.name.Name` - The zone.
+        serial `int` - The serial of the SOA of the zone when it was transferred.
+        relativize `bool` - `True` when the owner names are relative to origin.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with io.open(path, 'rb') as fd:
+            header = fd.read(HEADER.size + BYTE.size)
+            if len(header) != HEADER.size + BYTE.size:
+                raise ValueError('Expected a dnsq snapshot, got a truncated file {}'.format(path))
+
+            magic, version, flags, self.serial, self.count = HEADER.unpack_from(header)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError('Expected a dnsq snapshot of version {}, got {}'.format(FORMAT_VERSION, path))
+
+            (origin_length,) = BYTE.unpack_from(header, HEADER.size)
+            origin_wire = fd.read(origin_length)
+
+        try:
+            self.origin, _ = dns.name.from_wire(origin_wire, 0)
+        except (dns.exception.DNSException, IndexError):
+            raise ValueError('Expected a dnsq snapshot, got an invalid origin in {}'.format(path))
+
+        self.relativize = bool(flags & FLAG_RELATIVIZE)
+        self._offset = HEADER.size + BYTE.size + origin_length
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Yield the `dnsq.Record` in the order they were written"""
+        for record, _ in self.entries():
+            yield record
+
+    def entries(self):
+        """Yield (`dnsq.Record`, `bytes`) in the order they were written, the bytes are the encoded record"""
+        origin = self.origin if self.relativize else None
+        Name = dns.name.Name
+        rdata_from_wire = dns.rdata.from_wire
+        unpack_length = LENGTH.unpack_from
+        unpack_fields = RR_FIELDS.unpack_from
+        Record = dnsq.Record
+        owner = name = None
+
+        with io.open(self.path, 'rb') as fd:
+            data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offset = self._offset
+                for _ in range(self.count):
+                    (length,) = unpack_length(data, offset)
+                    offset += LENGTH.size
+                    wire = data[offset:offset + length]
+                    offset += length
+
+                    count = bytearray(wire[:1])[0]
+                    lengths = bytearray(wire[1:1 + count])
+                    used = 1 + count + sum(lengths)
+                    # the records of a name follow each other, they share one dns.name.Name
+                    if wire[:used] != owner:
+                        owner = wire[:used]
+                        labels = []
+                        start = 1 + count
+                        for label_length in lengths:
+                            labels.append(wire[start:start + label_length])
+                            start += label_length
+                        name = Name(labels)
+
+                    rdtype, rdclass, ttl, rdata_length = unpack_fields(wire, used)
+                    used += RR_FIELDS.size
+                    rdata = rdata_from_wire(rdclass, rdtype, wire, used, rdata_length, origin)
+
+                    yield Record(name, ttl, rdclass, rdtype, rdata), wire
+            finally:
+                data.close()
+
+
+def open_snapshot(path):
+    """Return the `Snapshot` at path, `None` when there is none or it cannot be used"""
+    try:
+        return Snapshot(path)
+    except (IOError, OSError, ValueError) as exp:
+        dnsq.LOGGER.debug('Not using the snapshot %s: %r', path, exp)
+        return None
+
+
+def zone_serial(domain, nameserver, lifetime=dnsq.DEFAULT_LIFETIME, timeout=dnsq.DEFAULT_TIMEOUT, port=53):
+    """Ask nameserver for the serial of the SOA of domain
+
+    The query is made over TCP, which the nameserver has to answer anyway for a zone transfer.
+
+    Args:
+        domain `str` or `dns.name.Name` - The zone.
+        nameserver `str` - The address of the nameserver.
+        lifetime `float` - The total number of seconds to spend on the query.
+        timeout `float` - The number of seconds to wait for each response message.
+        port `int` - The port of the nameserver. Default `53`
+
+    Raises:
+        dns.exception.DNSException - When the nameserver does not answer with an SOA
+
+    Returns:
+        `int`
+
+    """
+    resolver = dnsq.create_resolver(nameservers=nameserver, lifetime=lifetime, timeout=timeout)
+    resolver.port = port
+    soa = dnsq.soa_records(resolver, dnsq.get_absolute_name(domain), tcp=True)
+    return int(soa[0][2])
+
+
+def cached_zone_transfer(domain, nameserver, directory, timeout=dnsq.DEFAULT_TIMEOUT, lifetime=dnsq.DEFAULT_LIFETIME, incremental=True,
+                         *args, **kwargs):
+    """Like `dnsq.zone_transfer`, but read the zone from a snapshot while its SOA serial is unchanged
+
+    The serial is checked with `zone_serial` first. When it matches the snapshot the records are
+    read from the snapshot. When it does not the snapshot is brought up to date with
+    `dnsq.ixfr.incremental_zone_transfer`, or, without a snapshot, the zone is transferred.
+    The snapshot is replaced once the transfer completes, a transfer that fails or is stopped
+    early leaves the snapshot as it was.
+
+    Args:
+        domain `str` - The domain to transfer. Ex: `zonetransfer.me`.
+        nameserver `str` - The name server to query. Ex: `nsztm1.digi.ninja`.
+        directory `str` - The directory the snapshots are kept in, see `snapshot_path`
+        timeout `float` - The number of seconds to wait for each response message.
+        lifetime `float` - The total number of seconds to spend doing the transfer.
+        incremental `bool` - When `False` a changed zone is transferred as a whole with AXFR. Default `True`
+        args `tuple` - positional args to pass to `dnsq.zone_transfer`
+        kwargs `dict` - key value pairs to pass to `dnsq.zone_transfer`, Ex: `port=5353`
+
+    Returns:
+        `generator` - of `dnsq.Record`
+
+    """
+    path = snapshot_path(directory, domain, nameserver)
+    snapshot = open_snapshot(path)
+
+    if snapshot is not None:
+        try:
+            serial = zone_serial(domain, nameserver, lifetime=lifetime, timeout=timeout, port=kwargs.get('port', 53))
+        except dns.exception.DNSException as exp:
+            # let the zone transfer report why the nameserver cannot be used
+            dnsq.LOGGER.debug('The SOA query for domain: %s via nameserver: %s failed: %r', domain, nameserver, exp)
+            serial = None
+
+        if serial == snapshot.serial:
+            if dnsq.LOGGER.isEnabledFor(logging.INFO):
+                dnsq.LOGGER.info(dict(domain=domain, nameserver=nameserver, serial=serial, snapshot=path))
+            for record in snapshot:
+                yield record
+            return
+
+        if serial is not None and incremental:
+            entries = list(snapshot.entries())
+            transfer = dnsq.ixfr.incremental_zone_transfer(domain, nameserver, [x[0] for x in entries], serial=snapshot.serial,
+                                                           timeout=timeout, lifetime=lifetime, *args, **kwargs)
+            if dnsq.LOGGER.isEnabledFor(logging.INFO):
+                dnsq.LOGGER.info(dict(domain=domain, nameserver=nameserver, serial=transfer.serial, previous_serial=transfer.previous_serial,
+                                      added=len(transfer.added), deleted=len(transfer.deleted), incremental=transfer.incremental))
+
+            # the records that did not change are the objects read from the snapshot, their encoding is copied as it is.
+            # entries keeps every one of them alive, so no two of them share an id
+            wires = dict((id(record), wire) for record, wire in entries)
+            writer = SnapshotWriter(path, domain, relativize=kwargs.get('relativize', True))
+            try:
+                for record in transfer.records:
+                    writer.write(record, wire=wires.get(id(record)))
+            except BaseException:
+                writer.abort()
+                raise
+            writer.commit()
+
+            for record in transfer.records:
+                yield record
+            return
+
+    writer = None
+    try:
+        for record in dnsq.zone_transfer(domain, nameserver, timeout=timeout, lifetime=lifetime, *args, **kwargs):
+            if writer is None:
+                writer = SnapshotWriter(path, domain, relativize=kwargs.get('relativize', True))
+            writer.write(record)
+            yield record
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    if writer is not None:
+        writer.commit()
@@ -0,0 +1,557 @@
+# coding: utf-8
+"""A small authoritative stand-in that serves zones over UDP and TCP on 127.0.0.1
+
+It lets the tests and the benchmarks talk to a real socket without a Vagrant bind9 box.
+The zone is rendered to wire format once, when the server is created, so serving it
+costs no more than copying bytes to the socket.
+
+`ZONES_DIR` holds the zone files of playbook.yml, see `AuthoritativeServer` to serve them.
+"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import copy
+import dns.exception
+import dns.flags
+import dns.ipv6
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+import dns.rdtypes.ANY.CNAME
+import dns.rdtypes.ANY.PTR
+import dns.rdtypes.ANY.TXT
+import dns.rdtypes.IN.A
+import dns.rdtypes.IN.AAAA
+import dns.rrset
+import dns.zone
+import dnsq
+import dnsq.network
+import io
+import os
+import socket
+import struct
+import threading
+
+try:
+    import socketserver
+except ImportError:  # pragma: no cover
+    import SocketServer as socketserver
+
+DEFAULT_ORIGIN = 'foo-domain.'
+DEFAULT_SOA = 'ns1 root 2018070500 28800 3600 604800 38400'
+DEFAULT_TTL = 7200
+RRS_PER_MESSAGE = 100
+# the zone files of the bind9 box of playbook.yml
+ZONES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zones')
+
+
+def synthetic_zone(size, origin=DEFAULT_ORIGIN, serial=2018070500):
+    """Generate a zone of exactly @size records with names relative to @origin
+
+    The zone opens with the SOA and NS of @origin, the rest is a mix of
+    70% A, 10% AAAA, 10% CNAME and 10% TXT records so filters and sorts see realistic data.
+
+    Args:
+        size `int` - The number of records, at least 2.
+        origin `str` - The name of the zone. Default `DEFAULT_ORIGIN`
+        serial `int` - The serial of the SOA. Default `2018070500`
+
+    Returns:
+        `generator` - of `dnsq.Record`
+
+    """
+    assert size >= 2, 'Expected size to be at least 2, got {}'.format(size)
+
+    origin = dnsq.get_absolute_name(origin)
+    IN = dns.rdataclass.IN
+    soa = DEFAULT_SOA.replace('2018070500', str(serial))
+
+    yield dnsq.Record(dns.name.empty, DEFAULT_TTL, IN, dns.rdatatype.SOA, dns.rdata.from_text(IN, dns.rdatatype.SOA, soa, origin))
+    yield dnsq.Record(dns.name.empty, DEFAULT_TTL, IN, dns.rdatatype.NS, dns.rdata.from_text(IN, dns.rdatatype.NS, 'ns1', origin))
+
+    for i in range(size - 2):
+        kind = i % 10
+        hostname = dns.name.Name(['host-{:07d}'.format(i)])
+        if kind == 7:
+            address = dns.ipv6.inet_ntoa(dns.ipv6.inet_aton('fd00::{:x}:{:x}'.format(i >> 16, i & 0xffff)))
+            rdata = dns.rdtypes.IN.AAAA.AAAA(IN, dns.rdatatype.AAAA, address)
+        elif kind == 8:
+            rdata = dns.rdtypes.ANY.CNAME.CNAME(IN, dns.rdatatype.CNAME, dns.name.Name(['host-{:07d}'.format(i - 1)]))
+        elif kind == 9:
+            rdata = dns.rdtypes.ANY.TXT.TXT(IN, dns.rdatatype.TXT, [b'v=spf1 include:foo -all'])
+        else:
+            rdata = dns.rdtypes.IN.A.A(IN, dns.rdatatype.A, '10.{}.{}.{}'.format((i >> 16) & 255, (i >> 8) & 255, i & 255))
+        yield dnsq.Record(hostname, 300, IN, rdata.rdtype, rdata)
+
+
+def synthetic_reverse_zone(records, origin, forward_origin=DEFAULT_ORIGIN, serial=2018070500):
+    """Generate the reverse zone @origin with a PTR record for every A/AAAA record of @records in its network
+
+    Args:
+        records `iterable` - of `dnsq.Record` with names relative to @forward_origin, see `synthetic_zone`
+        origin `str` - The name of the reverse zone. Ex: `10.in-addr.arpa.`
+        forward_origin `str` - The name of the zone of @records. Default `DEFAULT_ORIGIN`
+        serial `int` - The serial of the SOA. Default `2018070500`
+
+    Returns:
+        `generator` - of `dnsq.Record`
+
+    """
+    origin = dnsq.get_absolute_name(origin)
+    forward_origin = dnsq.get_absolute_name(forward_origin)
+    version, first, last = dnsq.network.reverse_network(origin)
+    IN = dns.rdataclass.IN
+    soa = DEFAULT_SOA.replace('2018070500', str(serial)).replace('ns1 root', 'ns1.{0} root.{0}'.format(forward_origin))
+
+    yield dnsq.Record(dns.name.empty, DEFAULT_TTL, IN, dns.rdatatype.SOA, dns.rdata.from_text(IN, dns.rdatatype.SOA, soa, origin))
+    yield dnsq.Record(dns.name.empty, DEFAULT_TTL, IN, dns.rdatatype.NS,
+                      dns.rdata.from_text(IN, dns.rdatatype.NS, 'ns1.{}'.format(forward_origin), origin))
+
+    for record in records:
+        if record.rdtype not in (dns.rdatatype.A, dns.rdatatype.AAAA):
+            continue
+        address_version, value = dnsq.network.parse_address(record.rdata.address)
+        if address_version != version or not first <= value <= last:
+            continue
+        name = dnsq.network.reverse_name(version, value).relativize(origin)
+        rdata = dns.rdtypes.ANY.PTR.PTR(IN, dns.rdatatype.PTR, record.name.derelativize(forward_origin))
+        yield dnsq.Record(name, record.ttl, IN, dns.rdatatype.PTR, rdata)
+
+
+def render_axfr(origin, records, rrs_per_message=RRS_PER_MESSAGE):
+    """Render an AXFR answer for @records, the first of which must be the SOA of @origin
+
+    Args:
+        origin `str` or `dns.name.Name` - The name of the zone.
+        records `iterable` - of `dnsq.Record` with names relative to @origin
+        rrs_per_message `int` - The number of records in each message. Default `RRS_PER_MESSAGE`
+
+    Returns:
+        `list` - of `bytes`, the wire format of each message with a message id of 0
+
+    """
+    records = iter(records)
+    soa = next(records)
+
+    def answer():
+        yield soa
+        for record in records:
+            yield record
+        # an AXFR closes with the SOA it opened with
+        yield soa
+
+    return render_messages(origin, dns.rdatatype.AXFR, answer(), rrs_per_message=rrs_per_message)
+
+
+def render_ixfr(origin, soa, journal, serial, rrs_per_message=RRS_PER_MESSAGE):
+    """Render an IXFR answer that takes a zone from @serial to the serial of @soa
+
+    Args:
+        origin `str` or `dns.name.Name` - The name of the zone.
+        soa `dnsq.Record` - The SOA of the zone now.
+        journal `list` - of (serial `int`, deleted `list`, added `list`), the changes to the zone from oldest to newest.
+                         Each one takes the zone from its serial to the serial of the next one, the last one to the serial of @soa.
+        serial `int` - The serial the client has.
+        rrs_per_message `int` - The number of records in each message. Default `RRS_PER_MESSAGE`
+
+    Returns:
+        `list` - of `bytes`, the wire format of each message with a message id of 0, `None` when @journal does not go back to @serial
+
+    """
+    serials = [x[0] for x in journal]
+    if serial not in serials:
+        return None
+
+    def soa_at(serial):
+        rdata = copy.copy(soa.rdata)
+        rdata.serial = serial
+        return soa._replace(rdata=rdata)
+
+    answer = [soa]
+    for i in range(serials.index(serial), len(journal)):
+        start, deleted, added = journal[i]
+        end = serials[i + 1] if i + 1 < len(journal) else soa.rdata.serial
+        answer.append(soa_at(start))
+        answer.extend(deleted)
+        answer.append(soa_at(end))
+        answer.extend(added)
+    answer.append(soa)
+
+    # the SOAs that separate the changes must not be merged into one RRset
+    return render_messages(origin, dns.rdatatype.IXFR, answer, rrs_per_message=rrs_per_message, merge=False)
+
+
+def render_messages(origin, rdtype, records, rrs_per_message=RRS_PER_MESSAGE, merge=True):
+    """Render @records into the answer sections of the messages of a zone transfer
+
+    Args:
+        origin `str` or `dns.name.Name` - The name of the zone.
+        rdtype `int` - The type of the zone transfer, `AXFR` or `IXFR`
+        records `iterable` - of `dnsq.Record` with names relative to @origin
+        rrs_per_message `int` - The number of records in each message. Default `RRS_PER_MESSAGE`
+        merge `bool` - When `True` consecutive records of a name and type share an RRset. Default `True`
+
+    Returns:
+        `list` - of `bytes`, the wire format of each message with a message id of 0
+
+    """
+    origin = dnsq.get_absolute_name(origin)
+    query = dns.message.make_query(origin, rdtype)
+    query.id = 0
+
+    def render(chunk):
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+        for record in chunk:
+            last = response.answer[-1] if response.answer else None
+            if not merge or last is None or (last.name, last.rdtype) != (record.name, record.rdtype):
+                last = dns.rrset.RRset(record.name, record.rdclass, record.rdtype)
+                response.answer.append(last)
+            last.add(record.rdata, record.ttl)
+        return response.to_wire(origin=origin, max_size=65535)
+
+    messages = []
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == rrs_per_message:
+            messages.append(render(chunk))
+            chunk = []
+
+    if chunk:
+        messages.append(render(chunk))
+    return messages
+
+
+def zone_file_records(path, origin):
+    """Read the records of a zone file, Ex: one of `ZONES_DIR` or the db files of playbook.yml
+
+    Args:
+        path `str` - The zone file.
+        origin `str` - The name of the zone. Ex: `foo-domain.com.`
+
+    Returns:
+        `list` - of `dnsq.Record` with names relative to @origin, the SOA first
+
+    """
+    # opened here, older dnspython opens a path with the "rU" mode newer pythons refuse
+    with io.open(path, encoding='utf-8') as fd:
+        zone = dns.zone.from_file(fd, origin=dnsq.get_absolute_name(origin), relativize=True)
+    records = [dnsq.Record(name, ttl, rdata.rdclass, rdata.rdtype, rdata) for name, ttl, rdata in zone.iterate_rdatas()]
+    # sorted is stable, the rest of the zone stays in its order
+    records.sort(key=lambda record: record.rdtype != dns.rdatatype.SOA)
+    return records
+
+
+class Zone(object):
+    """A zone rendered for serving, its AXFR messages and, when indexed, its RRsets by name and type
+
+    A zone that is not indexed answers SOA queries for its origin and zone transfers only, which
+    is all the zone transfer tests and benchmarks need and keeps zones of millions of records small.
+
+    Args:
+        records `iterable` - of `dnsq.Record` with names relative to @origin, the SOA first, see `synthetic_zone`
+        origin `str` - The name of the zone. Default `DEFAULT_ORIGIN`
+        rrs_per_message `int` - The number of records in each AXFR message. Default `RRS_PER_MESSAGE`
+        journal `list` - of (serial `int`, deleted `list`, added `list`), see `render_ixfr`. Default `None`, no IXFR
+        index `bool` - When `True` every query for the zone is answered. Default `True`
+
+    """
+
+    def __init__(self, records, origin=DEFAULT_ORIGIN, rrs_per_message=RRS_PER_MESSAGE, journal=None, index=True):
+        self.origin = dnsq.get_absolute_name(origin)
+        self.rrs_per_message = rrs_per_message
+        self.journal = journal
+        self.nodes = None
+        if index:
+            self.nodes = {}
+            records = self._index(records)
+        self.messages = render_axfr(self.origin, records, rrs_per_message=rrs_per_message)
+        self.soa = dns.message.from_wire(self.messages[0]).answer[0]
+
+    @classmethod
+    def from_file(cls, path, origin, *args, **kwargs):
+        """Create a `Zone` from a zone file, see `zone_file_records`"""
+        return cls(zone_file_records(path, origin), origin, *args, **kwargs)
+
+    def _index(self, records):
+        """Yield @records, adding each one to the RRset of its name and type as it goes"""
+        for record in records:
+            name = record.name.derelativize(self.origin)
+            node = self.nodes.setdefault(name, {})
+            rrset = node.get(record.rdtype)
+            if rrset is None:
+                rrset = node[record.rdtype] = dns.rrset.RRset(name, record.rdclass, record.rdtype)
+            rrset.add(record.rdata, record.ttl)
+            yield record
+
+    def lookup(self, query):
+        """Return the `dns.message.Message` that answers a query that is not a zone transfer, `None` to refuse it"""
+        question = query.question[0]
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+
+        if self.nodes is None:
+            if question.rdtype != dns.rdatatype.SOA or question.name != self.origin:
+                return None
+            response.answer.append(self.soa)
+            return response
+
+        node = self.nodes.get(question.name)
+        if node is None:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+            response.authority.append(self.soa)
+        elif question.rdtype == dns.rdatatype.ANY:
+            response.answer.extend(node.values())
+        elif question.rdtype in node:
+            response.answer.append(node[question.rdtype])
+        elif dns.rdatatype.CNAME in node:
+            cname = node[dns.rdatatype.CNAME]
+            response.answer.append(cname)
+            # follow the alias when it stays in the zone, like an authoritative server does
+            target = self.nodes.get(cname[0].target.derelativize(self.origin), {})
+            if question.rdtype in target:
+                response.answer.append(target[question.rdtype])
+        else:
+            response.authority.append(self.soa)
+        return response
+
+    def transfer(self, query):
+        """Return an iterable of the wire format messages that answer an AXFR or IXFR query"""
+        if query.question[0].rdtype == dns.rdatatype.IXFR:
+            if self.journal is None:
+                response = dns.message.make_response(query)
+                response.set_rcode(dns.rcode.NOTIMP)
+                return [response.to_wire()]
+            messages = self.ixfr(query.authority[0][0].serial)
+        else:
+            messages = self.messages
+
+        # a generator so a probe that hangs up early does not pay for the whole zone
+        message_id = struct.pack('!H', query.id)
+        return (message_id + wire[2:] for wire in messages)
+
+    def ixfr(self, serial):
+        """Return the messages of the IXFR answer for a client at @serial, the whole zone when the journal does not go back that far"""
+        soa = dnsq.Record(self.soa.name.relativize(self.origin), self.soa.ttl, self.soa.rdclass, self.soa.rdtype, self.soa[0])
+        if serial == soa.rdata.serial:
+            return render_messages(self.origin, dns.rdatatype.IXFR, [soa])
+
+        messages = render_ixfr(self.origin, soa, self.journal, serial, rrs_per_message=self.rrs_per_message)
+        if messages is None:
+            return self.messages
+        return messages
+
+
+class AuthoritativeServer(object):
+    """Serve @zones over UDP and TCP from background threads, a stand-in for the bind9 box of the Vagrantfile
+
+    A query is answered from the zone with the longest origin that holds its name, queries for names in
+    none of the zones are answered with REFUSED. Zone transfers are only answered over TCP, a UDP answer
+    that does not fit is truncated so the client retries over TCP.
+
+    Args:
+        zones `list` - of `Zone`
+        host `str` - The address to listen on. Default `127.0.0.1`
+        port `int` - The UDP and TCP port to listen on, `0` picks a free port. Default `0`
+        udp `bool` - When `False` only TCP is served. Default `True`
+        refuse_transfer `iterable` - of `str`, the zones whose zone transfers are answered with REFUSED. Default none
+        unresponsive `iterable` - of `str`, the zones whose queries are never answered, so the client times out. Default none
+
+    Attributes:
+        port `int` - The port the server listens on.
+        refuse_transfer `set` - of `dns.name.Name`, can be changed while the server is running.
+        unresponsive `set` - of `dns.name.Name`, can be changed while the server is running.
+
+    Ex:
+        zone = Zone.from_file(os.path.join(ZONES_DIR, 'db.foo-domain.com'), 'foo-domain.com.')
+        with AuthoritativeServer([zone]) as server:
+            resolver = dnsq.create_resolver(nameservers=['127.0.0.1'])
+            resolver.port = server.port
+            dnsq.ns_records(resolver, 'foo-domain.com')
+
+    """
+
+    def __init__(self, zones, host='127.0.0.1', port=0, udp=True, refuse_transfer=(), unresponsive=()):
+        self.zones = dict((zone.origin, zone) for zone in zones)
+        self.refuse_transfer = set(dnsq.get_absolute_name(x) for x in refuse_transfer)
+        self.unresponsive = set(dnsq.get_absolute_name(x) for x in unresponsive)
+        self.servers = _bind(host, port, udp)
+        for server in self.servers:
+            server.authority = self
+        self.host, self.port = self.servers[0].server_address[:2]
+        self.threads = []
+
+    def find_zone(self, name):
+        """Return the `Zone` with the longest origin that holds name, `None` when there is none"""
+        while True:
+            zone = self.zones.get(name)
+            if zone is not None or name == dns.name.root or name == dns.name.empty:
+                return zone
+            name = name.parent()
+
+    def answer(self, query, tcp=True):
+        """Return an iterable of the wire format messages that answer @query, `None` when it is not answered at all"""
+        question = query.question[0] if query.question else None
+        zone = self.find_zone(question.name) if question is not None else None
+
+        if zone is not None and zone.origin in self.unresponsive:
+            return None
+
+        if zone is not None and question.rdtype in (dns.rdatatype.AXFR, dns.rdatatype.IXFR):
+            if tcp and zone.origin not in self.refuse_transfer:
+                return zone.transfer(query)
+            response = None
+        else:
+            response = zone.lookup(query) if zone is not None else None
+
+        if response is None:
+            response = dns.message.make_response(query)
+            response.set_rcode(dns.rcode.REFUSED)
+            return [response.to_wire()]
+
+        origin = zone.origin
+        if tcp:
+            return [response.to_wire(origin=origin, max_size=65535)]
+
+        try:
+            return [response.to_wire(origin=origin, max_size=query.payload if query.edns >= 0 else 512)]
+        except dns.exception.TooBig:
+            response = dns.message.make_response(query)
+            response.flags |= dns.flags.AA | dns.flags.TC
+            return [response.to_wire()]
+
+    def start(self):
+        for server in self.servers:
+            # a short poll interval keeps stop, and with it every test using the server, quick
+            thread = threading.Thread(target=server.serve_forever, kwargs=dict(poll_interval=0.05))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            if self.threads:
+                server.shutdown()
+            server.server_close()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class AXFRServer(AuthoritativeServer):
+    """Serve the zone transfer of @records for @origin over TCP from a background thread
+
+    SOA queries for @origin are answered with the SOA of the zone, IXFR queries with the changes
+    in @journal or, when @journal is `None`, with NOTIMP. Queries for any other zone or type are
+    answered with REFUSED.
+
+    Args:
+        records `iterable` - of `dnsq.Record`, see `synthetic_zone`
+        origin `str` - The name of the zone. Default `DEFAULT_ORIGIN`
+        host `str` - The address to listen on. Default `127.0.0.1`
+        port `int` - The port to listen on, `0` picks a free port. Default `0`
+        rrs_per_message `int` - The number of records in each AXFR message. Default `RRS_PER_MESSAGE`
+        journal `list` - of (serial `int`, deleted `list`, added `list`), see `render_ixfr`. Default `None`, no IXFR
+
+    Attributes:
+        port `int` - The port the server listens on.
+        messages `list` - of `bytes`, the AXFR messages, set it to serve another zone's, Ex: `[]` for a transfer that fails.
+
+    Ex:
+        with AXFRServer(synthetic_zone(1000)) as server:
+            list(dnsq.zone_transfer(DEFAULT_ORIGIN, '127.0.0.1', port=server.port))
+
+    """
+
+    def __init__(self, records, origin=DEFAULT_ORIGIN, host='127.0.0.1', port=0, rrs_per_message=RRS_PER_MESSAGE, journal=None):
+        self.zone = Zone(records, origin=origin, rrs_per_message=rrs_per_message, journal=journal, index=False)
+        self.origin = self.zone.origin
+        self.soa = self.zone.soa
+        super(AXFRServer, self).__init__([self.zone], host=host, port=port, udp=False)
+
+    @property
+    def messages(self):
+        return self.zone.messages
+
+    @messages.setter
+    def messages(self, messages):
+        self.zone.messages = messages
+
+
+def _bind(host, port, udp):
+    """Return the TCP server and, when @udp is `True`, the UDP server listening on the same port"""
+    for _ in range(10):
+        tcp = _TCPServer((host, port), _TCPHandler)
+        if not udp:
+            return [tcp]
+        try:
+            return [tcp, _UDPServer((host, tcp.server_address[1]), _UDPHandler)]
+        except socket.error:
+            tcp.server_close()
+            # a free TCP port whose UDP port is taken, try another one
+            if port:
+                raise
+    raise socket.error('Unable to find a free port for UDP and TCP on {}'.format(host))
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UDPServer(socketserver.ThreadingMixIn, socketserver.UDPServer):
+    daemon_threads = True
+
+
+class _TCPHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        try:
+            length = _recv_exactly(self.request, 2)
+            (length,) = struct.unpack('!H', length)
+            query = dns.message.from_wire(_recv_exactly(self.request, length))
+            answer = self.server.authority.answer(query, tcp=True)
+            if answer is None:
+                # never answer, the client gives up on its own
+                while self.request.recv(512):
+                    pass
+                return
+            for wire in answer:
+                self.request.sendall(struct.pack('!H', len(wire)) + wire)
+        except (EOFError, socket.error):
+            # the client hung up early, Ex: a probe that only reads the first message
+            pass
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        data, sock = self.request
+        try:
+            query = dns.message.from_wire(data)
+        except dns.exception.DNSException:
+            return
+        for wire in self.server.authority.answer(query, tcp=False) or ():
+            sock.sendto(wire, self.client_address)
+
+
+def _recv_exactly(sock, count):
+    data = b''
+    while len(data) < count:
+        chunk = sock.recv(count - len(data))
+        if not chunk:
+            raise EOFError('The connection was closed')
+        data += chunk
+    return data
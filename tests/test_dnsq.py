@@ -2,11 +2,24 @@
 
 from __future__ import absolute_import
 from __future__ import unicode_literals
-
-import dns
+from tests import dnsserver
+
+import dns.exception
+import dns.message
+import dns.name
+import dns.query
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
 import dnsq
+import itertools
 import mock
+import os
 import pytest
+import socket
+import subprocess
+import sys
+import time
 
 EXPECTED_SUPPORTED_TYPES = (
     dnsq.STRING_TYPE,
@@ -42,6 +55,30 @@ foo-domain. 7199 IN SOA ns3.foo-domain. root.foo-domain. 2017103001 172800 900 1
 ;ADDITIONAL
 '''
 
+MOCKED_DNS_NXDOMAIN_MESSAGE = '''id 20124
+opcode QUERY
+rcode NXDOMAIN
+flags QR RD RA
+;QUESTION
+foo-domain. IN SOA
+;ANSWER
+;AUTHORITY
+foo-domain. 7199 IN SOA ns3.foo-domain. root.foo-domain. 2017103001 172800 900 1209600 3600
+;ADDITIONAL
+'''
+
+MOCKED_AXFR_PROBE_MESSAGE = '''id 25634
+opcode QUERY
+rcode {rcode}
+flags QR AA RA
+;QUESTION
+foo-domain. IN AXFR
+;ANSWER
+{answer}
+;AUTHORITY
+;ADDITIONAL
+'''
+
 MOCKED_AXFR_MESSAGE = '''id 25634
 opcode QUERY
 rcode NOERROR
@@ -111,6 +148,45 @@ def test_sort_ips(test_ips, expected):
     assert sorted_ips == expected
 
 
+def test_sort_ips_sorts_IPv4_before_IPv6_by_numeric_value():
+    actual = dnsq.sort_ips(['fd00::10', '192.168.1.9', 'fd00::9', '::1', '192.168.1.10'])
+
+    assert actual == ['192.168.1.9', '192.168.1.10', '::1', 'fd00::9', 'fd00::10']
+
+
+def test_sort_ips_will_raise_ValueError_when_an_item_is_not_an_ip():
+    with pytest.raises(ValueError):
+        dnsq.sort_ips(['192.168.1.10', '192.168.1.10 A ns1'])
+
+
+def test_sort_records_sorts_by_address_then_hostname_and_puts_records_without_an_address_last():
+    records = [dnsq.Record.from_text(x) for x in [
+        'txt-01 300 IN TXT "v=spf1 include:foo -all"',
+        'dc-app-03 7200 IN AAAA fd00::21',
+        'ns1 7200 IN A 192.168.10.1',
+        'app-01 7200 IN CNAME dc-app-01',
+        'dc-app-02 7200 IN A 192.168.1.20',
+        'dc-app-01 7200 IN A 192.168.1.20',
+        'ns2 7200 IN A 192.168.2.1',
+    ]]
+
+    actual = [x.hostname for x in dnsq.sort_records(records)]
+
+    assert actual == ['dc-app-01', 'dc-app-02', 'ns2', 'ns1', 'dc-app-03', 'app-01', 'txt-01']
+
+
+def test_sort_records_uses_the_owner_name_of_PTR_records():
+    records = [dnsq.Record.from_text(x) for x in [
+        '100 7200 IN PTR ns2.foo-domain.com.',
+        '20 7200 IN PTR dc-app-01.foo-domain.com.',
+        '3 7200 IN PTR ns1.foo-domain.com.',
+    ]]
+
+    actual = [x.hostname for x in dnsq.sort_records(records, origin='1.168.192.in-addr.arpa')]
+
+    assert actual == ['3', '20', '100']
+
+
 @pytest.mark.parametrize(
     'invalid_type',
     [
@@ -147,6 +223,22 @@ def test_get_resolver_domain_type_will_return_Name_instance(valid_type, expected
     assert actual_type.to_text() == expected
 
 
+def test_importing_dnsq_leaves_the_logging_configuration_to_the_application():
+    code = 'import logging, dnsq; print(len(logging.getLogger().handlers), logging.getLogger().level == logging.WARNING)'
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(dnsq.__file__))))
+
+    assert subprocess.check_output([sys.executable, '-c', code], env=env).decode('utf-8').split() == ['0', 'True']
+
+
+@pytest.mark.parametrize('enabled, calls', [(False, 0), (True, 1)])
+def test_create_resolver_only_logs_its_arguments_when_info_is_enabled(enabled, calls):
+    with mock.patch.object(dnsq.LOGGER, 'isEnabledFor', return_value=enabled):
+        with mock.patch.object(dnsq.LOGGER, 'info') as info_mock:
+            dnsq.create_resolver(nameservers=['1.2.3.4'])
+
+    assert info_mock.call_count == calls
+
+
 def test_create_resolver_with_default_arguments():
     resolver = dnsq.create_resolver()
 
@@ -187,6 +279,172 @@ def test_create_resolver_with_custom_nameservers_argument():
     assert resolver.timeout == 10.0
 
 
+@pytest.fixture
+def resolv_conf():
+    """Count how many times the system resolver configuration is read"""
+    def read_resolv_conf(self, filename):
+        self.nameservers = ['127.0.0.53']
+        self.domain = dns.name.from_text('foo-domain.com')
+        self.search = [self.domain]
+
+    dnsq.reload_resolvers()
+    with mock.patch.object(dns.resolver.Resolver, 'read_resolv_conf', autospec=True, side_effect=read_resolv_conf) as read_resolv_conf_mock:
+        yield read_resolv_conf_mock
+    dnsq.reload_resolvers()
+
+
+def test_create_resolver_reads_the_system_configuration_once(resolv_conf):
+    resolvers = [
+        dnsq.create_resolver(),
+        dnsq.create_resolver(search='example.com'),
+        dnsq.create_resolver(nameservers=['1.2.3.4']),
+        dnsq.get_system_resolver(),
+    ]
+
+    assert resolv_conf.call_count == 1
+    assert resolvers[0].nameservers == ['127.0.0.53']
+    assert resolvers[1].search == [dns.name.from_text('example.com')]
+    assert resolvers[2].nameservers == ['1.2.3.4']
+
+
+def test_create_resolver_returns_a_copy_of_the_pooled_resolver(resolv_conf):
+    resolver = dnsq.create_resolver(search='example.com', nameservers=['1.2.3.4'])
+    resolver.nameservers.append('6.6.6.6')
+    resolver.search.append(dns.name.from_text('evil.com'))
+    resolver.lifetime = 1.0
+
+    another = dnsq.create_resolver(search='example.com', nameservers=['1.2.3.4'])
+
+    assert another is not resolver
+    assert another.nameservers == ['1.2.3.4']
+    assert another.search == [dns.name.from_text('example.com')]
+    assert another.lifetime == 20.0
+
+
+def test_create_resolver_pool_is_bounded(resolv_conf):
+    with mock.patch('dnsq.RESOLVER_POOL_SIZE', 2):
+        for nameserver in ['1.2.3.4', '1.2.3.5', '1.2.3.6']:
+            dnsq.create_resolver(nameservers=[nameserver])
+
+    assert [x[1] for x in dnsq._RESOLVER_POOL.keys()] == [('1.2.3.5',), ('1.2.3.6',)]
+
+
+def test_reload_resolvers_reads_the_system_configuration_again(resolv_conf):
+    dnsq.create_resolver()
+    dnsq.reload_resolvers()
+    dnsq.create_resolver()
+
+    assert resolv_conf.call_count == 2
+
+
+def test_create_resolver_with_resolver_arguments_bypasses_the_pool(resolv_conf, tmpdir):
+    filename = str(tmpdir.join('resolv.conf'))
+    resolver = dnsq.create_resolver(nameservers=['1.2.3.4'], filename=filename)
+
+    resolv_conf.assert_called_once_with(resolver, filename)
+    assert dnsq._RESOLVER_POOL == {}
+
+
+def test_create_resolver_attaches_the_cache(resolv_conf):
+    cache = dnsq.AnswerCache(max_size=10)
+
+    assert dnsq.create_resolver(cache=cache).cache is cache
+    assert dnsq.create_resolver(cache=True).cache is dnsq.get_answer_cache()
+    assert dnsq.create_resolver().cache is None
+
+
+def mock_cached_resolver(cache, answer=None, side_effect=None):
+    """A resolver whose query method behaves like `dns.resolver.Resolver.query` with a cache"""
+    resolver = mock.MagicMock(spec=dns.resolver.Resolver)
+    resolver.cache = cache
+
+    def query(domain, rdtype, *args, **kwargs):
+        key = (dns.name.from_text(domain), dns.rdatatype.from_text(rdtype), dns.rdataclass.IN)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        if side_effect is not None:
+            raise side_effect
+        cache.put(key, answer)
+        return answer
+
+    resolver.query.side_effect = query
+    return resolver
+
+
+def test_ns_records_are_answered_from_the_cache_until_the_ttl_expires():
+    domain = 'foo-domain.'
+    cache = dnsq.AnswerCache(max_size=10)
+    answer = mock_NS_Answer(domain=domain)
+    resolver = mock_cached_resolver(cache, answer=answer)
+
+    with mock.patch('time.time', return_value=answer.expiration - 10):
+        first = dnsq.ns_records(resolver, domain)
+        second = dnsq.ns_records(resolver, domain)
+
+    assert first == second == ['ns1.foo-domain.', 'ns2.foo-domain.', 'ns3.foo-domain.']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    with mock.patch('time.time', return_value=answer.expiration + 1):
+        dnsq.ns_records(resolver, domain)
+
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_answer_cache_evicts_the_least_recently_used_answer():
+    cache = dnsq.AnswerCache(max_size=2)
+    answer = mock_NS_Answer(domain='foo-domain.')
+
+    cache.put('a', answer)
+    cache.put('b', answer)
+    cache.get('a')
+    cache.put('c', answer)
+
+    assert cache.get('a') is answer
+    assert cache.get('b') is None
+    assert cache.get('c') is answer
+    assert cache.stats == dict(hits=3, misses=1, size=2, max_size=2)
+
+
+@pytest.mark.parametrize(
+    'exception',
+    [
+        pytest.param(dns.resolver.NXDOMAIN(qnames=[dns.name.from_text('foo-domain.')])),
+        pytest.param(dns.resolver.NoAnswer()),
+    ]
+)
+def test_negative_answers_are_cached(exception):
+    cache = dnsq.AnswerCache(max_size=10, negative_ttl=30)
+    resolver = mock_cached_resolver(cache, side_effect=exception)
+
+    for i in range(3):
+        with pytest.raises(exception.__class__):
+            dnsq.soa_records(resolver, 'foo-domain.')
+
+    assert resolver.query.call_count == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    with mock.patch('time.time', return_value=time.time() + 31):
+        with pytest.raises(exception.__class__):
+            dnsq.soa_records(resolver, 'foo-domain.')
+
+    assert resolver.query.call_count == 2
+
+
+def test_negative_answers_are_cached_for_the_negative_ttl_of_the_zone():
+    response = dns.message.from_text(MOCKED_DNS_NXDOMAIN_MESSAGE)
+    exception = dns.resolver.NXDOMAIN(qnames=[dns.name.from_text('foo-domain.')], responses={dns.name.from_text('foo-domain.'): response})
+    cache = dnsq.AnswerCache(max_size=10)
+
+    with mock.patch('time.time', return_value=1000.0):
+        cache.put_negative('foo-domain.', dns.rdatatype.SOA, dns.rdataclass.IN, exception)
+        negative = cache.get_negative('foo-domain.', dns.rdatatype.SOA)
+
+    # min(SOA ttl, SOA minimum)
+    assert negative.exception is exception
+    assert negative.expiration == 1000.0 + 3600
+
+
 def test_ns_records_with_default_arguments_will_invoke_resolver_dot_query_and_return_a_non_empty_list_of_nameservers():
     domain = 'foo-domain.'
     mocked_results = mock_NS_Answer(domain=domain, message=MOCKED_DNS_NS_MESSAGE)
@@ -250,31 +508,63 @@ def test_supports_zone_transfer_with_default_arguments_will_return_True():
 
     expected_results = (
         [
-            ['@', '7200', 'IN', 'SOA', 'ns1', 'root', '2018070500', '28800', '3600', '604800', '38400'],
-            ['@', '7200', 'IN', 'NS', 'ns2'],
-            ['@', '7200', 'IN', 'NS', 'ns1'],
-            ['dc-app-01', '7200', 'IN', 'A', '192.168.1.20'],
-            ['dc-app-02', '7200', 'IN', 'A', '192.168.1.21'],
-            ['dc-dns-01', '7200', 'IN', 'A',  '192.168.1.10'],
-            ['dns-01', '7200', 'IN', 'CNAME', 'dc-dns-01'],
+            '@ 7200 IN SOA ns1 root 2018070500 28800 3600 604800 38400',
+            '@ 7200 IN NS ns2',
+            '@ 7200 IN NS ns1',
+            'dc-app-01 7200 IN A 192.168.1.20',
+            'dc-app-02 7200 IN A 192.168.1.21',
+            'dc-dns-01 7200 IN A 192.168.1.10',
+            'dns-01 7200 IN CNAME dc-dns-01',
         ],
     )
 
     for i, xfr_mock in enumerate(mock_AXFR_Answer()):
         expected = expected_results[i]
-        actual = [x for x in dnsq.zone_transfer(nameserver=nameserver, domain=domain)]
+        actual = [x.to_text() for x in dnsq.zone_transfer(nameserver=nameserver, domain=domain, sort=True)]
 
         assert actual == expected
         xfr_mock.assert_called_once_with(where=nameserver, zone=domain, timeout=10.0, lifetime=20.0)
 
 
+def test_zone_transfer_with_default_arguments_streams_the_records_in_the_order_they_were_received():
+    domain = 'foo-domain-example'
+    nameserver = '1.2.999.4'
+
+    expected = [
+        '@ 7200 IN SOA ns1 root 2018070500 28800 3600 604800 38400',
+        '@ 7200 IN NS ns2',
+        '@ 7200 IN NS ns1',
+        'dc-app-02 7200 IN A 192.168.1.21',
+        'dc-app-01 7200 IN A 192.168.1.20',
+        'dc-dns-01 7200 IN A 192.168.1.10',
+        'dns-01 7200 IN CNAME dc-dns-01',
+    ]
+
+    for xfr_mock in mock_AXFR_Answer():
+        actual = [x.to_text() for x in dnsq.zone_transfer(nameserver=nameserver, domain=domain)]
+
+        assert actual == expected
+        xfr_mock.assert_called_once_with(where=nameserver, zone=domain, timeout=10.0, lifetime=20.0)
+
+
+def test_zone_transfer_yields_the_first_record_before_the_transfer_completes():
+    def messages():
+        yield dns.message.from_text(MOCKED_AXFR_MESSAGE)
+        raise AssertionError('the second message should not be read yet')
+
+    with mock.patch('dnsq.dns.query.xfr', autospec=True, return_value=messages()):
+        records = dnsq.zone_transfer(nameserver='1.2.999.4', domain='foo-domain-example')
+
+        assert next(records).to_text() == '@ 7200 IN SOA ns1 root 2018070500 28800 3600 604800 38400'
+
+
 def test_supports_zone_transfer_with_default_arguments_will_raise_dns_exception_FormError_and_return_False():
     domain = 'foo-domain.'
     nameserver = '1.2.999.4'
 
     # every time zone_transfer is called, we raise a FormError
     with mock.patch('dnsq.zone_transfer', side_effect=dns.exception.FormError):
-        actual = dnsq.supports_zone_transfer(domain=domain, nameserver=nameserver)
+        actual = dnsq.supports_zone_transfer(domain=domain, nameserver=nameserver, probe=False)
 
     assert actual is False
 
@@ -285,7 +575,78 @@ def test_supports_zone_transfer_with_default_arguments_will_raise_dns_exception_
 
     # every time zone_transfer is called, we raise a FormError
     with mock.patch('dnsq.zone_transfer', side_effect=dns.exception.Timeout):
-        actual = dnsq.supports_zone_transfer(domain=domain, nameserver=nameserver)
+        actual = dnsq.supports_zone_transfer(domain=domain, nameserver=nameserver, probe=False)
+
+    assert actual is False
+
+
+def mock_AXFR_probe_response(rcode='NOERROR', answer='foo-domain. 7200 IN SOA ns1.foo-domain. root.foo-domain. 2018070500 28800 3600 604800 38400'):
+    """A wrapper to create the first `dns.message.Message` of a zone transfer for probe unit tests
+
+    """
+    return dns.message.from_text(MOCKED_AXFR_PROBE_MESSAGE.format(rcode=rcode, answer=answer))
+
+
+def test_probe_zone_transfer_reads_only_the_first_message():
+    response = mock_AXFR_probe_response()
+
+    with mock.patch('dnsq.dns.query.tcp', autospec=True, return_value=response) as tcp_mock:
+        actual = dnsq.probe_zone_transfer(domain='foo-domain.', nameserver='1.2.3.4')
+
+    assert actual is response
+    assert tcp_mock.call_count == 1
+    query, nameserver, timeout = tcp_mock.call_args[0]
+    assert query.question[0].name == dns.name.from_text('foo-domain.')
+    assert query.question[0].rdtype == dns.rdatatype.AXFR
+    assert nameserver == '1.2.3.4'
+    assert timeout == 10.0
+
+
+def test_probe_zone_transfer_timeout_is_bounded_by_lifetime():
+    with mock.patch('dnsq.dns.query.tcp', autospec=True, return_value=mock_AXFR_probe_response()) as tcp_mock:
+        dnsq.probe_zone_transfer(domain='foo-domain.', nameserver='1.2.3.4', timeout=10.0, lifetime=2.0)
+
+    assert tcp_mock.call_args[0][2] == 2.0
+
+
+@pytest.mark.parametrize(
+    'rcode, answer, expected_err_msg',
+    [
+        pytest.param('REFUSED', '', 'The zone transfer was answered with rcode REFUSED'),
+        pytest.param('NOTAUTH', '', 'The zone transfer was answered with rcode NOTAUTH'),
+        pytest.param('NOERROR', '', 'The zone transfer did not start with the SOA of foo-domain.'),
+        pytest.param('NOERROR', 'foo-domain. 7200 IN NS ns1.foo-domain.', 'The zone transfer did not start with the SOA of foo-domain.'),
+        pytest.param('NOERROR', 'bar-domain. 7200 IN SOA ns1. root. 1 2 3 4 5', 'The zone transfer did not start with the SOA of foo-domain.'),
+    ]
+)
+def test_probe_zone_transfer_will_raise_dns_exception_FormError_when_the_zone_transfer_is_not_allowed(rcode, answer, expected_err_msg):
+    with mock.patch('dnsq.dns.query.tcp', autospec=True, return_value=mock_AXFR_probe_response(rcode=rcode, answer=answer)):
+        with pytest.raises(dns.exception.FormError) as exp:
+            dnsq.probe_zone_transfer(domain='foo-domain.', nameserver='1.2.3.4')
+
+    assert expected_err_msg in str(exp.value)
+
+
+@pytest.mark.parametrize(
+    'rcode, expected',
+    [
+        pytest.param('NOERROR', True),
+        pytest.param('REFUSED', False),
+    ]
+)
+def test_supports_zone_transfer_with_default_arguments_only_probes_the_zone_transfer(rcode, expected):
+    with mock.patch('dnsq.dns.query.tcp', autospec=True, return_value=mock_AXFR_probe_response(rcode=rcode)) as tcp_mock:
+        with mock.patch('dnsq.zone_transfer') as zone_transfer_mock:
+            actual = dnsq.supports_zone_transfer(domain='foo-domain.', nameserver='1.2.3.4')
+
+    assert actual is expected
+    assert tcp_mock.call_count == 1
+    zone_transfer_mock.assert_not_called()
+
+
+def test_supports_zone_transfer_with_default_arguments_will_raise_dns_exception_Timeout_from_the_probe_and_return_False():
+    with mock.patch('dnsq.dns.query.tcp', autospec=True, side_effect=dns.exception.Timeout):
+        actual = dnsq.supports_zone_transfer(domain='foo-domain.', nameserver='1.2.3.4')
 
     assert actual is False
 
@@ -312,3 +673,210 @@ def test_zone_transfer_with_default_arguments_will_raise_dns_exception_Timeout()
             dnsq.zone_transfer(domain=domain, nameserver=nameserver)
 
         assert 'The DNS operation timed out' in str(exp.value)
+
+
+def test_zone_transfer_yields_Record_objects():
+    for xfr_mock in mock_AXFR_Answer():
+        records = [x for x in dnsq.zone_transfer(nameserver='1.2.999.4', domain='foo-domain-example')]
+
+    record = records[3]
+    assert isinstance(record, dnsq.Record)
+    assert record.name == dns.name.from_text('dc-app-02', None)
+    assert record.hostname == 'dc-app-02'
+    assert record.ttl == 7200
+    assert record.rdclass == dns.rdataclass.IN
+    assert record.rdtype == dns.rdatatype.A
+    assert record.type == 'A'
+    assert record.rdata.address == '192.168.1.21'
+
+
+@pytest.mark.parametrize(
+    'text',
+    [
+        pytest.param('dc-app-01 7200 IN A 192.168.1.20'),
+        pytest.param('@ 7200 IN NS ns1'),
+        pytest.param('txt-01 300 IN TXT "v=spf1 include:foo -all" "a second string"'),
+    ]
+)
+def test_Record_from_text_and_to_text_round_trip(text):
+    record = dnsq.Record.from_text(text)
+
+    assert record.to_text() == text
+    assert str(record) == text
+
+
+def test_zone_transfer_object_transfers_the_zone_once_and_yields_the_records():
+    domain = 'foo-domain.'
+    nameserver = '1.2.999.4'
+    records = [['@', '7200', 'IN', 'NS', 'ns1'], ['ns1', '7200', 'IN', 'A', '192.168.1.10']]
+
+    with mock.patch('dnsq.zone_transfer', return_value=iter(records)) as zone_transfer_mock:
+        transfer = dnsq.ZoneTransfer(domain=domain, nameserver=nameserver)
+
+        assert transfer.supported is True
+        assert bool(transfer) is True
+        assert transfer.error is None
+        assert [x for x in transfer] == records
+
+    zone_transfer_mock.assert_called_once_with(domain=domain, nameserver=nameserver, timeout=10.0, lifetime=20.0)
+
+
+@pytest.mark.parametrize(
+    'exception, refused, timed_out',
+    [
+        pytest.param(dns.exception.FormError, True, False),
+        pytest.param(dns.exception.Timeout, False, True),
+    ]
+)
+def test_zone_transfer_object_records_the_reason_when_the_zone_transfer_fails(exception, refused, timed_out):
+    with mock.patch('dnsq.zone_transfer', side_effect=exception):
+        transfer = dnsq.ZoneTransfer(domain='foo-domain.', nameserver='1.2.999.4')
+
+    assert transfer.supported is False
+    assert bool(transfer) is False
+    assert isinstance(transfer.error, exception)
+    assert transfer.refused is refused
+    assert transfer.timed_out is timed_out
+    assert [x for x in transfer] == []
+
+
+@pytest.mark.parametrize(
+    'exception, expected_status',
+    [
+        pytest.param(None, 'supported'),
+        pytest.param(dns.exception.FormError, 'refused'),
+        pytest.param(dns.exception.Timeout, 'timeout'),
+        pytest.param(EOFError, 'error'),
+        pytest.param(socket.error, 'error'),
+    ]
+)
+def test_zone_transfer_object_status(exception, expected_status):
+    with mock.patch('dnsq.zone_transfer', side_effect=exception, return_value=iter([['foo']])):
+        transfer = dnsq.ZoneTransfer(domain='foo-domain.', nameserver='1.2.999.4')
+
+    assert transfer.status == expected_status
+
+
+def test_zone_transfer_object_close_stops_the_zone_transfer():
+    def records():
+        yield ['first']
+        raise AssertionError('the zone transfer should have been closed')
+
+    with mock.patch('dnsq.zone_transfer', return_value=records()):
+        transfer = dnsq.ZoneTransfer(domain='foo-domain.', nameserver='1.2.999.4')
+        transfer.close()
+
+    assert transfer.supported is True
+    assert [x for x in transfer] == []
+
+
+def test_scan_zone_transfers_probes_every_pair():
+    pairs = [('foo-domain.', '1.2.3.4'), ('bar-domain.', '1.2.3.5'), ('baz-domain.', '1.2.3.6')]
+
+    def probe_zone_transfer(domain, nameserver, *args, **kwargs):
+        if domain == 'bar-domain.':
+            raise dns.exception.FormError
+        if domain == 'baz-domain.':
+            raise dns.exception.Timeout
+
+    with mock.patch('dnsq.probe_zone_transfer', side_effect=probe_zone_transfer):
+        with mock.patch('dnsq.zone_transfer') as zone_transfer_mock:
+            results = [x for x in dnsq.scan_zone_transfers(pairs, workers=2)]
+
+    actual = sorted((x.domain, x.nameserver, x.status) for x in results)
+    assert actual == [
+        ('bar-domain.', '1.2.3.5', 'refused'),
+        ('baz-domain.', '1.2.3.6', 'timeout'),
+        ('foo-domain.', '1.2.3.4', 'supported'),
+    ]
+    zone_transfer_mock.assert_not_called()
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_lookup_records_looks_up_every_domain_with_the_one_resolver(ordered):
+    domains = ['foo-domain.com', 'bar-domain.com', 'missing-domain.com']
+    resolver = mock.Mock()
+
+    def ns_records(resolver, domain, *args, **kwargs):
+        if domain == dns.name.from_text('missing-domain.com.'):
+            raise dns.resolver.NXDOMAIN()
+        return ['ns1.{}'.format(domain)]
+
+    with mock.patch('dnsq.ns_records', side_effect=ns_records) as ns_records_mock:
+        results = [x for x in dnsq.lookup_records(resolver, iter(domains), workers=2, ordered=ordered)]
+
+    if not ordered:
+        results.sort(key=lambda x: domains.index(x[0]))
+    assert [x[:2] for x in results] == [('foo-domain.com', ['ns1.foo-domain.com.']), ('bar-domain.com', ['ns1.bar-domain.com.']), ('missing-domain.com', [])]
+    assert isinstance(results[2][2], dns.resolver.NXDOMAIN)
+    assert set(x[0][0] for x in ns_records_mock.call_args_list) == set([resolver])
+
+
+def test_lookup_records_will_raise_AssertionError_for_other_types():
+    with pytest.raises(AssertionError) as exp:
+        [x for x in dnsq.lookup_records(mock.Mock(), ['foo-domain.com'], rdtype='A')]
+
+    assert 'Expected rdtype to be NS or SOA, got A' in str(exp.value)
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_concurrent_map_calls_func_for_every_item(ordered):
+    items = list(range(50))
+    results = [x for x in dnsq.concurrent_map(lambda x: x * 2, items, workers=4, ordered=ordered)]
+
+    if ordered:
+        assert results == [x * 2 for x in items]
+    else:
+        assert sorted(results) == [x * 2 for x in items]
+
+
+def test_concurrent_map_will_raise_AssertionError_when_workers_is_not_positive():
+    with pytest.raises(AssertionError) as exp:
+        [x for x in dnsq.concurrent_map(lambda x: x, [1], workers=0)]
+
+    assert 'Expected workers to be greater than 0, got 0' in str(exp.value)
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_concurrent_map_only_takes_items_as_the_results_come_back(ordered):
+    taken = []
+
+    def items():
+        for x in itertools.count():
+            taken.append(x)
+            yield x
+
+    results = dnsq.concurrent_map(lambda x: x, items(), workers=4, ordered=ordered)
+    first = [next(results) for _ in range(10)]
+    results.close()
+
+    assert len(first) == 10
+    assert len(taken) <= 10 + 2 * 4
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_concurrent_map_raises_the_exception_of_func(ordered):
+    def func(x):
+        if x == 3:
+            raise ValueError('bad item 3')
+        return x
+
+    with pytest.raises(ValueError) as exp:
+        [x for x in dnsq.concurrent_map(func, range(10), workers=2, ordered=ordered)]
+
+    assert 'bad item 3' in str(exp.value)
+
+
+def test_zone_transfer_from_the_AXFRServer_stand_in_yields_every_record_once():
+    records = list(dnsserver.synthetic_zone(1000))
+
+    with dnsserver.AXFRServer(records) as server:
+        actual = [x for x in dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', port=server.port)]
+
+    assert [x.to_text() for x in actual] == [x.to_text() for x in records]
+
+
+def test_supports_zone_transfer_against_the_AXFRServer_stand_in():
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(10)) as server:
+        assert dnsq.supports_zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', port=server.port) is True
+        assert dnsq.supports_zone_transfer('bar-domain.', '127.0.0.1', port=server.port) is False
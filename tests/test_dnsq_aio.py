@@ -0,0 +1,293 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import dns.exception
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.resolver
+import dns.rrset
+import dnsq
+import pytest
+import struct
+import sys
+
+if sys.version_info < (3, 6):
+    pytest.skip('dnsq.aio requires python 3.6 or newer', allow_module_level=True)
+
+import asyncio  # noqa: E402
+import dnsq.aio  # noqa: E402
+
+DOMAIN = 'foo-domain.'
+SOA = ('ns1.foo-domain. root.foo-domain. 2018070500 28800 3600 604800 38400',)
+
+
+def ns_answer(query):
+    response = dns.message.make_response(query)
+    response.answer.append(dns.rrset.from_text(query.question[0].name, 7200, 'IN', 'NS', 'ns2.foo-domain.', 'ns1.foo-domain.'))
+    return response
+
+
+def soa_answer(query):
+    response = dns.message.make_response(query)
+    response.answer.append(dns.rrset.from_text(query.question[0].name, 7200, 'IN', 'SOA', *SOA))
+    return response
+
+
+def nxdomain_answer(query):
+    response = dns.message.make_response(query)
+    response.set_rcode(dns.rcode.NXDOMAIN)
+    return response
+
+
+def truncated_answer(query):
+    response = dns.message.make_response(query)
+    response.flags |= dns.flags.TC
+    return response
+
+
+def refused_answer(query):
+    response = dns.message.make_response(query)
+    response.set_rcode(dns.rcode.REFUSED)
+    return [response]
+
+
+def axfr_answer(query):
+    zone = query.question[0].name
+    first = dns.message.make_response(query)
+    first.answer.append(dns.rrset.from_text(zone, 7200, 'IN', 'SOA', *SOA))
+    first.answer.append(dns.rrset.from_text(zone, 7200, 'IN', 'NS', 'ns1.foo-domain.'))
+    first.answer.append(dns.rrset.from_text('dc-app-01.foo-domain.', 7200, 'IN', 'A', '192.168.1.20'))
+
+    second = dns.message.make_response(query)
+    second.answer.append(dns.rrset.from_text('txt-01.foo-domain.', 300, 'IN', 'TXT', '"v=spf1 include:foo -all"'))
+    second.answer.append(dns.rrset.from_text(zone, 7200, 'IN', 'SOA', *SOA))
+    return [first, second]
+
+
+def no_answer(query):
+    return None
+
+
+class UDPServer(asyncio.DatagramProtocol):
+    """Answer every query with handler(query), nothing is sent when the handler returns `None`"""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        response = self.handler(dns.message.from_wire(data))
+        if response is not None:
+            self.transport.sendto(response.to_wire(), addr)
+
+
+class TCPServer(asyncio.Protocol):
+    """Answer every query with the messages returned by handler(query)"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.buffer = b''
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        if len(self.buffer) < 2:
+            return
+
+        (length,) = struct.unpack('!H', self.buffer[:2])
+        if len(self.buffer) < length + 2:
+            return
+
+        responses = self.handler(dns.message.from_wire(self.buffer[2:length + 2]))
+        if responses is None:
+            return
+
+        if isinstance(responses, dns.message.Message):
+            responses = [responses]
+        for response in responses:
+            wire = response.to_wire()
+            self.transport.write(struct.pack('!H', len(wire)) + wire)
+        self.transport.close()
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    # let the transports that were closed during the test finish closing
+    loop.run_until_complete(asyncio.sleep(0.01))
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def serve(loop):
+    """Start a UDP and a TCP server on 127.0.0.1 and return their port"""
+    transports = []
+
+    def start(udp_handler=no_answer, tcp_handler=no_answer):
+        server = loop.run_until_complete(loop.create_server(lambda: TCPServer(tcp_handler), '127.0.0.1', 0))
+        port = server.sockets[0].getsockname()[1]
+        transport, _ = loop.run_until_complete(loop.create_datagram_endpoint(lambda: UDPServer(udp_handler), local_addr=('127.0.0.1', port)))
+        transports.extend([server, transport])
+        return port
+
+    yield start
+
+    for transport in transports:
+        transport.close()
+    loop.run_until_complete(asyncio.sleep(0.01))
+
+
+def create_resolver(port, timeout=1.0, lifetime=2.0):
+    resolver = dnsq.create_resolver(nameservers=['127.0.0.1'], timeout=timeout, lifetime=lifetime)
+    resolver.port = port
+    return resolver
+
+
+def collect(loop, agen):
+    """Drain an async generator without async syntax"""
+    results = []
+    while True:
+        try:
+            results.append(loop.run_until_complete(agen.__anext__()))
+        except StopAsyncIteration:
+            return results
+
+
+def test_ns_records_returns_a_sorted_list_of_nameservers(loop, serve):
+    resolver = create_resolver(serve(udp_handler=ns_answer))
+
+    actual = loop.run_until_complete(dnsq.aio.ns_records(resolver, DOMAIN))
+
+    assert actual == ['ns1.foo-domain.', 'ns2.foo-domain.']
+
+
+def test_soa_records_returns_a_sorted_list_of_SOAs(loop, serve):
+    resolver = create_resolver(serve(udp_handler=soa_answer))
+
+    actual = loop.run_until_complete(dnsq.aio.soa_records(resolver, DOMAIN))
+
+    assert actual == [SOA[0].split(' ')]
+
+
+def test_query_retries_over_tcp_when_the_udp_answer_is_truncated(loop, serve):
+    resolver = create_resolver(serve(udp_handler=truncated_answer, tcp_handler=ns_answer))
+
+    actual = loop.run_until_complete(dnsq.aio.ns_records(resolver, DOMAIN))
+
+    assert actual == ['ns1.foo-domain.', 'ns2.foo-domain.']
+
+
+def test_query_will_raise_NXDOMAIN(loop, serve):
+    resolver = create_resolver(serve(udp_handler=nxdomain_answer))
+
+    with pytest.raises(dns.resolver.NXDOMAIN):
+        loop.run_until_complete(dnsq.aio.ns_records(resolver, DOMAIN))
+
+
+def test_query_will_raise_NoAnswer(loop, serve):
+    resolver = create_resolver(serve(udp_handler=lambda query: dns.message.make_response(query)))
+
+    with pytest.raises(dns.resolver.NoAnswer):
+        loop.run_until_complete(dnsq.aio.ns_records(resolver, DOMAIN))
+
+
+def test_query_uses_the_resolver_cache(loop, serve):
+    queries = []
+
+    def handler(query):
+        queries.append(query)
+        if query.question[0].name.to_text() == 'nx.foo-domain.':
+            return nxdomain_answer(query)
+        return ns_answer(query)
+
+    resolver = create_resolver(serve(udp_handler=handler))
+    resolver.cache = dnsq.AnswerCache(max_size=10)
+
+    for i in range(3):
+        loop.run_until_complete(dnsq.aio.ns_records(resolver, DOMAIN))
+        with pytest.raises(dns.resolver.NXDOMAIN):
+            loop.run_until_complete(dnsq.aio.ns_records(resolver, 'nx.foo-domain.'))
+
+    assert len(queries) == 2
+    assert (resolver.cache.hits, resolver.cache.misses) == (4, 2)
+
+
+def test_query_will_raise_dns_exception_Timeout_after_the_resolver_lifetime(loop, serve):
+    resolver = create_resolver(serve(), timeout=0.1, lifetime=0.3)
+    start = loop.time()
+
+    with pytest.raises(dns.exception.Timeout):
+        loop.run_until_complete(dnsq.aio.ns_records(resolver, DOMAIN))
+
+    assert loop.time() - start < 1.0
+
+
+def test_queries_run_concurrently_on_one_event_loop(loop, serve):
+    resolver = create_resolver(serve(udp_handler=soa_answer))
+    domains = ['domain-{}.foo-domain.'.format(x) for x in range(200)]
+
+    results = loop.run_until_complete(asyncio.gather(*[dnsq.aio.soa_records(resolver, domain) for domain in domains]))
+
+    assert len(results) == 200
+    assert all(result == [SOA[0].split(' ')] for result in results)
+
+
+@pytest.mark.parametrize(
+    'tcp_handler, expected',
+    [
+        pytest.param(axfr_answer, True),
+        pytest.param(refused_answer, False),
+    ]
+)
+def test_supports_zone_transfer(loop, serve, tcp_handler, expected):
+    port = serve(tcp_handler=tcp_handler)
+
+    actual = loop.run_until_complete(dnsq.aio.supports_zone_transfer(DOMAIN, '127.0.0.1', port=port))
+
+    assert actual is expected
+
+
+def test_supports_zone_transfer_returns_False_on_timeout(loop, serve):
+    port = serve()
+
+    actual = loop.run_until_complete(dnsq.aio.supports_zone_transfer(DOMAIN, '127.0.0.1', timeout=0.2, port=port))
+
+    assert actual is False
+
+
+def test_zone_transfer_yields_every_record_once(loop, serve):
+    port = serve(tcp_handler=axfr_answer)
+
+    records = collect(loop, dnsq.aio.zone_transfer(DOMAIN, '127.0.0.1', port=port))
+
+    assert all(isinstance(x, dnsq.Record) for x in records)
+    assert [x.to_text() for x in records] == [
+        '@ 7200 IN SOA ns1 root 2018070500 28800 3600 604800 38400',
+        '@ 7200 IN NS ns1',
+        'dc-app-01 7200 IN A 192.168.1.20',
+        'txt-01 300 IN TXT "v=spf1 include:foo -all"',
+    ]
+
+
+def test_zone_transfer_will_raise_dns_exception_FormError_when_refused(loop, serve):
+    port = serve(tcp_handler=refused_answer)
+
+    with pytest.raises(dns.exception.FormError):
+        collect(loop, dnsq.aio.zone_transfer(DOMAIN, '127.0.0.1', port=port))
+
+
+def test_zone_transfer_will_raise_dns_exception_Timeout(loop, serve):
+    port = serve()
+
+    with pytest.raises(dns.exception.Timeout):
+        collect(loop, dnsq.aio.zone_transfer(DOMAIN, '127.0.0.1', timeout=0.1, lifetime=0.5, port=port))
@@ -0,0 +1,136 @@
+# coding: utf-8
+"""The integration tests of test_dnsq_integration.py against the in-process stand-in instead of the Vagrant bind9 box"""
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from tests import dnsserver
+
+import dns.exception
+import dns.resolver
+import dnsq
+import dnsq.reverse
+import os
+import pytest
+import time
+
+SEARCH_DOMAIN = 'foo-domain.com'
+REVERSE_DOMAIN = '1.168.192.in-addr.arpa'
+NAMESERVER = '127.0.0.1'
+LIFETIME = 5.0
+
+
+@pytest.fixture(scope='module')
+def server():
+    zones = [
+        dnsserver.Zone.from_file(os.path.join(dnsserver.ZONES_DIR, 'db.foo-domain.com'), SEARCH_DOMAIN),
+        dnsserver.Zone.from_file(os.path.join(dnsserver.ZONES_DIR, 'db.192.168.1'), REVERSE_DOMAIN),
+    ]
+    with dnsserver.AuthoritativeServer(zones, host=NAMESERVER) as server:
+        yield server
+
+
+@pytest.fixture
+def resolver(server):
+    resolver = dnsq.create_resolver(search=SEARCH_DOMAIN, nameservers=[NAMESERVER], lifetime=LIFETIME)
+    resolver.port = server.port
+    return resolver
+
+
+def test_ns_records(resolver):
+    assert dnsq.ns_records(resolver, domain=SEARCH_DOMAIN) == ['ns1.foo-domain.com.', 'ns2.foo-domain.com.']
+
+
+def test_soa_records(resolver):
+    assert dnsq.soa_records(resolver, domain=SEARCH_DOMAIN) == [
+        ['ns1.foo-domain.com.', 'root.foo-domain.com.', '2018070500', '28800', '3600', '604800', '86400'],
+    ]
+
+
+def test_nameserver_hostname_to_ip_lookup(resolver):
+    assert [x.address for x in dnsq.query(resolver, 'dc-app-01.foo-domain.com', 'A')] == ['192.168.1.20']
+
+
+def test_nameserver_follows_a_cname_in_the_zone(resolver):
+    answer = dnsq.query(resolver, 'app-01.foo-domain.com', 'A')
+
+    assert answer.canonical_name.to_text() == 'dc-app-01.foo-domain.com.'
+    assert [x.address for x in answer] == ['192.168.1.20']
+
+
+def test_nameserver_ip_to_hostname_lookup(resolver):
+    assert list(dnsq.reverse.lookup_ptrs(resolver, ['192.168.1.20', '192.168.1.99'], ordered=True))[0] == (
+        '192.168.1.20', ['dc-app-01.foo-domain.com.'], None)
+
+
+@pytest.mark.parametrize(
+    'domain, rdtype, exception',
+    [
+        pytest.param('missing.foo-domain.com', 'A', dns.resolver.NXDOMAIN, id='nxdomain'),
+        pytest.param('dc-app-01.foo-domain.com', 'AAAA', dns.resolver.NoAnswer, id='no answer'),
+        pytest.param('example.com', 'A', dns.resolver.NoNameservers, id='refused'),
+    ]
+)
+def test_nameserver_negative_answers(resolver, domain, rdtype, exception):
+    with pytest.raises(exception):
+        dnsq.query(resolver, domain, rdtype)
+
+
+def test_supports_zone_transfer_returns_True(server):
+    assert dnsq.supports_zone_transfer(domain=SEARCH_DOMAIN, nameserver=NAMESERVER, lifetime=LIFETIME, port=server.port) is True
+
+
+def test_supports_zone_transfer_returns_False(server):
+    assert dnsq.supports_zone_transfer(domain='a-non-existant-domain-for-unit-test.com', nameserver=NAMESERVER, lifetime=LIFETIME,
+                                       port=server.port) is False
+
+
+def test_zone_transfer_yields_every_record_of_the_zone_file(server):
+    expected = dnsserver.zone_file_records(os.path.join(dnsserver.ZONES_DIR, 'db.192.168.1'), REVERSE_DOMAIN)
+
+    actual = list(dnsq.zone_transfer(REVERSE_DOMAIN, NAMESERVER, lifetime=LIFETIME, port=server.port))
+
+    assert sorted(x.to_text() for x in actual) == sorted(x.to_text() for x in expected)
+
+
+def test_supports_zone_transfer_returns_False_when_the_zone_transfer_is_refused():
+    zone = dnsserver.Zone(dnsserver.synthetic_zone(10))
+    with dnsserver.AuthoritativeServer([zone], refuse_transfer=[dnsserver.DEFAULT_ORIGIN]) as server:
+        resolver = dnsq.create_resolver(nameservers=[NAMESERVER])
+        resolver.port = server.port
+
+        assert dnsq.supports_zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, port=server.port) is False
+        # everything else is still answered
+        assert len(dnsq.query(resolver, dnsserver.DEFAULT_ORIGIN, 'SOA')) == 1
+
+
+def test_unresponsive_zone_times_out_over_udp_and_tcp():
+    zone = dnsserver.Zone(dnsserver.synthetic_zone(10))
+    with dnsserver.AuthoritativeServer([zone], unresponsive=[dnsserver.DEFAULT_ORIGIN]) as server:
+        resolver = dnsq.create_resolver(nameservers=[NAMESERVER], lifetime=0.2, timeout=0.2)
+        resolver.port = server.port
+
+        start = time.time()
+        with pytest.raises(dns.exception.Timeout):
+            dnsq.query(resolver, dnsserver.DEFAULT_ORIGIN, 'SOA')
+        assert dnsq.supports_zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, lifetime=0.2, timeout=0.2, port=server.port) is False
+        assert time.time() - start < 2
+
+
+def test_an_answer_too_large_for_udp_is_retried_over_tcp():
+    records = list(dnsserver.synthetic_zone(2)) + [
+        dnsq.Record.from_text('big 300 IN TXT "{}"'.format('x' * 200 + str(i))) for i in range(20)
+    ]
+    with dnsserver.AuthoritativeServer([dnsserver.Zone(records)]) as server:
+        resolver = dnsq.create_resolver(nameservers=[NAMESERVER])
+        resolver.port = server.port
+
+        assert len(dnsq.query(resolver, 'big.' + dnsserver.DEFAULT_ORIGIN, 'TXT')) == 20
+
+
+def test_a_large_zone_is_served_over_udp_and_tcp():
+    with dnsserver.AuthoritativeServer([dnsserver.Zone(dnsserver.synthetic_zone(5000))]) as server:
+        resolver = dnsq.create_resolver(nameservers=[NAMESERVER])
+        resolver.port = server.port
+
+        assert [x.address for x in dnsq.query(resolver, 'host-0004990.' + dnsserver.DEFAULT_ORIGIN, 'A')] == ['10.0.19.126']
+        assert sum(1 for _ in dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, port=server.port)) == 5000
@@ -5,7 +5,14 @@ from __future__ import unicode_literals
 from dnsq import cli
 from tests import conftest
 
+import dns.exception
+import dns.resolver
 import dnsq
+import dnsq.consistency
+import dnsq.metrics
+import dnsq.serial
+import io
+import json
 import logging
 import mock
 import pytest
@@ -183,7 +190,7 @@ def test_axfr_with_short_arguments():
         'zz-bar-01 7200 IN A 192.168.1.23'
     )
 
-    assert_cli('dnsq -t axfr -d {domain} -n {nameserver} --timeout {timeout}'.format(nameserver=DEFAULT_NAMESERVER, domain=DEFAULT_DOMAIN, timeout=DEFAULT_TIMEOUT),
+    assert_cli('dnsq -t axfr -d {domain} -n {nameserver} --timeout {timeout} --sort-by hostname'.format(nameserver=DEFAULT_NAMESERVER, domain=DEFAULT_DOMAIN, timeout=DEFAULT_TIMEOUT),
                expected=expected,
                rc=0,
                stdout=True,
@@ -207,7 +214,7 @@ def test_axfr_with_long_arguments():
         'zz-bar-01 7200 IN A 192.168.1.23'
     )
 
-    assert_cli('dnsq --type axfr --domain {domain} --nameserver {nameserver} --timeout {timeout}'.format(nameserver=DEFAULT_NAMESERVER, domain=DEFAULT_DOMAIN, timeout=DEFAULT_TIMEOUT),
+    assert_cli('dnsq --type axfr --domain {domain} --nameserver {nameserver} --timeout {timeout} --sort-by hostname'.format(nameserver=DEFAULT_NAMESERVER, domain=DEFAULT_DOMAIN, timeout=DEFAULT_TIMEOUT),
                expected=expected,
                rc=0,
                stdout=True,
@@ -218,10 +225,37 @@ def test_axfr_with_long_arguments():
 @mock.patch('dnsq.create_resolver', side_effect=Exception('called create_resolver'))
 def test_when_options_domain_and_namerserver_are_present_should_create_resolver(create_resolver_mock):
     with pytest.raises(Exception) as exp:
-        dnsq.cli.execute(argv=['--domain', 'example.com', '--nameserver', '1.0.0.1'])
+        dnsq.cli.execute(argv=['--type', 'ns', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
 
     assert 'called create_resolver' in str(exp.value)
+    create_resolver_mock.assert_called_once_with(search='example.com', nameservers='1.0.0.1', lifetime=20.0)
+
+
+@mock.patch('dnsq.get_system_resolver', side_effect=Exception('called get_system_resolver'))
+@mock.patch('dnsq.create_resolver', side_effect=Exception('called create_resolver'))
+def test_create_parser_should_not_create_a_resolver(create_resolver_mock, get_system_resolver_mock):
+    parser = cli.create_parser()
+
+    with pytest.raises(SystemExit) as exp:
+        parser.parse_args(['--version'])
+
+    assert str(exp.value) == '0'
+    create_resolver_mock.assert_not_called()
+    get_system_resolver_mock.assert_not_called()
+
+
+@mock.patch('dnsq.supports_zone_transfer', return_value=True)
+@mock.patch('dnsq.create_resolver')
+def test_when_domain_and_nameserver_are_missing_they_should_default_to_the_system_resolver(create_resolver_mock, supports_zone_transfer_mock):
+    create_resolver_mock.return_value.search = ['example.com']
+    create_resolver_mock.return_value.nameservers = ['1.0.0.1']
+
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--supports-axfr'])
+
+    assert str(exp.value) == '0'
     create_resolver_mock.assert_called_once_with()
+    supports_zone_transfer_mock.assert_called_once_with(domain='example.com', nameserver='1.0.0.1', lifetime=20.0)
 
 
 @mock.patch('dnsq.LOGGER.setLevel', side_effect=Exception('called dns.LOGGER.setLevel'))
@@ -304,26 +338,450 @@ def test_when_type_soa_records_option_is_present_it_should_exit_0(soa_records_mo
 
 
 @mock.patch('dnsq.zone_transfer', side_effect=Exception('called dnsq.zone_transfer'))
-@mock.patch('dnsq.supports_zone_transfer')
-def test_when_type_axfr_is_present(supports_zone_transfer_mock, zone_transfer_mock):
+def test_when_type_axfr_is_present(zone_transfer_mock):
     with pytest.raises(Exception) as exp:
         dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
 
     assert 'called dnsq.zone_transfer' in str(exp.value)
 
 
-@mock.patch('dnsq.supports_zone_transfer', return_value=False)
-def test_when_type_axfr_is_present_and_supports_zone_tranfer_returns_False_it_should_exit_1(supports_zone_transfer_mock):
+@mock.patch('dnsq.zone_transfer', side_effect=dns.exception.FormError)
+def test_when_type_axfr_is_present_and_the_zone_transfer_is_refused_it_should_exit_1(zone_transfer_mock):
     with pytest.raises(SystemExit) as exp:
         dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
 
     assert str(exp.value) == '1'
 
 
-@mock.patch('dnsq.zone_transfer', return_value=['foo1', 'foo2'])
-@mock.patch('dnsq.supports_zone_transfer', return_value=True)
-def test_when_type_axfr_is_present_and_supports_zone_tranfer_returns_True_it_should_exit_0(supports_zone_transfer_mock, zone_transfer_mock):
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1'), dnsq.Record.from_text('foo2 7200 IN A 192.168.1.2')])
+def test_when_type_axfr_is_present_and_the_zone_transfer_succeeds_it_should_exit_0(zone_transfer_mock):
     with pytest.raises(SystemExit) as exp:
         dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
 
     assert str(exp.value) == '0'
+
+
+@mock.patch('dnsq.supports_zone_transfer')
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1'), dnsq.Record.from_text('foo2 7200 IN A 192.168.1.2')])
+def test_when_type_axfr_is_present_it_should_transfer_the_zone_only_once(zone_transfer_mock, supports_zone_transfer_mock):
+    with pytest.raises(SystemExit):
+        dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    zone_transfer_mock.assert_called_once_with(domain='example.com', nameserver='1.0.0.1', timeout=10.0, lifetime=20.0, sort=False)
+    supports_zone_transfer_mock.assert_not_called()
+
+
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1'), dnsq.Record.from_text('foo2 7200 IN A 192.168.1.2')])
+def test_when_type_axfr_is_present_with_sort_by_hostname_it_should_sort_the_zone_transfer(zone_transfer_mock):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1', '--sort-by', 'hostname'])
+
+    assert str(exp.value) == '0'
+    zone_transfer_mock.assert_called_once_with(domain='example.com', nameserver='1.0.0.1', timeout=10.0, lifetime=20.0, sort=True)
+
+
+@pytest.mark.parametrize(
+    'fmt, expected_out',
+    [
+        pytest.param('text', 'foo1 7200 IN A 192.168.1.1\ntxt-01 300 IN TXT "a, b"\n', id='text'),
+        pytest.param('csv', 'name,ttl,class,type,rdata\nfoo1,7200,IN,A,192.168.1.1\ntxt-01,300,IN,TXT,"""a, b"""\n', id='csv'),
+        pytest.param('ndjson', ('{"name": "foo1", "ttl": 7200, "class": "IN", "type": "A", "rdata": "192.168.1.1"}\n'
+                                '{"name": "txt-01", "ttl": 300, "class": "IN", "type": "TXT", "rdata": "\\"a, b\\""}\n'), id='ndjson'),
+    ]
+)
+def test_when_type_axfr_is_present_with_a_format_it_should_write_the_records_in_it(fmt, expected_out, capsys):
+    records = [dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1'), dnsq.Record.from_text('txt-01 300 IN TXT "a, b"')]
+
+    with mock.patch('dnsq.zone_transfer', return_value=records):
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1', '--format', fmt])
+
+    assert str(exp.value) == '0'
+    assert capsys.readouterr()[0] == expected_out
+
+
+def test_when_output_option_is_present_it_should_write_the_records_to_the_file(tmpdir, capsys):
+    path = tmpdir.join('zone.txt')
+    records = [dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1'), dnsq.Record.from_text('foo2 7200 IN A 192.168.1.2')]
+
+    with mock.patch('dnsq.zone_transfer', return_value=records):
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1', '--output', str(path)])
+
+    assert str(exp.value) == '0'
+    assert path.read_binary() == b'foo1 7200 IN A 192.168.1.1\nfoo2 7200 IN A 192.168.1.2\n'
+    assert capsys.readouterr()[0] == ''
+
+
+def test_when_metrics_file_option_is_present_it_should_write_the_metrics_of_the_run_to_the_file(tmpdir, capsys):
+    path = tmpdir.join('dnsq.prom')
+
+    def zone_transfer(domain, nameserver, *args, **kwargs):
+        dnsq.metrics.start('zone_transfer', nameserver).finish()
+        return [dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1')]
+
+    with mock.patch('dnsq.zone_transfer', side_effect=zone_transfer):
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1', '--metrics-file', str(path)])
+
+    assert str(exp.value) == '0'
+    assert 'dnsq_operation_duration_seconds_count{operation="zone_transfer",nameserver="1.0.0.1"} 1' in path.read_text('utf-8').splitlines()
+    assert dnsq.metrics.COLLECTORS == []
+
+
+@mock.patch('dnsq.ns_records', return_value=['ns1.example.com.', 'ns2.example.com.'])
+def test_when_type_ns_is_present_it_should_write_every_nameserver_on_one_line(ns_records_mock, capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--type', 'ns', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    assert str(exp.value) == '0'
+    assert capsys.readouterr()[0] == 'ns1.example.com. ns2.example.com.\n'
+
+
+@mock.patch('dnsq.soa_records', return_value=[['ns1.example.com.', 'root.example.com.', '2018070500', '28800', '3600', '604800', '86400']])
+def test_when_type_soa_is_present_with_format_json_it_should_write_the_numbers_as_numbers(soa_records_mock, capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--type', 'soa', '--domain', 'example.com', '--nameserver', '1.0.0.1', '--format', 'json'])
+
+    assert str(exp.value) == '0'
+    assert json.loads(capsys.readouterr()[0]) == [dict(domain='example.com', mname='ns1.example.com.', rname='root.example.com.', serial=2018070500,
+                                                       refresh=28800, retry=3600, expire=604800, minimum=86400)]
+
+
+@mock.patch('dnsq.ns_records', return_value=['ns1.example.com.', 'ns2.example.com.'])
+def test_when_type_ns_is_present_with_format_csv_it_should_write_a_row_per_nameserver(ns_records_mock, capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--type', 'ns', '--domain', 'example.com', '--nameserver', '1.0.0.1', '--format', 'csv'])
+
+    assert str(exp.value) == '0'
+    assert capsys.readouterr()[0] == 'domain,nameserver\nexample.com,ns1.example.com.\nexample.com,ns2.example.com.\n'
+
+
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1')])
+def test_when_snapshot_dir_option_is_present_it_should_be_passed_to_the_zone_transfer(zone_transfer_mock, tmpdir):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--type', 'axfr', '--domain', 'example.com', '--nameserver', '1.0.0.1', '--snapshot-dir', str(tmpdir)])
+
+    assert str(exp.value) == '0'
+    zone_transfer_mock.assert_called_once_with(domain='example.com', nameserver='1.0.0.1', timeout=10.0, lifetime=20.0, sort=False,
+                                               snapshot_dir=str(tmpdir))
+
+
+def fake_zone_transfers(zones):
+    """A side_effect for a `dnsq.zone_transfer` mock that sends zones[nameserver]"""
+    def zone_transfer(domain, nameserver, *args, **kwargs):
+        if isinstance(zones[nameserver], Exception):
+            raise zones[nameserver]
+        return iter(zones[nameserver])
+    return zone_transfer
+
+
+@pytest.mark.parametrize(
+    'zones, expected_out, rc',
+    [
+        pytest.param({'1.0.0.1': ['foo1 7200 IN A 192.168.1.1'], '1.0.0.2': ['foo1 7200 IN A 192.168.1.1']}, '', 0, id='in sync'),
+        pytest.param({'1.0.0.1': ['foo1 7200 IN A 192.168.1.1', 'foo2 7200 IN A 192.168.1.2'], '1.0.0.2': ['foo1 7200 IN A 192.168.1.1']},
+                     '1.0.0.2 missing foo2 7200 IN A 192.168.1.2\n', 1, id='a record is missing'),
+    ]
+)
+def test_when_diff_option_is_present_it_should_print_the_missing_records(zones, expected_out, rc, capsys):
+    zones = dict((nameserver, [dnsq.Record.from_text(x) for x in records]) for nameserver, records in zones.items())
+
+    with mock.patch('dnsq.zone_transfer', side_effect=fake_zone_transfers(zones)):
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--domain', 'example.com', '--nameserver', '1.0.0.1', '--diff', '1.0.0.2'])
+
+    assert str(exp.value) == str(rc)
+    assert capsys.readouterr()[0] == expected_out
+
+
+@pytest.mark.parametrize(
+    'argv',
+    [
+        pytest.param(['--diff', '1.0.0.1'], id='the nameserver'),
+        pytest.param(['--diff', '1.0.0.1', '--diff', '1.0.0.1'], id='repeated'),
+    ]
+)
+def test_when_diff_option_has_no_other_nameserver_it_should_exit_2_with_a_usage_error(argv, capsys):
+    with mock.patch('dnsq.zone_transfer') as zone_transfer_mock:
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--domain', 'example.com', '--nameserver', '1.0.0.1'] + argv)
+
+    assert str(exp.value) == '2'
+    assert '--diff requires a NAMESERVER other than --nameserver 1.0.0.1' in capsys.readouterr()[1]
+    assert zone_transfer_mock.call_count == 0
+
+
+def test_when_diff_option_is_present_and_a_zone_transfer_fails_it_should_exit_2(capsys):
+    zones = {'1.0.0.1': [dnsq.Record.from_text('foo1 7200 IN A 192.168.1.1')], '1.0.0.2': dns.exception.FormError('refused')}
+
+    with mock.patch('dnsq.zone_transfer', side_effect=fake_zone_transfers(zones)):
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--domain', 'example.com', '--nameserver', '1.0.0.1', '--diff', '1.0.0.2'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '2'
+    assert out == '1.0.0.2 missing foo1 7200 IN A 192.168.1.1\n'
+    assert 'via nameserver: "1.0.0.2" failed' in err
+
+
+@pytest.mark.parametrize(
+    'argv, expected_out',
+    [
+        pytest.param([], '192.168.1.22 mismatch dc-app-03.example.com. dc-app-99.example.com.\n192.168.1.30 missing-a - removed.example.com.\n',
+                     id='text'),
+        pytest.param(['--format', 'ndjson'],
+                     ('{"address": "192.168.1.22", "problem": "mismatch", "names": ["dc-app-03.example.com."], "ptrs": ["dc-app-99.example.com."]}\n'
+                      '{"address": "192.168.1.30", "problem": "missing-a", "names": [], "ptrs": ["removed.example.com."]}\n'),
+                     id='ndjson'),
+    ]
+)
+def test_when_check_ptr_option_is_present_it_should_print_a_line_per_problem(argv, expected_out, capsys):
+    problems = [
+        dnsq.consistency.Problem('mismatch', 4, 0xc0a80116, ('dc-app-03.example.com.',), ('dc-app-99.example.com.',)),
+        dnsq.consistency.Problem('missing-a', 4, 0xc0a8011e, (), ('removed.example.com.',)),
+    ]
+    report = dnsq.consistency.ConsistencyReport('example.com', ['1.168.192.in-addr.arpa'], problems, {}, {})
+
+    with mock.patch('dnsq.consistency.check_ptr_consistency', return_value=report) as check_mock:
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=argv + ['--domain', 'example.com', '--nameserver', '1.0.0.1', '--check-ptr', '1.168.192.in-addr.arpa'])
+
+    assert str(exp.value) == '1'
+    assert capsys.readouterr()[0] == expected_out
+    assert check_mock.call_args[0] == ('example.com', ['1.168.192.in-addr.arpa'], '1.0.0.1')
+
+
+def test_when_check_ptr_option_is_present_and_a_zone_transfer_fails_it_should_exit_2(capsys):
+    report = dnsq.consistency.ConsistencyReport('example.com', ['1.168.192.in-addr.arpa'], [], {},
+                                                {'1.168.192.in-addr.arpa': dns.exception.FormError('refused')})
+
+    with mock.patch('dnsq.consistency.check_ptr_consistency', return_value=report):
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--domain', 'example.com', '--nameserver', '1.0.0.1', '--check-ptr', '1.168.192.in-addr.arpa'])
+
+    assert str(exp.value) == '2'
+    assert 'The zone transfer for domain: "1.168.192.in-addr.arpa" via nameserver: "1.0.0.1" failed' in capsys.readouterr()[1]
+
+
+def test_when_check_ptr_option_is_not_a_reverse_zone_it_should_exit_2(capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--domain', 'example.com', '--nameserver', '1.0.0.1', '--check-ptr', 'example.com'])
+
+    assert str(exp.value) == '2'
+    assert 'Expected a reverse zone under in-addr.arpa or ip6.arpa' in capsys.readouterr()[1]
+
+
+@pytest.mark.parametrize(
+    'serials, expected_out, rc',
+    [
+        pytest.param([2018070500, 2018070500], ['ns1.example.com. 1.0.0.1 2018070500 12.5 ok', 'ns2.example.com. 1.0.0.2 2018070500 12.5 ok'], 0,
+                     id='in sync'),
+        pytest.param([2018070500, 2018070499], ['ns1.example.com. 1.0.0.1 2018070500 12.5 ok', 'ns2.example.com. 1.0.0.2 2018070499 12.5 behind'], 1,
+                     id='a nameserver is behind'),
+    ]
+)
+def test_when_check_serials_option_is_present_it_should_print_a_line_per_nameserver(serials, expected_out, rc, capsys):
+    servers = [dnsq.serial.ServerSerial('ns{}.example.com.'.format(i), '1.0.0.{}'.format(i), serial, 0.0125, None)
+               for i, serial in enumerate(serials, 1)]
+    report = dnsq.serial.SerialReport('example.com', servers)
+
+    with mock.patch('dnsq.serial.check_serials', return_value=report) as check_serials_mock:
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--check-serials', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    assert str(exp.value) == str(rc)
+    assert capsys.readouterr()[0].splitlines() == expected_out
+    assert check_serials_mock.call_args[0][0] == 'example.com'
+
+
+@mock.patch('dnsq.supports_zone_transfer')
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('dc-app-01 7200 IN A 192.168.1.20')])
+def test_when_query_option_is_present_it_should_transfer_the_zone_only_once(zone_transfer_mock, supports_zone_transfer_mock):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--query', r'192\.168\.1', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    assert str(exp.value) == '0'
+    zone_transfer_mock.assert_called_once_with(domain='example.com', nameserver='1.0.0.1', timeout=10.0, lifetime=20.0)
+    supports_zone_transfer_mock.assert_not_called()
+
+
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('txt-01 300 IN TXT "v=spf1 include:foo -all"'),
+                                                dnsq.Record.from_text('dc-app-01 7200 IN A 192.168.1.20')])
+def test_when_query_option_matches_several_fields_of_a_record_it_should_be_printed_once(zone_transfer_mock, capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--query', 'txt|spf1 include', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '0'
+    assert out == 'txt-01 TXT "v=spf1 include:foo -all"\n'
+
+
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('dc-app-01 7200 IN A 192.168.1.20'),
+                                                dnsq.Record.from_text('dc-app-02 7200 IN A 192.168.10.21'),
+                                                dnsq.Record.from_text('ns1 7200 IN A 192.168.1.10')])
+def test_when_where_options_are_present_it_should_print_the_records_matching_all_of_them(zone_transfer_mock, capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--where', 'rdata in 192.168.1.0/24', '--where', 'name^=dc-', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '0'
+    assert out == 'dc-app-01 A 192.168.1.20\n'
+
+
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('dc-app-01 7200 IN A 192.168.1.20'),
+                                                dnsq.Record.from_text('dc-app-02 7200 IN A 192.168.10.21'),
+                                                dnsq.Record.from_text('dc-app-03 7200 IN AAAA fd00::21'),
+                                                dnsq.Record.from_text('ns1 7200 IN A 192.168.2.10')])
+def test_when_cidr_options_are_present_it_should_print_the_records_in_any_of_the_networks(zone_transfer_mock, capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--cidr', '192.168.1.0/24', '--cidr', 'fd00::/64', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '0'
+    assert out == 'dc-app-01 A 192.168.1.20\ndc-app-03 AAAA fd00::21\n'
+
+
+@mock.patch('dnsq.zone_transfer', return_value=[dnsq.Record.from_text('dc-app-01 7200 IN A 192.168.1.20'),
+                                                dnsq.Record.from_text('dc-app-03 7200 IN AAAA fd00::21'),
+                                                dnsq.Record.from_text('ns1 7200 IN A 192.168.10.1'),
+                                                dnsq.Record.from_text('ns2 7200 IN A 192.168.2.1')])
+def test_when_sort_by_ip_is_present_it_should_sort_the_records_by_address(zone_transfer_mock, capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--query', '.', '--sort-by', 'ip', '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '0'
+    assert out == '192.168.1.20 A dc-app-01\n192.168.2.1 A ns2\n192.168.10.1 A ns1\nfd00::21 AAAA dc-app-03\n'
+
+
+def test_when_cidr_option_is_invalid_it_should_exit_2(capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--cidr', '192.168.1.0/33'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '2'
+    assert 'Expected a prefix length between 0 and 32' in err
+
+
+def test_when_where_option_is_invalid_it_should_exit_2(capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--where', 'type in 192.168.1.0/24'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '2'
+    assert 'Expected "in" to be used on rdata only' in err
+
+
+@pytest.mark.parametrize(
+    'argv, expected_out',
+    [
+        pytest.param(['--type', 'ns'],
+                     'foo-domain.com\tNS\tok\tns1.foo-domain.com.\nfoo-domain.com\tNS\tok\tns2.foo-domain.com.\nmissing-domain.com\tNS\tNXDOMAIN\t\n',
+                     id='ns tsv'),
+        pytest.param(['--type', 'ns', '--format', 'ndjson', '--preserve-order'],
+                     ('{"domain": "foo-domain.com", "type": "NS", "status": "ok", "records": ["ns1.foo-domain.com.", "ns2.foo-domain.com."]}\n'
+                      '{"domain": "missing-domain.com", "type": "NS", "status": "NXDOMAIN", "records": []}\n'),
+                     id='ns ndjson'),
+    ]
+)
+def test_when_domains_from_option_is_present_it_should_print_the_records_of_every_domain(argv, expected_out, tmpdir, capsys):
+    domains = tmpdir.join('domains.txt')
+    domains.write('# domains\nfoo-domain.com\n\nmissing-domain.com\n')
+    results = [
+        ('foo-domain.com', ['ns1.foo-domain.com.', 'ns2.foo-domain.com.'], None),
+        ('missing-domain.com', [], dns.resolver.NXDOMAIN()),
+    ]
+
+    with mock.patch('dnsq.lookup_records', return_value=results) as lookup_records_mock:
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=argv + ['--domains-from', str(domains), '--nameserver', '1.0.0.1', '--workers', '8'])
+
+    assert str(exp.value) == '0'
+    assert capsys.readouterr()[0] == expected_out
+    args, kwargs = lookup_records_mock.call_args
+    assert [x for x in args[1]] == ['foo-domain.com', 'missing-domain.com']
+    assert kwargs == dict(rdtype='NS', workers=8, ordered='--preserve-order' in argv)
+
+
+def test_when_domains_from_option_is_present_it_should_print_soa_records_as_one_field(tmpdir, capsys):
+    domains = tmpdir.join('domains.txt')
+    domains.write('foo-domain.com\n')
+    results = [('foo-domain.com', [['ns1.foo-domain.com.', 'root.foo-domain.com.', '2018070500', '28800', '3600', '604800', '86400']], None)]
+
+    with mock.patch('dnsq.lookup_records', return_value=results):
+        with pytest.raises(SystemExit):
+            dnsq.cli.execute(argv=['--type', 'soa', '--domains-from', str(domains), '--nameserver', '1.0.0.1'])
+
+    assert capsys.readouterr()[0] == 'foo-domain.com\tSOA\tok\tns1.foo-domain.com. root.foo-domain.com. 2018070500 28800 3600 604800 86400\n'
+
+
+def test_when_domains_from_option_is_present_without_type_ns_or_soa_it_should_exit_2(tmpdir, capsys):
+    domains = tmpdir.join('domains.txt')
+    domains.write('foo-domain.com\n')
+
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--domains-from', str(domains), '--domain', 'example.com', '--nameserver', '1.0.0.1'])
+
+    assert str(exp.value) == '2'
+    assert '--domains-from requires --type ns or --type soa' in capsys.readouterr()[1]
+
+
+def test_when_ptr_option_is_present_it_should_print_a_line_per_ptr(tmpdir, capsys):
+    addresses = tmpdir.join('addresses.txt')
+    addresses.write('# addresses\n10.0.0.0/31\n')
+    results = [
+        ('192.168.1.20', ['dc-app-01.foo-domain.com.', 'app-01.foo-domain.com.'], None),
+        ('10.0.0.0', [], dns.resolver.NXDOMAIN()),
+        ('10.0.0.1', ['gw.foo-domain.com.'], None),
+    ]
+
+    with mock.patch('dnsq.reverse.lookup_ptrs', return_value=results) as lookup_ptrs_mock:
+        with pytest.raises(SystemExit) as exp:
+            dnsq.cli.execute(argv=['--ptr', '192.168.1.20', '--ptr-from', str(addresses), '--nameserver', '1.0.0.1', '--workers', '256'])
+
+    assert str(exp.value) == '0'
+    assert capsys.readouterr()[0] == ('192.168.1.20 ok dc-app-01.foo-domain.com.\n'
+                                      '192.168.1.20 ok app-01.foo-domain.com.\n'
+                                      '10.0.0.0 NXDOMAIN \n'
+                                      '10.0.0.1 ok gw.foo-domain.com.\n')
+    args, kwargs = lookup_ptrs_mock.call_args
+    assert [x for x in args[1]] == ['192.168.1.20', '10.0.0.0/31']
+    assert kwargs == dict(workers=256, ordered=False)
+
+
+def test_when_ptr_option_is_invalid_it_should_exit_2(capsys):
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--ptr', '192.168.1.0/33', '--nameserver', '1.0.0.1'])
+
+    assert str(exp.value) == '2'
+    assert '--ptr' in capsys.readouterr()[1]
+
+
+@mock.patch('dnsq.scan_zone_transfers')
+def test_when_scan_axfr_option_is_present_it_should_print_a_line_per_pair(scan_zone_transfers_mock, tmpdir, capsys):
+    pairs = tmpdir.join('pairs.txt')
+    pairs.write('# domain nameserver\nfoo-domain.com 1.0.0.1\n\nbar-domain.com 1.0.0.2\n')
+    scan_zone_transfers_mock.return_value = [
+        mock.Mock(domain='bar-domain.com', nameserver='1.0.0.2', status='refused'),
+        mock.Mock(domain='foo-domain.com', nameserver='1.0.0.1', status='supported'),
+    ]
+
+    with pytest.raises(SystemExit) as exp:
+        dnsq.cli.execute(argv=['--scan-axfr', str(pairs), '--workers', '8'])
+
+    out, err = capsys.readouterr()
+    assert str(exp.value) == '0'
+    assert out == 'bar-domain.com 1.0.0.2 refused\nfoo-domain.com 1.0.0.1 supported\n'
+
+    args, kwargs = scan_zone_transfers_mock.call_args
+    assert [x for x in args[0]] == [('foo-domain.com', '1.0.0.1'), ('bar-domain.com', '1.0.0.2')]
+    assert kwargs == dict(workers=8, lifetime=20.0)
+
+
+def test_read_pairs_skips_the_lines_without_a_nameserver(caplog):
+    fd = io.StringIO('foo-domain.com 1.0.0.1\nbar-domain.com\n\nbaz-domain.com 1.0.0.2 extra\n')
+
+    assert list(dnsq.cli.read_pairs(fd)) == [('foo-domain.com', '1.0.0.1'), ('baz-domain.com', '1.0.0.2')]
+    assert 'Skipping line 2' in caplog.text
+    assert "'bar-domain.com'" in caplog.text
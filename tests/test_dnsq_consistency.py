@@ -0,0 +1,107 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from tests import dnsserver
+
+import dns.name
+import dnsq
+import dnsq.consistency
+import mock
+import pytest
+
+DOMAIN = 'foo-domain.com'
+REVERSE_DOMAIN = '1.168.192.in-addr.arpa'
+ORIGIN = dns.name.from_text(DOMAIN)
+REVERSE_ORIGIN = dns.name.from_text(REVERSE_DOMAIN)
+
+FORWARD = [dnsq.Record.from_text(x, ORIGIN) for x in [
+    '@ 7200 IN SOA ns1 root 2018070500 28800 3600 604800 38400',
+    'dc-app-01 7200 IN A 192.168.1.20',
+    'DC-App-02 7200 IN A 192.168.1.21',
+    'dc-app-03 7200 IN A 192.168.1.22',
+    'dc-app-04 7200 IN A 192.168.1.23',
+    'moved 7200 IN A 192.168.1.99',
+    'www 7200 IN CNAME dc-app-01',
+    'public 7200 IN A 8.8.8.8',
+]]
+REVERSE = [dnsq.Record.from_text(x, REVERSE_ORIGIN) for x in [
+    '@ 7200 IN SOA ns1.foo-domain.com. root.foo-domain.com. 2018070500 28800 3600 604800 38400',
+    '20 7200 IN PTR dc-app-01.foo-domain.com.',
+    '21 7200 IN PTR dc-app-02.foo-domain.com.',
+    '22 7200 IN PTR dc-app-99.foo-domain.com.',
+    '30 7200 IN PTR removed.foo-domain.com.',
+    '31 7200 IN PTR moved.foo-domain.com.',
+    '40 7200 IN PTR host.bar-domain.com.',
+    '0/25 7200 IN NS ns1.foo-domain.com.',
+]]
+
+
+def check(forward, reverse):
+    zones = {DOMAIN: forward, REVERSE_DOMAIN: reverse}
+
+    def zone_transfer(domain, nameserver, *args, **kwargs):
+        records = zones[domain]
+        if isinstance(records, Exception):
+            raise records
+        return iter(records)
+
+    with mock.patch('dnsq.zone_transfer', side_effect=zone_transfer) as zone_transfer_mock:
+        report = dnsq.consistency.check_ptr_consistency(DOMAIN, [REVERSE_DOMAIN], '1.0.0.1')
+
+    assert sorted(x[0][0] for x in zone_transfer_mock.call_args_list) == [REVERSE_DOMAIN, DOMAIN]
+    return report
+
+
+def test_check_ptr_consistency_reports_every_problem_once():
+    report = check(FORWARD, REVERSE)
+
+    assert report.consistent is False
+    assert [(x.address_text, x.problem, x.names, x.ptrs) for x in report] == [
+        ('192.168.1.22', 'mismatch', ('dc-app-03.foo-domain.com.',), ('dc-app-99.foo-domain.com.',)),
+        ('192.168.1.23', 'missing-ptr', ('dc-app-04.foo-domain.com.',), ()),
+        ('192.168.1.30', 'missing-a', (), ('removed.foo-domain.com.',)),
+        ('192.168.1.31', 'mismatch', (), ('moved.foo-domain.com.',)),
+        ('192.168.1.99', 'missing-ptr', ('moved.foo-domain.com.',), ()),
+    ]
+    assert report.counts == {DOMAIN: 8, REVERSE_DOMAIN: 8}
+    assert report.errors == {}
+
+
+def test_check_ptr_consistency_when_the_zones_agree():
+    report = check(FORWARD[:3], REVERSE[:3])
+
+    assert report.consistent is True
+    assert len(report) == 0
+
+
+def test_check_ptr_consistency_reports_the_zone_transfer_that_failed():
+    error = dnsq.ZONE_TRANSFER_ERRORS[0]()
+    report = check(FORWARD, error)
+
+    assert report.consistent is False
+    assert report.errors == {REVERSE_DOMAIN: error}
+    assert report.problems == []
+
+
+def test_check_ptr_consistency_will_raise_AssertionError_for_a_zone_that_is_not_a_reverse_zone():
+    with pytest.raises(AssertionError) as exp:
+        dnsq.consistency.check_ptr_consistency(DOMAIN, ['bar-domain.com'], '1.0.0.1')
+
+    assert 'Expected a reverse zone under in-addr.arpa or ip6.arpa, got bar-domain.com' in str(exp.value)
+
+
+def test_check_ptr_consistency_transfers_the_zones_from_the_nameservers():
+    records = list(dnsserver.synthetic_zone(1000))
+    reverse = list(dnsserver.synthetic_reverse_zone(records, '10.in-addr.arpa.'))
+    # a PTR record that went missing and one that points at another host
+    reverse = reverse[:10] + [reverse[11]._replace(rdata=reverse[12].rdata)] + reverse[12:]
+
+    with dnsserver.AXFRServer(records) as forward_server:
+        with dnsserver.AXFRServer(reverse, origin='10.in-addr.arpa.', host='127.0.0.2', port=forward_server.port):
+            report = dnsq.consistency.check_ptr_consistency(dnsserver.DEFAULT_ORIGIN, ['10.in-addr.arpa'], '127.0.0.1', '127.0.0.2',
+                                                            port=forward_server.port)
+
+    assert report.errors == {}
+    assert report.counts == {dnsserver.DEFAULT_ORIGIN: 1000, '10.in-addr.arpa': len(reverse)}
+    assert [x.problem for x in report] == ['missing-ptr', 'mismatch']
@@ -0,0 +1,75 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from tests import dnsserver
+
+import dns.name
+import dnsq
+import dnsq.diff
+import pytest
+
+RECORDS = list(dnsserver.synthetic_zone(100))
+
+
+def diff_servers(*servers):
+    """Diff the zone of servers, each one is told apart by its address in 127.0.0.0/8 and all share a port"""
+    return dnsq.diff.diff_zone_transfers(dnsserver.DEFAULT_ORIGIN, [x.host for x in servers], port=servers[0].port)
+
+
+def serve(records, host, port=0):
+    return dnsserver.AXFRServer(records, host=host, port=port)
+
+
+def test_diff_zone_transfers_when_the_zones_are_the_same():
+    with serve(RECORDS, '127.0.0.1') as primary, serve(RECORDS, '127.0.0.2', primary.port) as secondary:
+        diff = diff_servers(primary, secondary)
+
+    assert diff.in_sync is True
+    assert len(diff) == 0
+    assert diff.counts == {'127.0.0.1': 100, '127.0.0.2': 100}
+    assert diff.errors == {}
+
+
+def test_diff_zone_transfers_reports_the_missing_records_and_who_is_missing_them():
+    changed = RECORDS[:10] + [RECORDS[10]._replace(ttl=60)] + RECORDS[12:] + [dnsq.Record.from_text('new-host 300 IN A 10.9.9.1')]
+
+    with serve(RECORDS, '127.0.0.1') as primary, serve(changed, '127.0.0.2', primary.port) as secondary:
+        diff = diff_servers(primary, secondary)
+
+    assert diff.in_sync is False
+    actual = set((record.to_text(), missing) for record, missing in diff)
+    assert actual == set([
+        (RECORDS[10].to_text(), ('127.0.0.2',)),
+        (RECORDS[10]._replace(ttl=60).to_text(), ('127.0.0.1',)),
+        (RECORDS[11].to_text(), ('127.0.0.2',)),
+        ('new-host 300 IN A 10.9.9.1', ('127.0.0.1',)),
+    ])
+
+
+def test_diff_zone_transfers_ignores_the_case_of_names():
+    changed = [x._replace(name=dns.name.from_text(x.name.to_text().upper(), None)) for x in RECORDS]
+
+    with serve(RECORDS, '127.0.0.1') as primary, serve(changed, '127.0.0.2', primary.port) as secondary:
+        diff = diff_servers(primary, secondary)
+
+    assert diff.in_sync is True
+
+
+def test_diff_zone_transfers_keeps_going_when_a_zone_transfer_fails():
+    with serve(RECORDS, '127.0.0.1') as primary, serve(RECORDS[:10], '127.0.0.2', primary.port) as secondary:
+        secondary.messages = []
+        diff = diff_servers(primary, secondary)
+
+    assert diff.in_sync is False
+    assert list(diff.errors) == ['127.0.0.2']
+    assert isinstance(diff.errors['127.0.0.2'], dnsq.ZONE_TRANSFER_ERRORS)
+    assert diff.counts == {'127.0.0.1': 100, '127.0.0.2': 0}
+    assert len(diff) == 100
+
+
+def test_diff_zone_transfers_will_raise_AssertionError_with_less_than_two_nameservers():
+    with pytest.raises(AssertionError) as exp:
+        dnsq.diff.diff_zone_transfers(dnsserver.DEFAULT_ORIGIN, ['127.0.0.1', '127.0.0.1'])
+
+    assert 'Expected at least two nameservers' in str(exp.value)
@@ -0,0 +1,126 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from dnsq.index import Predicate
+from dnsq.index import ZoneIndex
+
+import dnsq
+import dnsq.index
+import dnsq.network
+import mock
+import pytest
+
+ZONE = [
+    '@ 7200 IN SOA ns1 root 2018070500 28800 3600 604800 38400',
+    '@ 7200 IN NS ns1',
+    'aa-foo-01 7200 IN A 192.168.1.22',
+    'app-01 7200 IN CNAME dc-app-01',
+    'dc-app-01 7200 IN A 192.168.1.20',
+    'dc-app-02 7200 IN A 192.168.10.21',
+    'dc-app-03 7200 IN AAAA fd00::21',
+    'ns1 7200 IN A 192.168.1.10',
+    'txt-01 300 IN TXT "v=spf1 include:foo -all"',
+]
+
+
+@pytest.fixture
+def index():
+    return ZoneIndex(dnsq.Record.from_text(x) for x in ZONE)
+
+
+def hostnames(records):
+    return [x.hostname for x in records]
+
+
+@pytest.mark.parametrize(
+    'predicates, expected',
+    [
+        pytest.param([], ['@', '@', 'aa-foo-01', 'app-01', 'dc-app-01', 'dc-app-02', 'dc-app-03', 'ns1', 'txt-01'], id='everything'),
+        pytest.param([Predicate('name', 'exact', 'dc-app-01')], ['dc-app-01'], id='exact'),
+        pytest.param([Predicate('type', 'exact', 'A')], ['aa-foo-01', 'dc-app-01', 'dc-app-02', 'ns1'], id='exact type'),
+        pytest.param([Predicate('name', 'prefix', 'dc-app')], ['dc-app-01', 'dc-app-02', 'dc-app-03'], id='prefix'),
+        pytest.param([Predicate('rdata', 'cidr', '192.168.1.0/24')], ['aa-foo-01', 'dc-app-01', 'ns1'], id='cidr'),
+        pytest.param([Predicate('rdata', 'cidr', 'fd00::/64')], ['dc-app-03'], id='cidr ipv6'),
+        pytest.param([Predicate('rdata', 'cidr', '192.168.1.20')], ['dc-app-01'], id='cidr single address'),
+        pytest.param([Predicate('rdata', 'regex', r'^dc-app')], ['app-01'], id='regex'),
+        pytest.param([Predicate(dnsq.index.FIELDS, 'regex', 'dc-app-01')], ['app-01', 'dc-app-01'], id='regex any field once'),
+        pytest.param([Predicate('rdata', 'cidr', '192.168.0.0/16'), Predicate('name', 'prefix', 'dc-')], ['dc-app-01', 'dc-app-02'], id='and'),
+        pytest.param([Predicate('name', 'exact', 'nope')], [], id='no match'),
+    ]
+)
+def test_query(index, predicates, expected):
+    assert hostnames(index.query(*predicates)) == expected
+
+
+def test_query_only_indexes_the_fields_it_needs(index):
+    index.query(Predicate('type', 'exact', 'A'))
+
+    assert list(index._values) == ['type']
+    assert index._addresses is None
+
+
+@pytest.mark.parametrize(
+    'text, expected',
+    [
+        pytest.param('name=dc-app-01', Predicate(('name',), 'exact', 'dc-app-01')),
+        pytest.param('name ^= dc-app', Predicate(('name',), 'prefix', 'dc-app')),
+        pytest.param(r'name,rdata~192\.168\.1\.', Predicate(('name', 'rdata'), 'regex', r'192\.168\.1\.')),
+        pytest.param('rdata in 192.168.1.0/24', Predicate(('rdata',), 'cidr', '192.168.1.0/24')),
+    ]
+)
+def test_parse_predicate(text, expected):
+    assert dnsq.index.parse_predicate(text) == expected
+
+
+@pytest.mark.parametrize(
+    'text, expected',
+    [
+        pytest.param('dc-app-01', 'Expected "FIELD OPERATOR VALUE"'),
+        pytest.param('host=dc-app-01', 'Expected fields to be some of name, type, rdata, got host'),
+        pytest.param('name in 192.168.1.0/24', 'Expected "in" to be used on rdata only'),
+        pytest.param('rdata in 192.168.1.0/33', 'Expected a prefix length between 0 and 32'),
+        pytest.param('rdata~(', 'Expected a regular expression'),
+    ]
+)
+def test_parse_predicate_will_raise_ValueError(text, expected):
+    with pytest.raises(ValueError) as exp:
+        dnsq.index.parse_predicate(text)
+
+    assert expected in str(exp.value)
+
+
+def test_query_only_searches_the_candidates_of_the_other_predicates_with_a_regex(index):
+    searched = []
+
+    def rdata(record):
+        searched.append(record.hostname)
+        return record.rdata.to_text()
+
+    with mock.patch.dict(dnsq.index.FIELD_TEXT, rdata=rdata):
+        actual = index.query(Predicate('rdata', 'regex', r'\.20$'), Predicate('name', 'prefix', 'dc-app'))
+
+    assert hostnames(actual) == ['dc-app-01']
+    assert searched == ['dc-app-01', 'dc-app-02', 'dc-app-03']
+
+
+def test_query_cidr_with_many_networks_returns_each_record_once(index):
+    networks = dnsq.network.CIDRSet(['192.168.1.20/32', '192.168.1.0/24', 'fd00::/64', '10.0.0.0/8'])
+
+    actual = index.query(Predicate('rdata', 'cidr', networks))
+
+    assert hostnames(actual) == ['aa-foo-01', 'dc-app-01', 'dc-app-03', 'ns1']
+
+
+def test_query_cidr_matches_the_owner_name_of_PTR_records():
+    records = [dnsq.Record.from_text(x) for x in [
+        '@ 7200 IN SOA ns1.foo-domain.com. root.foo-domain.com. 2018070500 28800 3600 604800 38400',
+        '10 7200 IN PTR ns1.foo-domain.com.',
+        '20 7200 IN PTR dc-app-01.foo-domain.com.',
+    ]]
+    index = ZoneIndex(records, origin='1.168.192.in-addr.arpa')
+
+    actual = index.query(Predicate('rdata', 'cidr', '192.168.1.16/28'))
+
+    assert hostnames(actual) == ['20']
@@ -0,0 +1,116 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from tests import dnsserver
+
+import dns.exception
+import dns.rdatatype
+import dnsq
+import dnsq.ixfr
+import dnsq.snapshot
+import pytest
+
+SERIAL = 2018070500
+
+
+def texts(records):
+    return sorted(x.to_text() for x in records)
+
+
+def zone_at(serial, deleted=(), added=()):
+    """The synthetic zone of 10 records at serial, without the deleted and with the added records"""
+    records = list(dnsserver.synthetic_zone(10, serial=serial))
+    deleted = set(x.to_text() for x in deleted)
+    return [x for x in records if x.to_text() not in deleted] + list(added)
+
+
+# SERIAL + 1 deletes host-0000000, adds new-host-01 and changes the TTL of host-0000001
+# SERIAL + 2 deletes new-host-01 again and adds new-host-02
+ORIGINAL = zone_at(SERIAL)
+DELETED_1 = [ORIGINAL[2], ORIGINAL[3]]
+ADDED_1 = [dnsq.Record.from_text('new-host-01 300 IN A 10.9.9.1'), ORIGINAL[3]._replace(ttl=600)]
+DELETED_2 = [ADDED_1[0]]
+ADDED_2 = [dnsq.Record.from_text('new-host-02 300 IN A 10.9.9.2')]
+JOURNAL = [(SERIAL, DELETED_1, ADDED_1), (SERIAL + 1, DELETED_2, ADDED_2)]
+CURRENT = zone_at(SERIAL + 2, deleted=DELETED_1, added=[ADDED_1[1]] + ADDED_2)
+
+
+def incremental_zone_transfer(server, records, **kwargs):
+    return dnsq.ixfr.incremental_zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', records, port=server.port, **kwargs)
+
+
+def test_incremental_zone_transfer_applies_every_difference_sequence():
+    with dnsserver.AXFRServer(CURRENT, journal=JOURNAL) as server:
+        transfer = incremental_zone_transfer(server, ORIGINAL)
+
+    assert transfer.incremental is True
+    assert transfer.changed is True
+    assert (transfer.previous_serial, transfer.serial) == (SERIAL, SERIAL + 2)
+    assert [(x.serial, x.next_serial) for x in transfer.deltas] == [(SERIAL, SERIAL + 1), (SERIAL + 1, SERIAL + 2)]
+    assert transfer.records[0].rdtype == dns.rdatatype.SOA
+    assert texts(transfer.records) == texts(CURRENT)
+    # new-host-01 came and went, the TTL change is not a change of the records
+    assert texts(transfer.added) == texts(ADDED_2)
+    assert texts(transfer.deleted) == texts([ORIGINAL[2]])
+
+
+def test_incremental_zone_transfer_when_the_zone_is_up_to_date():
+    with dnsserver.AXFRServer(CURRENT, journal=JOURNAL) as server:
+        transfer = incremental_zone_transfer(server, CURRENT)
+
+    assert transfer.incremental is True
+    assert transfer.changed is False
+    assert transfer.serial == SERIAL + 2
+    assert texts(transfer.records) == texts(CURRENT)
+    assert (transfer.added, transfer.deleted, transfer.deltas) == ([], [], [])
+
+
+@pytest.mark.parametrize(
+    'journal, serial',
+    [
+        pytest.param(JOURNAL, SERIAL - 1, id='the journal does not go back far enough'),
+        pytest.param(None, SERIAL, id='the nameserver refuses IXFR'),
+    ]
+)
+def test_incremental_zone_transfer_falls_back_to_the_whole_zone(journal, serial):
+    with dnsserver.AXFRServer(CURRENT, journal=journal) as server:
+        transfer = incremental_zone_transfer(server, ORIGINAL, serial=serial)
+
+    assert transfer.incremental is False
+    assert transfer.previous_serial == serial
+    assert transfer.serial == SERIAL + 2
+    assert texts(transfer.records) == texts(CURRENT)
+    assert texts(transfer.added) == texts(ADDED_2)
+    assert texts(transfer.deleted) == texts([ORIGINAL[2]])
+
+
+def test_incremental_zone_transfer_will_raise_ValueError_without_a_serial():
+    with pytest.raises(ValueError) as exp:
+        dnsq.ixfr.incremental_zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', ORIGINAL[1:])
+
+    assert 'Expected the records of the zone to contain its SOA' in str(exp.value)
+
+
+def test_apply_ixfr_will_raise_dns_exception_FormError_when_a_difference_sequence_has_no_new_SOA():
+    soa = CURRENT[0]
+    answer = [soa, ORIGINAL[0], ORIGINAL[2], soa]
+
+    with pytest.raises(dns.exception.FormError) as exp:
+        dnsq.ixfr.apply_ixfr(ORIGINAL, answer)
+
+    assert 'has no new SOA' in str(exp.value)
+
+
+def test_zone_transfer_with_a_snapshot_dir_transfers_only_the_changes_of_a_changed_zone(tmpdir):
+    with dnsserver.AXFRServer(ORIGINAL) as server:
+        list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', port=server.port, snapshot_dir=str(tmpdir)))
+
+    # this server sends nothing for an AXFR, so the zone can only come from the snapshot and the IXFR
+    with dnsserver.AXFRServer(CURRENT, journal=JOURNAL) as server:
+        server.messages = []
+        actual = list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', port=server.port, snapshot_dir=str(tmpdir)))
+
+    assert texts(actual) == texts(CURRENT)
+    path = dnsq.snapshot.snapshot_path(str(tmpdir), dnsserver.DEFAULT_ORIGIN, '127.0.0.1')
+    assert dnsq.snapshot.Snapshot(path).serial == SERIAL + 2
@@ -0,0 +1,220 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from tests import dnsserver
+
+import dns.exception
+import dns.query
+import dnsq
+import dnsq.metrics
+import dnsq.serial
+import io
+import mock
+import os
+import pytest
+
+NAMESERVER = '127.0.0.1'
+
+
+@pytest.fixture
+def observations():
+    observations = []
+    dnsq.metrics.register(observations.append)
+    yield observations
+    dnsq.metrics.unregister(observations.append)
+
+
+def observation(operation='query', nameserver=NAMESERVER, seconds=0.02, bytes=100, messages=1, records=2, attempts=1, error=None):
+    return dnsq.metrics.Observation(operation, nameserver, seconds, bytes, messages, records, attempts, error)
+
+
+def test_start_returns_None_when_no_collector_is_registered():
+    assert dnsq.metrics.COLLECTORS == []
+    assert dnsq.metrics.start('query', NAMESERVER) is None
+
+
+def test_register_counts_sockets_until_the_last_collector_is_unregistered():
+    socket_factory = dns.query.socket_factory
+    first, second = [], []
+
+    dnsq.metrics.register(first.append)
+    dnsq.metrics.register(second.append)
+    assert dns.query.socket_factory is not socket_factory
+
+    dnsq.metrics.unregister(first.append)
+    assert dns.query.socket_factory is not socket_factory
+
+    dnsq.metrics.unregister(second.append)
+    assert dns.query.socket_factory is socket_factory
+    assert dnsq.metrics.COLLECTORS == []
+
+
+def test_observation_retries_and_timed_out():
+    assert observation(attempts=0).retries == 0
+    assert observation(attempts=3).retries == 2
+    assert observation(error=dns.exception.Timeout()).timed_out is True
+    assert observation(error=dns.exception.FormError()).timed_out is False
+
+
+def test_zone_transfer_is_measured(observations):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(1000), rrs_per_message=100) as server:
+        records = list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, port=server.port))
+
+    assert len(observations) == 1
+    actual = observations[0]
+    assert actual.operation == 'zone_transfer'
+    assert actual.nameserver == NAMESERVER
+    assert actual.messages == len(server.messages)
+    # the SOA opens and closes the transfer
+    assert actual.records == len(records) + 1
+    # every message is sent after its two byte length
+    assert actual.bytes == sum(len(x) + 2 for x in server.messages)
+    assert actual.attempts == 1
+    assert actual.error is None
+
+
+def test_sorted_zone_transfer_is_measured(observations):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(100), rrs_per_message=10) as server:
+        list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, sort=True, port=server.port))
+
+    assert [(x.operation, x.messages, x.error) for x in observations] == [('zone_transfer', len(server.messages), None)]
+
+
+def test_zone_transfer_stopped_early_is_measured_once(observations):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(1000), rrs_per_message=100) as server:
+        records = dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, port=server.port)
+        next(records)
+        records.close()
+
+    assert [(x.messages, x.error) for x in observations] == [(1, None)]
+
+
+def test_failed_zone_transfer_is_measured_with_its_error(observations):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(10)) as server:
+        server.messages = []
+        with pytest.raises(dnsq.ZONE_TRANSFER_ERRORS):
+            list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, port=server.port))
+
+    assert len(observations) == 1
+    assert observations[0].error is not None
+
+
+@pytest.mark.parametrize('sort', [False, True])
+@pytest.mark.parametrize('fails', [False, True])
+def test_zone_transfer_finishes_its_measurement_once(observations, sort, fails):
+    finish = dnsq.metrics.Measurement.finish
+    with mock.patch.object(dnsq.metrics.Measurement, 'finish', autospec=True, side_effect=finish) as finish_mock:
+        with dnsserver.AXFRServer(dnsserver.synthetic_zone(100), rrs_per_message=10) as server:
+            if fails:
+                server.messages = []
+                with pytest.raises(dnsq.ZONE_TRANSFER_ERRORS):
+                    list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, sort=sort, port=server.port))
+            else:
+                list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, sort=sort, port=server.port))
+
+    assert finish_mock.call_count == 1
+    assert [x.error is not None for x in observations] == [fails]
+
+
+def test_query_is_measured(observations):
+    with dnsserver.AuthoritativeServer([dnsserver.Zone(dnsserver.synthetic_zone(10))]) as server:
+        resolver = dnsq.create_resolver(nameservers=[NAMESERVER])
+        resolver.port = server.port
+        dnsq.query(resolver, 'host-0000001.' + dnsserver.DEFAULT_ORIGIN, 'A')
+
+    assert len(observations) == 1
+    actual = observations[0]
+    assert (actual.operation, actual.nameserver, actual.messages, actual.records, actual.attempts, actual.error) == (
+        'query', NAMESERVER, 1, 1, 1, None)
+    assert actual.bytes > 0
+
+
+def test_query_retried_over_tcp_counts_a_retry(observations):
+    records = list(dnsserver.synthetic_zone(2)) + [
+        dnsq.Record.from_text('big 300 IN TXT "{}"'.format('x' * 200 + str(i))) for i in range(20)
+    ]
+    with dnsserver.AuthoritativeServer([dnsserver.Zone(records)]) as server:
+        resolver = dnsq.create_resolver(nameservers=[NAMESERVER])
+        resolver.port = server.port
+        dnsq.query(resolver, 'big.' + dnsserver.DEFAULT_ORIGIN, 'TXT')
+
+    assert [(x.attempts, x.retries, x.records) for x in observations] == [(2, 1, 20)]
+
+
+def test_query_timeout_is_measured(observations):
+    zone = dnsserver.Zone(dnsserver.synthetic_zone(10))
+    with dnsserver.AuthoritativeServer([zone], unresponsive=[dnsserver.DEFAULT_ORIGIN]) as server:
+        resolver = dnsq.create_resolver(nameservers=[NAMESERVER], lifetime=0.2, timeout=0.2)
+        resolver.port = server.port
+        with pytest.raises(dns.exception.Timeout):
+            dnsq.query(resolver, dnsserver.DEFAULT_ORIGIN, 'SOA')
+
+    assert len(observations) == 1
+    assert observations[0].timed_out is True
+    assert observations[0].bytes == 0
+
+
+def test_probe_zone_transfer_and_query_serial_are_measured(observations):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(10)) as server:
+        dnsq.probe_zone_transfer(dnsserver.DEFAULT_ORIGIN, NAMESERVER, port=server.port)
+        dnsq.serial.query_serial(dnsserver.DEFAULT_ORIGIN, NAMESERVER, tcp=True, port=server.port)
+
+    assert [(x.operation, x.messages, x.attempts, x.error) for x in observations] == [
+        ('probe_zone_transfer', 1, 1, None),
+        ('query_serial', 1, 1, None),
+    ]
+
+
+def test_registry_aggregates_per_operation_and_nameserver():
+    registry = dnsq.metrics.MetricsRegistry(buckets=(0.01, 0.1))
+    registry(observation(seconds=0.005))
+    registry(observation(seconds=0.05, attempts=2, error=dns.exception.Timeout()))
+    registry(observation(operation='zone_transfer', seconds=5, messages=10, records=1000))
+
+    actual = registry.snapshot()
+
+    assert sorted(actual) == [('query', NAMESERVER), ('zone_transfer', NAMESERVER)]
+    query = actual[('query', NAMESERVER)]
+    assert (query['count'], query['bytes'], query['messages'], query['records'], query['retries'], query['timeouts']) == (2, 200, 2, 4, 1, 1)
+    assert query['errors'] == {'Timeout': 1}
+    assert query['buckets'] == [1, 1, 0]
+    assert actual[('zone_transfer', NAMESERVER)]['buckets'] == [0, 0, 1]
+
+
+def test_registry_to_prometheus():
+    registry = dnsq.metrics.MetricsRegistry(buckets=(0.01, 0.1))
+    registry(observation(seconds=0.005))
+    registry(observation(seconds=0.05, attempts=2, error=dns.exception.Timeout()))
+
+    lines = registry.to_prometheus().splitlines()
+
+    labels = 'operation="query",nameserver="127.0.0.1"'
+    assert '# TYPE dnsq_operation_duration_seconds histogram' in lines
+    assert 'dnsq_operation_duration_seconds_bucket{{{},le="0.01"}} 1'.format(labels) in lines
+    assert 'dnsq_operation_duration_seconds_bucket{{{},le="0.1"}} 2'.format(labels) in lines
+    assert 'dnsq_operation_duration_seconds_bucket{{{},le="+Inf"}} 2'.format(labels) in lines
+    assert 'dnsq_operation_duration_seconds_count{{{}}} 2'.format(labels) in lines
+    assert 'dnsq_bytes_total{{{}}} 200'.format(labels) in lines
+    assert 'dnsq_retries_total{{{}}} 1'.format(labels) in lines
+    assert 'dnsq_timeouts_total{{{}}} 1'.format(labels) in lines
+    assert 'dnsq_errors_total{{{},error="Timeout"}} 1'.format(labels) in lines
+
+
+def test_registry_to_prometheus_escapes_labels():
+    registry = dnsq.metrics.MetricsRegistry()
+    registry(observation(nameserver='a"b\\c'))
+
+    assert 'dnsq_bytes_total{operation="query",nameserver="a\\"b\\\\c"} 100' in registry.to_prometheus().splitlines()
+
+
+def test_registry_write_prometheus(tmpdir):
+    registry = dnsq.metrics.MetricsRegistry()
+    registry(observation())
+    path = str(tmpdir.join('dnsq.prom'))
+
+    registry.write_prometheus(path)
+
+    with io.open(path, encoding='utf-8') as fd:
+        assert fd.read() == registry.to_prometheus()
+    assert os.listdir(str(tmpdir)) == ['dnsq.prom']
@@ -0,0 +1,154 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import dns.name
+import dns.reversename
+import dnsq
+import dnsq.network
+import pytest
+
+
+@pytest.mark.parametrize(
+    'text, expected',
+    [
+        pytest.param('0.0.0.0', (4, 0)),
+        pytest.param('192.168.1.20', (4, 0xc0a80114)),
+        pytest.param('::1', (6, 1)),
+        pytest.param('fd00::14', (6, (0xfd00 << 112) + 0x14)),
+    ]
+)
+def test_parse_address(text, expected):
+    assert dnsq.network.parse_address(text) == expected
+
+
+@pytest.mark.parametrize('text', ['192.168.1', '192.168.1.256', 'fd00:::1', 'dc-app-01', ''])
+def test_parse_address_will_raise_ValueError(text):
+    with pytest.raises(ValueError):
+        dnsq.network.parse_address(text)
+
+
+def test_address_key_sorts_ipv4_before_ipv6():
+    ips = ['fd00::1', '192.168.10.1', '::', '192.168.2.1', '255.255.255.255']
+    assert sorted(ips, key=dnsq.network.address_key) == ['192.168.2.1', '192.168.10.1', '255.255.255.255', '::', 'fd00::1']
+
+
+@pytest.mark.parametrize('text', ['192.168.1', '192.168.1.256', 'fd00:::1', 'dc-app-01', ''])
+def test_address_key_will_raise_ValueError(text):
+    with pytest.raises(ValueError):
+        dnsq.network.address_key(text)
+
+
+@pytest.mark.parametrize(
+    'text, expected',
+    [
+        pytest.param('192.168.1.0/24', (4, 0xc0a80100, 0xc0a801ff)),
+        pytest.param('192.168.1.7/24', (4, 0xc0a80100, 0xc0a801ff)),
+        pytest.param('192.168.1.7', (4, 0xc0a80107, 0xc0a80107)),
+        pytest.param('0.0.0.0/0', (4, 0, 0xffffffff)),
+        pytest.param('fd00::/64', (6, 0xfd00 << 112, (0xfd00 << 112) + (1 << 64) - 1)),
+    ]
+)
+def test_parse_network(text, expected):
+    assert dnsq.network.parse_network(text) == expected
+
+
+@pytest.mark.parametrize('text', ['192.168.1.0/33', '192.168.1.0/-1', '192.168.1.0/x', 'fd00::/129'])
+def test_parse_network_will_raise_ValueError_for_a_bad_prefix_length(text):
+    with pytest.raises(ValueError):
+        dnsq.network.parse_network(text)
+
+
+def test_CIDRSet_merges_overlapping_and_adjacent_networks():
+    networks = dnsq.network.CIDRSet(['192.168.2.0/24', '192.168.1.0/24', '192.168.1.128/25', '10.0.0.0/8', 'fd00::/64'])
+
+    assert list(networks) == [
+        (4, 0x0a000000, 0x0affffff),
+        (4, 0xc0a80100, 0xc0a802ff),
+        (6, 0xfd00 << 112, (0xfd00 << 112) + (1 << 64) - 1),
+    ]
+
+
+@pytest.mark.parametrize(
+    'address, expected',
+    [
+        pytest.param('192.168.1.20', True),
+        pytest.param('192.168.2.255', True),
+        pytest.param('192.168.10.20', False),
+        pytest.param('192.168.0.255', False),
+        pytest.param('10.255.0.1', True),
+        pytest.param('9.255.255.255', False),
+        pytest.param('fd00::14', True),
+        pytest.param('fd00:0:0:1::14', False),
+        pytest.param('::ffff:192.168.1.20', False),
+        pytest.param((4, 0xc0a80114), True),
+    ]
+)
+def test_CIDRSet_contains(address, expected):
+    networks = dnsq.network.CIDRSet(['10.0.0.0/8', '192.168.1.0/24', '192.168.2.0/24', 'fd00::/64'])
+
+    assert (address in networks) is expected
+
+
+def test_an_empty_CIDRSet_contains_nothing():
+    assert '192.168.1.20' not in dnsq.network.CIDRSet()
+
+
+@pytest.mark.parametrize(
+    'text, origin, expected',
+    [
+        pytest.param('dc-app-01 7200 IN A 192.168.1.20', None, (4, 0xc0a80114)),
+        pytest.param('dc-app-03 7200 IN AAAA fd00::14', None, (6, (0xfd00 << 112) + 0x14)),
+        pytest.param('20 7200 IN PTR dc-app-01.foo-domain.com.', '1.168.192.in-addr.arpa.', (4, 0xc0a80114)),
+        pytest.param('20.1.168.192.in-addr.arpa. 7200 IN PTR dc-app-01.foo-domain.com.', None, (4, 0xc0a80114)),
+        pytest.param('1 7200 IN PTR foo.', '168.192.in-addr.arpa.', None),
+        pytest.param('app-01 7200 IN CNAME dc-app-01', None, None),
+    ]
+)
+def test_record_address(text, origin, expected):
+    record = dnsq.Record.from_text(text)
+    origin = None if origin is None else dns.name.from_text(origin)
+
+    assert dnsq.network.record_address(record, origin) == expected
+
+
+@pytest.mark.parametrize('text', ['192.168.1.20', '0.0.0.0', '255.255.255.255', 'fd00::14', '::1'])
+def test_format_address_and_reverse_name(text):
+    version, value = dnsq.network.parse_address(text)
+
+    assert dnsq.network.format_address(version, value) == text
+    assert dnsq.network.reverse_name(version, value) == dns.reversename.from_address(text)
+
+
+def test_network_addresses():
+    assert list(dnsq.network.network_addresses('192.168.1.6/31')) == [(4, 0xc0a80106), (4, 0xc0a80107)]
+    assert list(dnsq.network.network_addresses('fd00::14')) == [(6, (0xfd00 << 112) + 0x14)]
+
+
+def test_network_addresses_will_raise_ValueError_before_iterating():
+    with pytest.raises(ValueError):
+        dnsq.network.network_addresses('192.168.1.0/33')
+
+
+@pytest.mark.parametrize(
+    'text, expected',
+    [
+        pytest.param('20.1.168.192.in-addr.arpa.', (4, 0xc0a80114, 0xc0a80114), id='ptr'),
+        pytest.param('1.168.192.IN-ADDR.ARPA.', (4, 0xc0a80100, 0xc0a801ff), id='zone'),
+        pytest.param('in-addr.arpa.', (4, 0, 0xffffffff), id='every ipv4 address'),
+        pytest.param('0.0.d.f.ip6.arpa.', (6, 0xfd00 << 112, (0xfd01 << 112) - 1), id='ipv6 zone'),
+        pytest.param('0/25.1.168.192.in-addr.arpa.', None, id='classless delegation'),
+        pytest.param('256.1.168.192.in-addr.arpa.', None, id='not an octet'),
+        pytest.param('1.20.1.168.192.in-addr.arpa.', None, id='too long'),
+        pytest.param('foo-domain.com.', None, id='not a reverse name'),
+    ]
+)
+def test_reverse_network(text, expected):
+    assert dnsq.network.reverse_network(dns.name.from_text(text)) == expected
+
+
+def test_reverse_network_of_reverse_name():
+    for text in ['192.168.1.20', 'fd00::14']:
+        version, value = dnsq.network.parse_address(text)
+        assert dnsq.network.reverse_network(dnsq.network.reverse_name(version, value)) == (version, value, value)
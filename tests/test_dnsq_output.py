@@ -0,0 +1,100 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import dns.name
+import dnsq
+import dnsq.output
+import io
+import json
+import mock
+import pytest
+
+RECORDS = [
+    dnsq.Record.from_text('dc-app-01 7200 IN A 192.168.1.20'),
+    dnsq.Record.from_text('txt-01 300 IN TXT "v=spf1 include:foo, -all"'),
+]
+ROWS = [dnsq.output.record_row(x) for x in RECORDS]
+
+
+def write(fmt, rows, **kwargs):
+    stream = io.StringIO()
+    with dnsq.output.create_writer(fmt, stream, dnsq.output.RECORD_FIELDS, **kwargs) as writer:
+        writer.write_rows(rows)
+    return stream.getvalue()
+
+
+def test_record_row():
+    assert ROWS[0] == ('dc-app-01', 7200, 'IN', 'A', '192.168.1.20')
+
+
+@pytest.mark.parametrize('text', ['dc-app-01', 'foo-domain.com.', '@', '.', '*.wild', r'a\.b.foo-domain.com.', r'sp\032ace', r'x\@y', r'a\"b', 'MiXed.Case.'])
+def test_name_text_is_the_same_as_to_text(text):
+    name = dns.name.empty if text == '@' else dns.name.from_text(text, None)
+
+    assert dnsq.output.name_text(name) == name.to_text()
+
+
+@pytest.mark.parametrize(
+    'fmt, kwargs, expected',
+    [
+        pytest.param('text', {}, 'dc-app-01 7200 IN A 192.168.1.20\ntxt-01 300 IN TXT "v=spf1 include:foo, -all"\n', id='text'),
+        pytest.param('text', dict(text_fields=('rdata', 'name')), '192.168.1.20 dc-app-01\n"v=spf1 include:foo, -all" txt-01\n', id='text fields'),
+        pytest.param('tsv', {}, 'dc-app-01\t7200\tIN\tA\t192.168.1.20\ntxt-01\t300\tIN\tTXT\t"v=spf1 include:foo, -all"\n', id='tsv'),
+        pytest.param('csv', {}, ('name,ttl,class,type,rdata\n'
+                                 'dc-app-01,7200,IN,A,192.168.1.20\n'
+                                 'txt-01,300,IN,TXT,"""v=spf1 include:foo, -all"""\n'), id='csv'),
+    ]
+)
+def test_writers_write_a_line_per_row(fmt, kwargs, expected):
+    assert write(fmt, ROWS, **kwargs) == expected
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'json'])
+def test_json_writers_write_an_object_per_row(fmt):
+    actual = write(fmt, ROWS)
+
+    objects = json.loads(actual) if fmt == 'json' else [json.loads(x) for x in actual.splitlines()]
+    assert objects == [
+        dict(name='dc-app-01', ttl=7200, **{'class': 'IN', 'type': 'A', 'rdata': '192.168.1.20'}),
+        dict(name='txt-01', ttl=300, **{'class': 'IN', 'type': 'TXT', 'rdata': '"v=spf1 include:foo, -all"'}),
+    ]
+    first = json.loads(actual, object_pairs_hook=collections.OrderedDict)[0] if fmt == 'json' else json.loads(actual.splitlines()[0], object_pairs_hook=collections.OrderedDict)
+    assert tuple(first) == dnsq.output.RECORD_FIELDS
+
+
+@pytest.mark.parametrize('fmt, expected', [('json', '[]\n'), ('csv', 'name,ttl,class,type,rdata\n'), ('ndjson', '')])
+def test_writers_without_rows(fmt, expected):
+    assert write(fmt, []) == expected
+
+
+def test_writer_writes_the_rows_in_chunks():
+    stream = mock.Mock()
+
+    with dnsq.output.create_writer('text', stream, dnsq.output.RECORD_FIELDS, chunk_rows=2) as writer:
+        writer.write_rows(ROWS * 3)
+        assert stream.write.call_count == 3
+
+    assert writer.rows == 6
+    assert stream.write.call_count == 3
+    stream.flush.assert_called_once_with()
+
+
+def test_writer_with_an_encoding_writes_bytes_and_can_close_the_stream():
+    stream = io.BytesIO()
+    stream.close = mock.Mock()
+
+    with dnsq.output.create_writer('text', stream, ('name', 'rdata'), encoding='utf-8', close_stream=True) as writer:
+        writer.write(('caf\xe9', 'v=1'))
+
+    assert stream.getvalue() == 'caf\xe9 v=1\n'.encode('utf-8')
+    stream.close.assert_called_once_with()
+
+
+def test_create_writer_will_raise_AssertionError_for_an_unknown_format():
+    with pytest.raises(AssertionError) as exp:
+        dnsq.output.create_writer('xml', io.StringIO(), dnsq.output.RECORD_FIELDS)
+
+    assert 'Expected fmt to be one of text, tsv, csv, ndjson, json, got xml' in str(exp.value)
@@ -0,0 +1,68 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import dns.name
+import dns.resolver
+import dnsq
+import dnsq.reverse
+import mock
+import pytest
+import time
+
+PTRS = {
+    '20.1.168.192.in-addr.arpa.': ['dc-app-01.foo-domain.com.'],
+    '21.1.168.192.in-addr.arpa.': ['dc-app-02.foo-domain.com.', 'app-02.foo-domain.com.'],
+}
+
+
+def query(resolver, name, rdtype):
+    assert rdtype == 'PTR'
+    if name.to_text() not in PTRS:
+        raise dns.resolver.NXDOMAIN()
+    return [mock.Mock(target=dns.name.from_text(x)) for x in PTRS[name.to_text()]]
+
+
+def test_expand_targets():
+    actual = list(dnsq.reverse.expand_targets(['192.168.1.20', '192.168.2.0/31', 'not-an-address']))
+
+    assert [x[:3] for x in actual] == [
+        ('192.168.1.20', 4, 0xc0a80114),
+        ('192.168.2.0/31', 4, 0xc0a80200),
+        ('192.168.2.0/31', 4, 0xc0a80201),
+        ('not-an-address', None, None),
+    ]
+    assert isinstance(actual[-1][3], ValueError)
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_lookup_ptrs_looks_up_every_address_of_every_target(ordered):
+    with mock.patch('dnsq.query', side_effect=query):
+        results = list(dnsq.reverse.lookup_ptrs(mock.Mock(), ['192.168.1.20/31', '192.168.1.22', 'bad'], workers=2, ordered=ordered))
+
+    if not ordered:
+        results.sort(key=lambda x: x[0])
+    assert [x[:2] for x in results] == [
+        ('192.168.1.20', ['dc-app-01.foo-domain.com.']),
+        ('192.168.1.21', ['dc-app-02.foo-domain.com.', 'app-02.foo-domain.com.']),
+        ('192.168.1.22', []),
+        ('bad', []),
+    ]
+    assert isinstance(dict((x[0], x[2]) for x in results)['192.168.1.22'], dns.resolver.NXDOMAIN)
+
+
+def test_lookup_ptrs_streams_a_large_network():
+    def slow_query(resolver, name, rdtype):
+        time.sleep(0.01)
+        raise dns.resolver.NXDOMAIN()
+
+    with mock.patch('dnsq.query', side_effect=slow_query):
+        start = time.time()
+        results = dnsq.reverse.lookup_ptrs(mock.Mock(), ['10.0.0.0/8'], workers=32)
+        first = [next(results) for _ in range(64)]
+        results.close()
+
+    # a /8 is 16 million addresses, only the ones that were needed are looked up
+    assert len(first) == 64
+    assert time.time() - start < 5
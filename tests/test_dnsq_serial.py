@@ -0,0 +1,104 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from tests import dnsserver
+
+import dns.exception
+import dns.resolver
+import dnsq
+import dnsq.serial
+import mock
+import pytest
+import time
+
+SERIAL = 2018070500
+
+
+def serve(serial, host, port=0):
+    return dnsserver.AXFRServer(dnsserver.synthetic_zone(10, serial=serial), host=host, port=port)
+
+
+def test_query_serial():
+    with serve(SERIAL, '127.0.0.1') as server:
+        serial, seconds = dnsq.serial.query_serial(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', tcp=True, port=server.port)
+
+    assert serial == SERIAL
+    assert seconds > 0
+
+
+def test_query_serial_will_raise_dns_exception_DNSException_when_the_nameserver_refuses():
+    with serve(SERIAL, '127.0.0.1') as server:
+        with pytest.raises(dns.exception.DNSException) as exp:
+            dnsq.serial.query_serial('bar-domain.', '127.0.0.1', tcp=True, port=server.port)
+
+    assert 'answered REFUSED for the SOA of bar-domain.' in str(exp.value)
+
+
+def test_check_serials_reports_the_serial_of_every_nameserver():
+    with serve(SERIAL, '127.0.0.1') as primary, serve(SERIAL - 1, '127.0.0.2', primary.port):
+        report = dnsq.serial.check_serials(dnsserver.DEFAULT_ORIGIN, nameservers=['127.0.0.1', '127.0.0.2', '127.0.0.3'],
+                                           timeout=1.0, tcp=True, port=primary.port)
+
+    assert report.serial == SERIAL
+    assert report.in_sync is False
+    assert [(x.address, x.serial) for x in report] == [('127.0.0.1', SERIAL), ('127.0.0.2', SERIAL - 1), ('127.0.0.3', None)]
+    assert [report.agrees(x) for x in report] == [True, False, False]
+    assert [x.address for x in report.errors] == ['127.0.0.3']
+
+
+def test_check_serials_when_every_nameserver_agrees():
+    with serve(SERIAL, '127.0.0.1') as primary, serve(SERIAL, '127.0.0.2', primary.port):
+        report = dnsq.serial.check_serials(dnsserver.DEFAULT_ORIGIN, nameservers=['127.0.0.1', '127.0.0.2'], tcp=True, port=primary.port)
+
+    assert report.in_sync is True
+    assert report.errors == []
+
+
+def test_check_serials_takes_as_long_as_the_slowest_nameserver():
+    def query_serial(domain, address, *args, **kwargs):
+        time.sleep(0.2)
+        return SERIAL, 0.2
+
+    nameservers = ['10.0.0.{}'.format(x) for x in range(1, 9)]
+    with mock.patch('dnsq.serial.query_serial', side_effect=query_serial):
+        start = time.time()
+        report = dnsq.serial.check_serials('foo-domain.com', resolver=mock.Mock(), nameservers=nameservers)
+        elapsed = time.time() - start
+
+    assert report.in_sync is True
+    assert len(report) == 8
+    assert elapsed < 0.2 * 4
+
+
+def test_nameserver_addresses_resolves_the_names_and_keeps_the_addresses():
+    answers = {
+        ('ns1.foo-domain.com.', 'A'): ['10.0.0.1'],
+        ('ns1.foo-domain.com.', 'AAAA'): ['fd00::1'],
+        ('ns2.foo-domain.com.', 'A'): ['10.0.0.2'],
+    }
+
+    def query(resolver, domain, rdtype):
+        if (domain, rdtype) not in answers:
+            raise dns.resolver.NoAnswer()
+        return [mock.Mock(to_text=mock.Mock(return_value=x)) for x in answers[(domain, rdtype)]]
+
+    with mock.patch('dnsq.query', side_effect=query):
+        actual = dnsq.serial.nameserver_addresses(mock.Mock(), ['ns1.foo-domain.com.', 'ns2.foo-domain.com.', '10.0.0.3', 'ns3.foo-domain.com.'])
+
+    assert [x[:2] for x in actual] == [
+        ('ns1.foo-domain.com.', '10.0.0.1'),
+        ('ns1.foo-domain.com.', 'fd00::1'),
+        ('ns2.foo-domain.com.', '10.0.0.2'),
+        ('10.0.0.3', '10.0.0.3'),
+        ('ns3.foo-domain.com.', None),
+    ]
+    assert isinstance(actual[-1][2], dns.resolver.NoAnswer)
+
+
+def test_scan_serials_reports_a_zone_without_NS_records_as_an_error():
+    with mock.patch('dnsq.ns_records', side_effect=dns.resolver.NXDOMAIN()):
+        reports = list(dnsq.serial.scan_serials(['foo-domain.com', 'bar-domain.com'], resolver=mock.Mock()))
+
+    assert sorted(x.domain for x in reports) == ['bar-domain.com', 'foo-domain.com']
+    assert all(x.in_sync is False and len(x.errors) == 1 for x in reports)
@@ -0,0 +1,118 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from tests import dnsserver
+
+import dns.exception
+import dnsq
+import dnsq.snapshot
+import os
+import pytest
+
+
+def texts(records):
+    return [x.to_text() for x in records]
+
+
+def cached_zone_transfer(server, directory):
+    return list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', port=server.port, snapshot_dir=directory))
+
+
+@pytest.mark.parametrize(
+    'domain, nameserver, expected',
+    [
+        pytest.param('foo-domain.com', '67.77.255.142', 'foo-domain.com@67.77.255.142.snapshot'),
+        pytest.param('foo-domain.com.', 'fd00::53', 'foo-domain.com@fd00__53.snapshot'),
+        pytest.param('.', '67.77.255.142', 'root@67.77.255.142.snapshot'),
+    ]
+)
+def test_snapshot_path(domain, nameserver, expected):
+    assert dnsq.snapshot.snapshot_path('/tmp', domain, nameserver) == os.path.join('/tmp', expected)
+
+
+def test_write_snapshot_and_read_it_back(tmpdir):
+    records = list(dnsserver.synthetic_zone(1000, serial=2018070501))
+    path = str(tmpdir.join('foo-domain.snapshot'))
+
+    snapshot = dnsq.snapshot.write_snapshot(path, dnsserver.DEFAULT_ORIGIN, records)
+
+    assert snapshot.serial == 2018070501
+    assert snapshot.origin == dnsq.get_absolute_name(dnsserver.DEFAULT_ORIGIN)
+    assert len(snapshot) == 1000
+    assert list(snapshot) == records
+    assert os.listdir(str(tmpdir)) == ['foo-domain.snapshot']
+
+
+def test_write_snapshot_will_raise_ValueError_without_an_SOA_and_leave_nothing_behind(tmpdir):
+    records = list(dnsserver.synthetic_zone(10))[1:]
+
+    with pytest.raises(ValueError) as exp:
+        dnsq.snapshot.write_snapshot(str(tmpdir.join('foo-domain.snapshot')), dnsserver.DEFAULT_ORIGIN, records)
+
+    assert 'Expected the records of foo-domain. to contain its SOA' in str(exp.value)
+    assert os.listdir(str(tmpdir)) == []
+
+
+@pytest.mark.parametrize('content', [b'', b'DNSQ', b'NOTASNAPSHOT\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00'])
+def test_open_snapshot_returns_None_when_the_file_is_not_a_snapshot(tmpdir, content):
+    path = tmpdir.join('foo-domain.snapshot')
+    path.write_binary(content)
+
+    assert dnsq.snapshot.open_snapshot(str(path)) is None
+    assert dnsq.snapshot.open_snapshot(str(tmpdir.join('missing.snapshot'))) is None
+
+
+def test_zone_transfer_with_a_snapshot_dir_reads_the_snapshot_while_the_serial_is_unchanged(tmpdir):
+    records = list(dnsserver.synthetic_zone(100))
+
+    with dnsserver.AXFRServer(records) as server:
+        assert texts(cached_zone_transfer(server, str(tmpdir))) == texts(records)
+
+    # the same serial with different records can only be answered from the snapshot
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(10)) as server:
+        assert texts(cached_zone_transfer(server, str(tmpdir))) == texts(records)
+
+
+def test_zone_transfer_with_a_snapshot_dir_transfers_the_zone_again_when_the_serial_changed(tmpdir):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(100)) as server:
+        cached_zone_transfer(server, str(tmpdir))
+
+    records = list(dnsserver.synthetic_zone(10, serial=2018070501))
+    with dnsserver.AXFRServer(records) as server:
+        assert texts(cached_zone_transfer(server, str(tmpdir))) == texts(records)
+
+    path = dnsq.snapshot.snapshot_path(str(tmpdir), dnsserver.DEFAULT_ORIGIN, '127.0.0.1')
+    assert dnsq.snapshot.Snapshot(path).serial == 2018070501
+    assert len(os.listdir(str(tmpdir))) == 1
+
+
+def test_zone_transfer_with_a_snapshot_dir_stopped_early_keeps_the_previous_snapshot(tmpdir):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(100)) as server:
+        cached_zone_transfer(server, str(tmpdir))
+
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(1000, serial=2018070501)) as server:
+        transfer = dnsq.snapshot.cached_zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', str(tmpdir), incremental=False, port=server.port)
+        next(transfer)
+        transfer.close()
+
+    path = dnsq.snapshot.snapshot_path(str(tmpdir), dnsserver.DEFAULT_ORIGIN, '127.0.0.1')
+    assert dnsq.snapshot.Snapshot(path).serial == 2018070500
+    assert len(os.listdir(str(tmpdir))) == 1
+
+
+def test_zone_transfer_with_a_snapshot_dir_does_not_write_a_snapshot_when_the_transfer_is_refused(tmpdir):
+    with dnsserver.AXFRServer(dnsserver.synthetic_zone(10)) as server:
+        with pytest.raises(dns.exception.FormError):
+            list(dnsq.zone_transfer('bar-domain.', '127.0.0.1', port=server.port, snapshot_dir=str(tmpdir)))
+
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_zone_transfer_with_a_snapshot_dir_and_sort(tmpdir):
+    records = list(dnsserver.synthetic_zone(100))
+
+    with dnsserver.AXFRServer(records) as server:
+        actual = list(dnsq.zone_transfer(dnsserver.DEFAULT_ORIGIN, '127.0.0.1', port=server.port, snapshot_dir=str(tmpdir), sort=True))
+
+    assert texts(actual) == texts(sorted(records, key=lambda x: x.name))